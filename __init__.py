@@ -15,14 +15,27 @@ __version__ = "0.1.0"
 __author__ = "Mars AI Agents Team"
 __description__ = "Mars AI Agents - Gmail integration and processing system with FastAPI backend and React frontend"
 
-# Import main modules for easy access
-from . import api_server
-from . import get_data
-from . import utils
-from . import config
+import importlib
+
+# Main modules are imported on first access (mars_AIAgents.api_server), so
+# reading VERSION_INFO or starting a CLI doesn't load FastAPI, the Google
+# API client and the extraction graph
+_LAZY_MODULES = ('api_server', 'get_data', 'utils', 'config')
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        module = importlib.import_module(f'.{name}', __name__)
+        globals()[name] = module
+        return module
+    if name == 'GMAIL_TARGET_EMAIL':
+        # None: whichever account is authorised
+        return __getattr__('config').get_gmail_config()['target_email']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 # Define package-level constants
-GMAIL_TARGET_EMAIL = "demotest.tcs@gmail.com"
 DATA_FOLDER = "data"
 STATIC_FOLDER = "static" 
 TEMPLATES_FOLDER = "templates"
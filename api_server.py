@@ -4,23 +4,36 @@ Mars AI Agents - FastAPI Backend Server
 Handles processing requests from React frontend and integrates with Gmail API
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 import asyncio
+import contextvars
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
-# Import our Gmail data retrieval module
-from get_data import process_gmail_data
+from utils.document_serving import etag_matches, serve_document
+from utils.event_stream import SubscriberLimitError, get_event_broker, publish_event, sse_stream
+from utils.file_utils import file_content_hash, resolve_document_path
+from utils.metrics import CONTENT_TYPE_LATEST, EXECUTOR_INFLIGHT, generate_latest
+from utils.tracing import TRACE_STORE, load_profile_report, run_profiled, start_trace
+from config import get_events_config, get_executors_config, get_gmail_config, get_tracing_config, get_workflow_config
+from utils.mailbox_registry import MailboxCheckpoint, load_mailboxes
+from utils.logging_utils import configure_logging
+from utils.preview_utils import get_preview_cache, get_preview_info
+from utils.near_duplicates import get_duplicate_index
+from utils.layout_templates import get_template_store
+from utils.pdf_triage import get_triage_log
+from utils.search_index import SEARCH_MODES, get_search_index
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queue-based, written by a background thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -41,9 +54,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for document serving
-if os.path.exists("data"):
-    app.mount("/documents", StaticFiles(directory="data"), name="documents")
+# Document serving (Range requests, content-hash ETags) is
+# handled by the /documents routes below rather than a StaticFiles mount
+
+# Bounded thread pools, one per stage (see the executors config)
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+def get_executor(executor_name: str) -> ThreadPoolExecutor:
+    """Thread pool of a stage, created on first use"""
+    with _executors_lock:
+        if executor_name not in _executors:
+            _executors[executor_name] = ThreadPoolExecutor(
+                max_workers=get_executors_config()[executor_name],
+                thread_name_prefix=f"mars-{executor_name}"
+            )
+        return _executors[executor_name]
+
+async def run_blocking(executor_name: str, func, *args):
+    """
+    Run a blocking function in a stage's executor, tracking it as in flight
+    
+    The caller's context is copied into the worker thread so spans recorded
+    there join the request's trace (and are profiled when requested).
+    
+    Args:
+        executor_name: Executor to run on ('extraction', 'gmail', 'search', 'hashing' or 'preview')
+        func: Blocking callable
+        *args: Positional arguments for the callable
+        
+    Returns:
+        The callable's return value
+    """
+    def tracked():
+        with EXECUTOR_INFLIGHT.labels(executor=executor_name).track_inprogress():
+            return run_profiled(func, *args)
+    
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_executor(executor_name), context.run, tracked)
+
+def process_gmail_data() -> Dict[str, Any]:
+    """Ingest new mail from every registered mailbox"""
+    # Our Gmail data retrieval module (and the Google API client behind it)
+    # is imported on the first /api/process call, not at server start-up
+    from get_data import process_gmail_data as process_all
+    return process_all()
+
+async def ingest_mail() -> Dict[str, Any]:
+    """Ingest new mail: on the event loop with the httpx transport, else in a worker thread"""
+    if get_gmail_config().get('transport') == 'httpx':
+        from get_data import process_gmail_data_async
+        return await process_gmail_data_async()
+    return await run_blocking("gmail", process_gmail_data)
+
+# Per-request tracing
+tracing_config = get_tracing_config()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Record a span tree for each request and return its trace ID"""
+    if not tracing_config['enabled']:
+        return await call_next(request)
+    
+    profile = request.headers.get(tracing_config['profile_header'], '').lower() in ('1', 'true', 'cprofile')
+    with start_trace(f"{request.method} {request.url.path}", {"http.method": request.method}, profile) as root:
+        response = await call_next(request)
+        root.set_attribute("http.status_code", response.status_code)
+    
+    response.headers["X-Trace-Id"] = root.trace_id
+    if profile:
+        response.headers["X-Profile-Id"] = root.trace_id
+    return response
 
 # Pydantic models for request/response
 class ProcessingRequest(BaseModel):
@@ -56,6 +137,9 @@ class ProcessingResponse(BaseModel):
     message: str
     files_downloaded: List[str] = []
     emails_processed: int = 0
+    failed_message_ids: List[str] = []
+    attachments_skipped: int = 0
+    mailboxes: List[Dict[str, Any]] = []
     error: Optional[str] = None
     timestamp: str
 
@@ -68,12 +152,31 @@ class HealthResponse(BaseModel):
 class InvoiceDataRequest(BaseModel):
     """Request model for invoice data extraction"""
     document_path: str
+    force: bool = False
 
 class InvoiceDataResponse(BaseModel):
     """Response model for extracted invoice data"""
     success: bool
     invoice_number: Optional[str] = None
     order_number: Optional[str] = None
+    token_usage: Optional[Dict[str, Any]] = None
+    duplicate_of: Optional[str] = None
+    similarity: Optional[float] = None
+    template: Optional[Dict[str, Any]] = None
+    triage: Optional[Dict[str, Any]] = None
+    prompt: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    timestamp: str
+
+class BulkInvoiceDataRequest(BaseModel):
+    """Request model for extracting several documents"""
+    document_paths: List[str]
+    force: bool = False
+
+class BulkInvoiceDataResponse(BaseModel):
+    """Response model for bulk extraction, one result per requested path"""
+    success: bool
+    results: List[InvoiceDataResponse] = []
     error: Optional[str] = None
     timestamp: str
 
@@ -93,6 +196,77 @@ async def health_check():
         service="Mars AI Agents API"
     )
 
+# Prometheus metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose pipeline stage latencies, throughput counters and executor gauges"""
+    return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Recent traces endpoint
+@app.get("/api/traces")
+async def list_traces(limit: int = 50):
+    """
+    List recently finished request traces
+    
+    Args:
+        limit: Maximum number of traces to return
+        
+    Returns:
+        Summaries of the most recent traces
+    """
+    return {
+        "traces": [
+            {
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "duration_ms": root.duration_ms,
+                "status": root.status,
+                "span_count": sum(1 for _ in root.iter_spans())
+            }
+            for root in TRACE_STORE.recent(limit)
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Trace detail endpoint
+@app.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Get the full span tree of a request trace as JSON
+    
+    Args:
+        trace_id: Trace ID from the X-Trace-Id response header
+        
+    Returns:
+        The span tree
+    """
+    root = TRACE_STORE.get(trace_id)
+    if root is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "root": root.to_dict()}
+
+# Request profile endpoint
+@app.get("/api/profiles/{trace_id}", response_class=PlainTextResponse)
+async def get_profile(trace_id: str, limit: int = 40, sort: str = "cumulative"):
+    """
+    Get the cProfile report captured for a request sent with the profile header
+    
+    Args:
+        trace_id: Trace ID from the X-Profile-Id response header
+        limit: Number of functions to include
+        sort: pstats sort key
+        
+    Returns:
+        The pstats text report
+    """
+    try:
+        report = load_profile_report(trace_id, limit, sort)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(report)
+
 # Main processing endpoint
 @app.post("/api/process", response_model=ProcessingResponse)
 async def start_processing(request: ProcessingRequest):
@@ -106,12 +280,12 @@ async def start_processing(request: ProcessingRequest):
         ProcessingResponse with results
     """
     logger.info(f"Processing request received: {request.action}")
+    publish_event("processing.started", {"action": request.action})
     
     try:
         # Call the Gmail data processing function
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, process_gmail_data
-        )
+        result = await ingest_mail()
+        announce_downloads(result.get('files_downloaded', []))
         
         # Prepare response
         response = ProcessingResponse(
@@ -119,15 +293,26 @@ async def start_processing(request: ProcessingRequest):
             message=result.get('message', 'No new records to display'),
             files_downloaded=result.get('files_downloaded', []),
             emails_processed=result.get('emails_processed', 0),
+            failed_message_ids=result.get('failed_message_ids', []),
+            attachments_skipped=result.get('attachments_skipped', 0),
+            mailboxes=result.get('mailboxes', []),
             error=result.get('error'),
             timestamp=datetime.now().isoformat()
         )
         
         logger.info(f"Processing completed: {response.message}")
+        publish_event("processing.finished", {
+            "success": response.success,
+            "message": response.message,
+            "files_downloaded": len(response.files_downloaded),
+            "emails_processed": response.emails_processed,
+            "error": response.error
+        })
         return response
         
     except Exception as e:
         logger.error(f"Error during processing: {str(e)}")
+        publish_event("processing.finished", {"success": False, "error": str(e)})
         
         # Return error response
         return ProcessingResponse(
@@ -137,6 +322,56 @@ async def start_processing(request: ProcessingRequest):
             timestamp=datetime.now().isoformat()
         )
 
+def announce_downloads(files: List[str]):
+    """Publish document.downloaded for files whose download wasn't announced yet"""
+    from get_data import take_announced_downloads
+    
+    # Single-mailbox runs announce each file as it is written; mailboxes
+    # ingested by worker processes are announced here once the run returns
+    announced = take_announced_downloads(files)
+    for path in files:
+        if path not in announced:
+            publish_event('document.downloaded', {'document_path': path, 'document_name': os.path.basename(path)})
+
+# Server-sent events endpoint
+@app.get("/api/events")
+async def stream_events(request: Request, types: Optional[str] = None, last_event_id: Optional[int] = None):
+    """
+    Stream server events (downloads, extractions, invoice data updates) as SSE
+    
+    Args:
+        request: Incoming request (its Last-Event-ID header resumes a stream)
+        types: Comma-separated event type prefixes, e.g. "document,extraction"
+        last_event_id: Resume after this event (for clients that can't set headers)
+        
+    Returns:
+        A text/event-stream response; a client that falls behind gets a
+        'resync' event in place of the events it missed
+    """
+    header_id = request.headers.get("last-event-id", "")
+    if header_id.isdigit():
+        last_event_id = int(header_id)
+    
+    settings = get_events_config()
+    broker = get_event_broker()
+    try:
+        broker.check_capacity()
+    except SubscriberLimitError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "30"})
+    
+    return StreamingResponse(
+        sse_stream(
+            broker,
+            [t.strip() for t in types.split(",") if t.strip()] if types else None,
+            last_event_id,
+            settings['heartbeat_seconds'],
+            settings['retry_ms']
+        ),
+        media_type="text/event-stream",
+        # No proxy buffering, or events arrive in bursts
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Get processing status endpoint
 @app.get("/api/status")
 async def get_processing_status():
@@ -147,18 +382,26 @@ async def get_processing_status():
         System status information
     """
     try:
-        # Check if credentials exist
-        import os
-        credentials_exist = os.path.exists('credentials.json')
-        token_exists = os.path.exists('token.json')
-        data_folder_exists = os.path.exists('data')
+        # Check if credentials exist for every registered mailbox
+        mailboxes = load_mailboxes()
+        mailbox_status = [
+            {
+                "id": mailbox.id,
+                "email": mailbox.email,
+                "credentials_configured": os.path.exists(mailbox.credentials_file),
+                "token_exists": os.path.exists(mailbox.token_file),
+                "data_folder_exists": os.path.exists(mailbox.data_folder)
+            }
+            for mailbox in mailboxes
+        ]
         
         return {
             "status": "ready",
-            "credentials_configured": credentials_exist,
-            "token_exists": token_exists,
-            "data_folder_exists": data_folder_exists,
-            "target_email": "demotest.tcs@gmail.com",
+            "credentials_configured": all(m["credentials_configured"] for m in mailbox_status),
+            "token_exists": all(m["token_exists"] for m in mailbox_status),
+            "data_folder_exists": os.path.exists('data'),
+            "target_email": mailboxes[0].email if len(mailboxes) == 1 else None,
+            "mailboxes": mailbox_status,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -220,16 +463,177 @@ async def get_configuration():
     Returns:
         Configuration information
     """
+    mailboxes = load_mailboxes()
     return {
-        "target_email": "demotest.tcs@gmail.com",
+        "target_email": mailboxes[0].email if len(mailboxes) == 1 else None,
+        "mailboxes": [{"id": m.id, "email": m.email, "data_folder": m.data_folder} for m in mailboxes],
         "data_folder": "data",
         "gmail_api_scopes": ["https://www.googleapis.com/auth/gmail.readonly"],
         "search_hours_back": 24,
         "max_results": 10,
+        "quota_units_per_second": get_gmail_config().get('quota_units_per_second', 250),
         "version": "1.0.0",
         "timestamp": datetime.now().isoformat()
     }
 
+# Mailbox registry endpoint
+@app.get("/api/mailboxes")
+async def get_mailboxes():
+    """
+    List registered mailboxes with their ingestion checkpoints
+    
+    Returns:
+        Mailboxes (credentials paths omitted) and when each was last processed
+    """
+    try:
+        mailboxes = load_mailboxes(include_disabled=True)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "success": True,
+        "mailboxes": [
+            {
+                "id": mailbox.id,
+                "email": mailbox.email,
+                "enabled": mailbox.enabled,
+                "data_folder": mailbox.data_folder,
+                "token_exists": os.path.exists(mailbox.token_file),
+                "quota_units_per_second": mailbox.quota_units_per_second
+                                          or get_gmail_config().get('quota_units_per_second', 250),
+                "checkpoint": MailboxCheckpoint(mailbox.id).summary()
+            }
+            for mailbox in mailboxes
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Search index updates
+async def index_extraction(document_path: str, invoice_number: str, order_number: str,
+                           text: Optional[str] = None, source: str = 'extracted'):
+    """Record extracted or edited fields in the search index without failing the request"""
+    try:
+        await run_blocking(
+            "search", get_search_index().record_extraction,
+            document_path, invoice_number, order_number, text, source
+        )
+    except Exception as e:
+        logger.warning(f"Could not index {document_path}: {str(e)}")
+
+# User-facing explanations for triage decisions
+TRIAGE_MESSAGES = {
+    'image_only': "Scanned document with no text layer; queued for OCR",
+    'image_file': "Image attachment; queued for OCR",
+    'encrypted': "Document is password protected",
+    'corrupt': "Document is damaged and could not be read",
+    'blank': "Document has no content",
+    'no_pages': "Document has no pages",
+    'unsupported_type': "Only PDF documents can be extracted",
+    'no_extractable_text': "No text could be extracted from the document",
+}
+
+# Triage decisions / OCR queue endpoint
+@app.get("/api/triage")
+async def get_triage_decisions(decision: Optional[str] = None, limit: int = 100):
+    """
+    List recent triage decisions
+    
+    Args:
+        decision: Only this decision: extract, ocr (the OCR queue) or reject
+        limit: Maximum number of rows (1-1000)
+        
+    Returns:
+        Triage decisions, newest first
+    """
+    if decision is not None and decision not in ('extract', 'ocr', 'reject'):
+        raise HTTPException(status_code=400, detail="decision must be extract, ocr or reject")
+    
+    rows = await run_blocking("search", get_triage_log().decisions, decision, max(1, min(limit, 1000)))
+    return {
+        "success": True,
+        "decisions": rows,
+        "total_count": len(rows),
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Search endpoint
+@app.get("/api/search")
+async def search_documents(q: str, mode: str = "auto", limit: int = 20):
+    """
+    Find documents by invoice number, order number, sender, subject or text
+    
+    Args:
+        q: Query, e.g. "4500123", "INV-2024" or "packaging cartons"
+        mode: exact, prefix, fulltext or auto (first mode with results)
+        limit: Maximum number of results (1-100)
+        
+    Returns:
+        Matching documents with their indexed fields
+    """
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    
+    found = await run_blocking("search", get_search_index().search, q, mode, max(1, min(limit, 100)))
+    return {
+        "success": True,
+        "query": q,
+        "mode": found['mode'],
+        "results": found['results'],
+        "total_count": len(found['results']),
+        "took_ms": found['took_ms'],
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Extraction results
+async def extraction_response(document_path: str, result_state: Dict[str, Any]) -> InvoiceDataResponse:
+    """Index, announce and build the response for one finished workflow run"""
+    # Triage stops documents with no usable text before any model call
+    triage = result_state.get('triage') or {}
+    if triage.get('decision', 'extract') != 'extract':
+        error = TRIAGE_MESSAGES.get(triage.get('reason'), f"Document rejected ({triage.get('reason')})")
+        publish_event("extraction.finished", {
+            "document_path": document_path, "success": False, "triage": triage, "error": error
+        })
+        return InvoiceDataResponse(
+            success=False,
+            triage=triage,
+            error=error,
+            timestamp=datetime.now().isoformat()
+        )
+    
+    # Index the extracted fields and document text for search
+    await index_extraction(
+        document_path,
+        result_state.get('invoice_number', ''),
+        result_state.get('order_number', ''),
+        text=result_state.get('attachment')
+    )
+    publish_event("extraction.finished", {
+        "document_path": document_path,
+        "success": True,
+        "invoice_number": result_state.get('invoice_number', ''),
+        "order_number": result_state.get('order_number', ''),
+        "duplicate_of": result_state.get('duplicate_of'),
+        "similarity": result_state.get('similarity'),
+        "template": result_state.get('template')
+    })
+    
+    # Return extracted data
+    return InvoiceDataResponse(
+        success=True,
+        invoice_number=result_state.get('invoice_number', ''),
+        order_number=result_state.get('order_number', ''),
+        token_usage=result_state.get('token_usage'),
+        duplicate_of=result_state.get('duplicate_of'),
+        similarity=result_state.get('similarity'),
+        template=result_state.get('template'),
+        triage=triage,
+        prompt=result_state.get('prompt'),
+        timestamp=datetime.now().isoformat()
+    )
+
 # Invoice data extraction endpoint
 @app.post("/api/extract-invoice-data", response_model=InvoiceDataResponse)
 async def extract_invoice_data(request: InvoiceDataRequest):
@@ -246,7 +650,7 @@ async def extract_invoice_data(request: InvoiceDataRequest):
     
     try:
         # Import here to avoid circular imports
-        from orchestrator.langgraph_orchestrator import workflow, AgenticState
+        from orchestrator.langgraph_orchestrator import run_document
         
         # Check if document exists
         if not os.path.exists(request.document_path):
@@ -256,34 +660,94 @@ async def extract_invoice_data(request: InvoiceDataRequest):
                 timestamp=datetime.now().isoformat()
             )
         
-        # Create initial state
-        initial_state = {
-            'attachment': os.path.basename(request.document_path),
-            'data_folder': os.path.dirname(request.document_path)
-        }
+        # Run the workflow (resumes an interrupted run, or returns a finished one
+        # unless force is set)
+        publish_event("extraction.started", {"document_path": request.document_path})
+        result_state = await run_blocking("extraction", run_document, request.document_path, request.force)
         
-        # Run the workflow
-        result_state = await asyncio.get_event_loop().run_in_executor(
-            None, 
-            lambda: workflow.invoke(initial_state)
-        )
+        return await extraction_response(request.document_path, result_state)
         
-        # Return extracted data
+    except Exception as e:
+        logger.error(f"Error extracting invoice data: {str(e)}")
+        publish_event("extraction.finished", {
+            "document_path": request.document_path, "success": False, "error": str(e)
+        })
         return InvoiceDataResponse(
+            success=False,
+            error=str(e),
+            timestamp=datetime.now().isoformat()
+        )
+
+# Bulk invoice data extraction endpoint
+@app.post("/api/extract-invoice-data/bulk", response_model=BulkInvoiceDataResponse)
+async def extract_invoice_data_bulk(request: BulkInvoiceDataRequest):
+    """
+    Extract several documents at once, packing short ones into shared model calls
+    
+    Args:
+        request: Document paths for extraction (see the packing config)
+        
+    Returns:
+        BulkInvoiceDataResponse with one result per requested path, in order
+    """
+    logger.info(f"Bulk invoice data extraction requested for {len(request.document_paths)} documents")
+    found: List[str] = []
+    
+    try:
+        from orchestrator.document_packing import run_documents
+        
+        found = [path for path in dict.fromkeys(request.document_paths) if os.path.exists(path)]
+        for path in found:
+            publish_event("extraction.started", {"document_path": path})
+        states = dict(zip(found, await run_blocking("extraction", run_documents, found, request.force)))
+        
+        results = []
+        for path in request.document_paths:
+            if path not in states:
+                results.append(InvoiceDataResponse(
+                    success=False,
+                    error="Document not found",
+                    timestamp=datetime.now().isoformat()
+                ))
+                continue
+            results.append(await extraction_response(path, states[path]))
+        
+        return BulkInvoiceDataResponse(
             success=True,
-            invoice_number=result_state.get('invoice_number', ''),
-            order_number=result_state.get('order_number', ''),
+            results=results,
             timestamp=datetime.now().isoformat()
         )
         
     except Exception as e:
-        logger.error(f"Error extracting invoice data: {str(e)}")
-        return InvoiceDataResponse(
+        logger.error(f"Error extracting invoice data in bulk: {str(e)}")
+        for path in found:
+            publish_event("extraction.finished", {"document_path": path, "success": False, "error": str(e)})
+        return BulkInvoiceDataResponse(
             success=False,
             error=str(e),
             timestamp=datetime.now().isoformat()
         )
 
+# LLM usage endpoint
+@app.get("/api/llm/usage")
+async def get_llm_usage():
+    """
+    Get LLM budgets, token usage, cost and implied throughput limits
+    
+    Returns:
+        Gateway statistics for the extraction graph
+    """
+    from orchestrator.langgraph_orchestrator import gateway
+    from prompt.prompt_library import active_prompt_version
+    
+    return {
+        **gateway.stats(),
+        # Documents read from vendor layout templates made no model calls
+        "templates": await run_blocking("search", get_template_store().stats),
+        "prompt_version": active_prompt_version(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 # Update invoice data endpoint
 @app.post("/api/update-invoice-data")
 async def update_invoice_data(request: UpdateInvoiceDataRequest):
@@ -311,7 +775,36 @@ async def update_invoice_data(request: UpdateInvoiceDataRequest):
             'updated_at': datetime.now().isoformat()
         }
         
+        await index_extraction(
+            request.document_path,
+            request.invoice_number,
+            request.order_number,
+            source='manual'
+        )
+        
+        # Later near-duplicates of this document should reuse the corrected values
+        await run_blocking(
+            "search", get_duplicate_index().update_fields,
+            request.document_path, request.invoice_number, request.order_number
+        )
+        
+        # A manual save confirms the values: learn the vendor's layout from them
+        # (and forget the template if it was the one that got them wrong)
+        indexed = await run_blocking("search", get_search_index().get_document, request.document_path) or {}
+        await run_blocking(
+            "search", get_template_store().learn,
+            request.document_path, request.invoice_number, request.order_number,
+            'manual', indexed.get('sender', '')
+        )
+        
         logger.info(f"Updated invoice data for {request.document_path}")
+        publish_event("invoice_data.updated", {
+            "document_path": request.document_path,
+            "invoice_number": request.invoice_number,
+            "order_number": request.order_number,
+            "source": "manual",
+            "updated_at": invoice_data_cache[request.document_path]['updated_at']
+        })
         
         return {
             "success": True,
@@ -331,7 +824,7 @@ async def update_invoice_data(request: UpdateInvoiceDataRequest):
         )
 
 # Get current invoice data endpoint
-@app.get("/api/invoice-data/{document_name}")
+@app.get("/api/invoice-data/{document_name:path}")
 async def get_invoice_data(document_name: str):
     """
     Get current invoice data for a document
@@ -358,6 +851,20 @@ async def get_invoice_data(document_name: str):
                 "timestamp": datetime.now().isoformat()
             }
         
+        # Fall back to the search index, which survives restarts
+        indexed = await run_blocking("search", get_search_index().get_document, document_path)
+        if indexed and (indexed['invoice_number'] or indexed['order_number']):
+            return {
+                "success": True,
+                "invoice_number": indexed['invoice_number'],
+                "order_number": indexed['order_number'],
+                "from_cache": False,
+                "from_index": True,
+                "source": indexed['source'],
+                "updated_at": indexed['updated_at'],
+                "timestamp": datetime.now().isoformat()
+            }
+        
         # If no cached data, return empty values
         return {
             "success": True,
@@ -377,6 +884,162 @@ async def get_invoice_data(document_name: str):
             }
         )
 
+# Document metadata endpoint
+@app.get("/api/documents/{document_name:path}")
+async def get_document_metadata(document_name: str):
+    """
+    Get metadata and the content-addressed URL for a document
+    
+    Args:
+        document_name: Name of the document in the data folder
+        
+    Returns:
+        Document metadata including its cacheable URL
+    """
+    try:
+        document_path = resolve_document_path("data", document_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.isfile(document_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    content_hash = await run_blocking("hashing", file_content_hash, document_path)
+    stat = os.stat(document_path)
+    
+    return {
+        "success": True,
+        "name": document_name,
+        "size": stat.st_size,
+        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "content_hash": content_hash,
+        "url": f"/documents/by-hash/{content_hash}/{document_name}",
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Content-addressed document serving (cacheable forever)
+@app.api_route("/documents/by-hash/{content_hash}/{document_name:path}", methods=["GET", "HEAD"])
+async def serve_document_by_hash(content_hash: str, document_name: str, request: Request):
+    """
+    Serve a document under a URL that embeds its content hash
+    
+    Args:
+        content_hash: SHA-256 of the document contents
+        document_name: Name of the document in the data folder
+        
+    Returns:
+        The document with immutable caching headers
+    """
+    try:
+        document_path = resolve_document_path("data", document_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.isfile(document_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    current_hash = await run_blocking("hashing", file_content_hash, document_path)
+    if current_hash != content_hash:
+        # The file changed since the URL was issued; send the client to the current version
+        return RedirectResponse(f"/documents/by-hash/{current_hash}/{document_name}", status_code=307)
+    
+    return await serve_document(request, document_path, content_hash=current_hash, immutable=True)
+
+# Name-based document serving (revalidated with ETags)
+@app.api_route("/documents/{document_name:path}", methods=["GET", "HEAD"])
+async def serve_document_by_name(document_name: str, request: Request):
+    """
+    Serve a document from the data folder
+    
+    Args:
+        document_name: Name of the document in the data folder
+        
+    Returns:
+        The document, a 206 partial response or a 304
+    """
+    try:
+        document_path = resolve_document_path("data", document_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.isfile(document_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return await serve_document(request, document_path)
+
+# Document page preview info endpoint
+@app.get("/api/preview/{document_name:path}/info")
+async def get_document_preview_info(document_name: str):
+    """
+    Get page count and preview settings for a document
+    
+    Args:
+        document_name: Name of the document in the data folder
+        
+    Returns:
+        Preview information for the document
+    """
+    try:
+        document_path = resolve_document_path("data", document_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.isfile(document_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    try:
+        info = await run_blocking("preview", get_preview_info, document_path)
+    except Exception as e:
+        logger.error(f"Error reading preview info for {document_name}: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Document cannot be previewed: {str(e)}")
+    
+    return {
+        "success": True,
+        "document_name": document_name,
+        **info,
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Document page preview endpoint
+@app.get("/api/preview/{document_name:path}")
+async def get_document_preview(document_name: str, request: Request, page: int = 1, dpi: Optional[int] = None):
+    """
+    Render a single document page to a compressed image
+    
+    Args:
+        document_name: Name of the document in the data folder
+        page: One-based page number
+        dpi: Requested resolution (clamped to the configured range)
+        
+    Returns:
+        The rendered page image
+    """
+    try:
+        document_path = resolve_document_path("data", document_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.isfile(document_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    cache = get_preview_cache()
+    try:
+        image_path, cache_key, _ = await run_blocking(
+            "preview", cache.render_page, document_path, page - 1, dpi
+        )
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error rendering preview for {document_name}: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Document cannot be previewed: {str(e)}")
+    
+    etag = f'"{cache_key}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(image_path, media_type=cache.media_type, headers=headers)
+
 # Error handlers
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
@@ -398,12 +1061,27 @@ async def startup_event():
     """Initialize application on startup"""
     logger.info("Mars AI Agents API starting up...")
     logger.info("API Documentation available at: http://localhost:8000/docs")
+    if get_workflow_config()['prune_on_startup']:
+        asyncio.create_task(prune_extraction_checkpoints())
+
+async def prune_extraction_checkpoints():
+    """Drop stale extraction checkpoints in the background, without delaying start-up"""
+    try:
+        from orchestrator.langgraph_orchestrator import prune_checkpoints
+        await run_blocking("extraction", prune_checkpoints)
+    except Exception as e:
+        logger.warning(f"Could not prune extraction checkpoints: {str(e)}")
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("Mars AI Agents API shutting down...")
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False)
 
 # Root endpoint
 @app.get("/")
@@ -427,5 +1105,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        log_config=None  # keep the queue-based handlers from configure_logging()
     )
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+Mars AI Agents - Benchmarks Package
+
+Offline benchmarks for ingestion and extraction. Nothing here talks to
+Gmail or OpenAI unless asked to (eval_extraction --backends live): a fake
+Gmail service replays a synthetic mailbox, a
+corpus generator writes invoice PDFs (and labelled golden sets) and a
+stub LLM or recorded answers stand in for extraction calls.
+
+Modules:
+    - corpus: Synthetic invoice PDF generator
+    - fake_gmail: In-memory stand-in for the Gmail API client
+    - fake_gmail_server: The fake mailbox served over the Gmail REST endpoints
+    - stub_llm: Stub structured-output model for the extraction graph
+    - run_benchmarks: End-to-end ingestion/extraction benchmark runner
+    - load_test: HTTP load test and regression gate for the API
+    - import_time: Cold-start import time of the entry points
+    - eval_extraction: Accuracy versus tokens and latency of the extraction strategies
+"""
+
+__version__ = "0.1.0"
+
+__all__ = []
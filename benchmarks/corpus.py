@@ -0,0 +1,227 @@
+"""
+Mars AI Agents - Synthetic Invoice Corpus
+Generates invoice PDFs with known invoice and order numbers
+"""
+
+import json
+import os
+import random
+from typing import Any, Dict, List, Optional, Sequence
+
+import pymupdf
+
+# Expected value of a field the document doesn't contain
+NOT_FOUND = 'Not Found'
+
+VENDORS = [
+    "Acme Industrial Supplies Ltd.",
+    "Globex Components GmbH",
+    "Initech Office Solutions",
+    "Umbrella Logistics Pvt. Ltd.",
+    "Stark Packaging Co.",
+    "Wayne Electrical Traders",
+]
+
+LINE_ITEMS = [
+    "Hex bolts M8 x 40 (box of 100)",
+    "Industrial lubricant 5L",
+    "Corrugated cartons 600x400x400",
+    "Copper cable 2.5 sq mm (100 m)",
+    "Safety gloves, nitrile (pack of 50)",
+    "Pallet wrap film 500 mm",
+    "LED panel light 36 W",
+    "Thermal labels 100x150 (roll)",
+]
+
+
+# Label wordings seen on real invoices (the extraction prompts list the same ones)
+INVOICE_LABELS = ["Invoice No.", "Invoice #", "Inv No.", "Invoice Number"]
+ORDER_LABELS = ["Buyer's Order No.", "Order No.", "PO Number", "Purchase Order", "Order ID"]
+
+# Other reference numbers that a careless extractor might return instead
+DECOY_LABELS = ["Delivery Note No.", "Quotation No.", "Customer ID", "Dispatch Doc No."]
+
+# Golden set variants, cycled through so every kind is represented
+GOLDEN_VARIANTS = ('standard', 'label_variants', 'decoys', 'no_order', 'long')
+
+
+def make_labels(index: int, rng: random.Random) -> Dict[str, str]:
+    """Build the ground-truth fields for one synthetic invoice"""
+    return {
+        'invoice_number': f"INV-{rng.randint(2023, 2026)}-{index:05d}",
+        'order_number': f"PO-{rng.randint(4500000, 4599999)}",
+        'vendor': rng.choice(VENDORS),
+    }
+
+
+def generate_invoice_pdf(path: str, invoice_number: str, order_number: str,
+                         vendor: str = VENDORS[0], pages: int = 1,
+                         target_size: Optional[int] = None, seed: int = 0,
+                         invoice_label: str = "Invoice No.", order_label: str = "Buyer's Order No.",
+                         extra_lines: Sequence[str] = (), header_page: int = 0) -> int:
+    """
+    Write a text-based invoice PDF
+
+    Args:
+        path: Output file path
+        invoice_number: Invoice number printed in the header
+        order_number: Buyer's order number printed in the header (empty: no order line)
+        vendor: Vendor name for the letterhead
+        pages: Number of pages (the others hold line-item continuations)
+        target_size: Pad the file with an embedded blob up to about this many bytes
+        seed: Seed for line items and padding
+        invoice_label: Label printed before the invoice number
+        order_label: Label printed before the order number
+        extra_lines: Further header lines (e.g. other reference numbers)
+        header_page: Page the header is printed on
+
+    Returns:
+        Size of the written file in bytes
+    """
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+
+    for page_number in range(pages):
+        page = doc.new_page()
+        y = 72
+        if page_number == min(header_page, pages - 1):
+            header = [
+                vendor,
+                "TAX INVOICE",
+                "",
+                f"{invoice_label}: {invoice_number}",
+                f"Invoice Date: 2025-0{rng.randint(1, 9)}-{rng.randint(10, 28)}",
+                *([f"{order_label}: {order_number}"] if order_number else []),
+                f"GSTIN: 27AAACA{rng.randint(1000, 9999)}Q1Z{rng.randint(1, 9)}",
+                *extra_lines,
+                "",
+            ]
+            for line in header:
+                page.insert_text((72, y), line, fontsize=11)
+                y += 16
+        else:
+            page.insert_text((72, y), f"{vendor} - continued (page {page_number + 1})", fontsize=11)
+            y += 24
+
+        total = 0.0
+        while y < 720:
+            quantity = rng.randint(1, 40)
+            price = round(rng.uniform(5, 500), 2)
+            total += quantity * price
+            page.insert_text(
+                (72, y), f"{rng.choice(LINE_ITEMS):<45} {quantity:>4} x {price:>8.2f}", fontsize=9
+            )
+            y += 14
+        page.insert_text((72, 760), f"Page total: {total:,.2f}", fontsize=10)
+
+    if target_size:
+        current = len(doc.tobytes())
+        if target_size > current:
+            # Incompressible padding so the file really is this large on the wire
+            doc.embfile_add('padding.bin', rng.randbytes(target_size - current))
+
+    doc.save(path)
+    doc.close()
+    return os.path.getsize(path)
+
+
+def generate_corpus(folder: str, count: int, pages: int = 1,
+                    target_size: Optional[int] = None, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Write a folder of synthetic invoices plus a labels.json manifest
+
+    Args:
+        folder: Output folder
+        count: Number of invoices
+        pages: Pages per invoice
+        target_size: Approximate size of each file in bytes
+        seed: Seed for reproducible corpora
+
+    Returns:
+        List of manifest entries ({'file', 'invoice_number', 'order_number', 'vendor', 'size'})
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = []
+
+    for index in range(count):
+        labels = make_labels(index, rng)
+        filename = f"invoice_{index:05d}.pdf"
+        size = generate_invoice_pdf(
+            os.path.join(folder, filename),
+            labels['invoice_number'],
+            labels['order_number'],
+            labels['vendor'],
+            pages=pages,
+            target_size=target_size,
+            seed=seed + index
+        )
+        manifest.append({'file': filename, **labels, 'size': size})
+
+    with open(os.path.join(folder, 'labels.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def generate_golden_set(folder: str, count: int = 40, seed: int = 2024) -> List[Dict[str, Any]]:
+    """
+    Write a labelled evaluation set that mixes the layouts extraction gets wrong
+
+    Variants (see GOLDEN_VARIANTS): the standard layout; other label
+    wordings; decoy reference numbers; no order number (expected
+    NOT_FOUND); and long documents whose header sits on a middle page,
+    where prompt truncation drops it.
+
+    Args:
+        folder: Output folder
+        count: Number of invoices
+        seed: Seed for reproducible sets
+
+    Returns:
+        List of manifest entries, also written to labels.json
+        ({'file', 'invoice_number', 'order_number', 'vendor', 'variant'})
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = []
+
+    for index in range(count):
+        variant = GOLDEN_VARIANTS[index % len(GOLDEN_VARIANTS)]
+        labels = make_labels(index, rng)
+        options: Dict[str, Any] = {}
+        if variant == 'label_variants':
+            options['invoice_label'] = rng.choice(INVOICE_LABELS)
+            options['order_label'] = rng.choice(ORDER_LABELS)
+        elif variant == 'decoys':
+            options['extra_lines'] = [f"{label}: {rng.choice(['DN', 'QT', 'CU', 'DD'])}-{rng.randint(10000, 99999)}"
+                                      for label in rng.sample(DECOY_LABELS, 2)]
+        elif variant == 'no_order':
+            labels['order_number'] = ''
+        elif variant == 'long':
+            options['pages'] = 5
+            options['header_page'] = 2
+
+        filename = f"golden_{index:04d}_{variant}.pdf"
+        generate_invoice_pdf(os.path.join(folder, filename), labels['invoice_number'], labels['order_number'],
+                             labels['vendor'], seed=seed + index, **options)
+        manifest.append({
+            'file': filename,
+            'invoice_number': labels['invoice_number'],
+            'order_number': labels['order_number'] or NOT_FOUND,
+            'vendor': labels['vendor'],
+            'variant': variant,
+        })
+
+    with open(os.path.join(folder, 'labels.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+__all__ = [
+    'GOLDEN_VARIANTS',
+    'NOT_FOUND',
+    'generate_corpus',
+    'generate_golden_set',
+    'generate_invoice_pdf',
+    'make_labels'
+]
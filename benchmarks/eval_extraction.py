@@ -0,0 +1,614 @@
+"""
+Mars AI Agents - Extraction Evaluation
+Runs a labelled golden set of invoice PDFs through each extraction strategy
+and model backend, and reports accuracy next to cost and latency, so a
+change made for speed can be judged on both axes
+
+Strategies:
+    graph      run_document() per document (invoice and order calls)
+    pruned     the same graph with the prompt budget cut to --pruned-tokens
+    packed     run_documents(pack=True): short documents share one call
+    batch      BatchExtractionJob through a local batch provider
+    templates  the graph with vendor layout templates, learned as it goes
+    patterns   label regexes only, no model (candidate fast path)
+
+Backends:
+    stub       benchmarks.stub_llm (regex answers, simulated latency)
+    recorded   replays a cassette of real model answers (--cassette)
+    live       the configured OpenAI model; --cassette records its answers
+
+Per strategy and backend it reports exact-match accuracy per field and for
+both fields, the "Not Found" rate, model tokens, and p50/p95 latency per
+document. Packed and batch latencies are the run's wall time per document.
+
+Usage:
+    python -m benchmarks.eval_extraction
+    python -m benchmarks.eval_extraction --backends live --cassette benchmarks/golden/cassette.jsonl
+    python -m benchmarks.eval_extraction --backends recorded --cassette benchmarks/golden/cassette.jsonl
+    python -m benchmarks.eval_extraction --golden benchmarks/golden --baseline benchmarks/results/eval_baseline.json
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import NOT_FOUND, generate_golden_set
+from benchmarks.run_benchmarks import RESULTS_FOLDER, git_revision, percentiles
+
+FIELDS = ('invoice_number', 'order_number')
+
+# Answers that mean "the document doesn't say"
+_ABSENT = {'', 'not found', 'n/a', 'none', 'null'}
+
+# Candidate fast path: the label wordings the prompts list, as regexes
+PATTERN_RULES = {
+    'invoice_number': re.compile(
+        r'\b(?:Invoice\s*(?:No\.?|Number|#)|Inv\.?\s*No\.?)\s*[:#]?\s*([A-Z0-9][A-Z0-9/\-]{2,})', re.IGNORECASE),
+    'order_number': re.compile(
+        r"\b(?:(?:Buyer'?s\s*)?Order\s*(?:No\.?|Number|ID|#)|PO\s*(?:No\.?|Number|#)|Purchase\s*Order(?:\s*No\.?)?)"
+        r"\s*[:#]?\s*([A-Z0-9][A-Z0-9/\-]{2,})", re.IGNORECASE),
+}
+
+
+def normalize(value: Any) -> str:
+    """Compare values as written, but treat every 'absent' answer alike"""
+    text = str(value or '').strip()
+    return NOT_FOUND if text.lower() in _ABSENT else text
+
+
+def load_golden_set(folder: str) -> List[Dict[str, Any]]:
+    """
+    Read a golden set's labels.json
+
+    Args:
+        folder: Folder holding the PDFs and labels.json
+            ([{'file', 'invoice_number', 'order_number', ...}], with
+            "Not Found" for fields the document doesn't contain)
+
+    Returns:
+        Manifest entries with an absolute 'path' added
+    """
+    with open(os.path.join(folder, 'labels.json')) as f:
+        manifest = json.load(f)
+    return [{**entry, 'path': os.path.abspath(os.path.join(folder, entry['file']))} for entry in manifest]
+
+
+# Backends -------------------------------------------------------------------
+
+def cassette_key(fields: Sequence[str], contents: Sequence[str]) -> str:
+    """Key of a model call: the answer's fields and the prompt's message texts"""
+    payload = json.dumps({'fields': sorted(fields), 'messages': list(contents)}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Recorded structured answers and token usage, keyed by prompt (JSONL file)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+        return entry
+
+    def put(self, key: str, values: Dict[str, Any], usage: Dict[str, Any]):
+        entry = {'key': key, 'values': values, 'usage': usage}
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class RecordedModel:
+    """
+    Mimics ChatOpenAI.with_structured_output(schema, include_raw=True) from a cassette
+
+    Without an inner model it replays (a prompt that isn't recorded raises
+    KeyError); with one it forwards the call and records the answer.
+    """
+
+    def __init__(self, schema: type, cassette: Cassette, inner: Any = None):
+        self.schema = schema
+        self.cassette = cassette
+        self.inner = inner
+
+    def invoke(self, prompt: Any, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        from langchain_core.messages import AIMessage
+
+        contents = [message.content for message in prompt] if isinstance(prompt, (list, tuple)) else [str(prompt)]
+        key = cassette_key(self.schema.model_fields, contents)
+        if self.inner is not None:
+            response = self.inner.invoke(prompt, config)
+            if response.get('parsing_error') is None and response.get('parsed') is not None:
+                usage = dict(getattr(response['raw'], 'usage_metadata', None) or {})
+                self.cassette.put(key, response['parsed'].model_dump(), usage)
+            return response
+
+        entry = self.cassette.get(key)
+        if entry is None:
+            raise KeyError(f"No recorded answer for this {self.schema.__name__} prompt; re-record the cassette")
+        raw = AIMessage(content='', usage_metadata=entry['usage'])
+        return {'raw': raw, 'parsed': self.schema(**entry['values']), 'parsing_error': None}
+
+
+def install_backend(name: str, cassette: Optional[Cassette] = None, latency_seconds: float = 0.0):
+    """
+    Point the extraction graph's models at a backend
+
+    Args:
+        name: 'stub', 'recorded' or 'live'
+        cassette: Answers to replay (recorded) or record (live, optional)
+        latency_seconds: Simulated latency of the stub
+    """
+    from orchestrator import langgraph_orchestrator as graph_module
+
+    # Offline backends have no provider limits; the gateway's per-minute
+    # budgets would only add waits that depend on the order strategies run in
+    from config import get_llm_config
+    settings = get_llm_config()
+    graph_module.gateway.request_budget.per_minute = \
+        settings['requests_per_minute'] if name == 'live' else 10 ** 9
+    graph_module.gateway.token_budget.per_minute = settings['tokens_per_minute'] if name == 'live' else 10 ** 12
+
+    model_names = {'invoice_model_pdf': graph_module.GetInvvoice,
+                   'order_model_pdf': graph_module.GetOrderNumber,
+                   'packed_model_pdf': graph_module.PackedExtraction}
+    if name == 'stub':
+        from benchmarks.stub_llm import install_stub_llm
+        install_stub_llm(latency_seconds)
+        return
+    if name == 'recorded':
+        if cassette is None:
+            raise ValueError('The recorded backend needs --cassette')
+        for attribute, schema in model_names.items():
+            setattr(graph_module, attribute, RecordedModel(schema, cassette))
+        return
+    if name == 'live':
+        # Rebuilt on next use, replacing whatever an earlier backend installed
+        for attribute in model_names:
+            graph_module.__dict__.pop(attribute, None)
+        if cassette is not None:
+            for attribute, schema in model_names.items():
+                setattr(graph_module, attribute, RecordedModel(schema, cassette, getattr(graph_module, attribute)))
+        return
+    raise ValueError(f"Unknown backend '{name}'")
+
+
+def _batch_respond(body: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """Answer a batch request with the installed models, so batch shares the backend"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from orchestrator import langgraph_orchestrator as graph_module
+
+    fields = set(body['response_format']['json_schema']['schema'].get('properties', {}))
+    model = graph_module.invoice_model_pdf if fields == {'invoice_number'} else graph_module.order_model_pdf
+    messages = [SystemMessage(content=message['content']) if message['role'] == 'system'
+                else HumanMessage(content=message['content']) for message in body['messages']]
+    response = model.invoke(messages)
+    if response.get('parsing_error') is not None:
+        raise response['parsing_error']
+    usage = getattr(response['raw'], 'usage_metadata', None) or {}
+    return response['parsed'].model_dump(), {
+        'prompt_tokens': usage.get('input_tokens', 0),
+        'completion_tokens': usage.get('output_tokens', 0),
+        'total_tokens': usage.get('total_tokens', 0),
+    }
+
+
+# Strategies -----------------------------------------------------------------
+# Each takes the document paths and returns ({path: prediction}, latencies,
+# token totals or None to use the gateway's counters)
+
+@contextlib.contextmanager
+def config_override(section: str, **values: Any) -> Iterator[None]:
+    """Temporarily change settings in DEFAULT_CONFIG"""
+    from config import DEFAULT_CONFIG
+
+    previous = {key: DEFAULT_CONFIG[section].get(key) for key in values}
+    DEFAULT_CONFIG[section].update(values)
+    try:
+        yield
+    finally:
+        DEFAULT_CONFIG[section].update(previous)
+
+
+def _predict(state: Dict[str, Any]) -> Dict[str, Any]:
+    if state.get('triage', {}).get('decision', 'extract') != 'extract':
+        return {'error': f"triage: {state['triage'].get('reason')}"}
+    return {field: state.get(field, '') for field in FIELDS}
+
+
+def run_graph_strategy(paths: Sequence[str], options: Dict[str, Any]):
+    from orchestrator.langgraph_orchestrator import run_document
+
+    predictions, latencies = {}, []
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            predictions[path] = _predict(run_document(path, force=True))
+        except Exception as e:
+            predictions[path] = {'error': f"{type(e).__name__}: {e}"}
+        latencies.append(time.perf_counter() - started)
+    return predictions, latencies, None
+
+
+def run_pruned_strategy(paths: Sequence[str], options: Dict[str, Any]):
+    with config_override('prompts', max_input_tokens=options['pruned_tokens']):
+        return run_graph_strategy(paths, options)
+
+
+def run_packed_strategy(paths: Sequence[str], options: Dict[str, Any]):
+    from orchestrator.document_packing import run_documents
+
+    started = time.perf_counter()
+    try:
+        states = run_documents(list(paths), force=True, pack=True)
+        predictions = {path: _predict(state) for path, state in zip(paths, states)}
+    except Exception as e:
+        predictions = {path: {'error': f"{type(e).__name__}: {e}"} for path in paths}
+    per_document = (time.perf_counter() - started) / max(1, len(paths))
+    return predictions, [per_document] * len(paths), None
+
+
+def run_batch_strategy(paths: Sequence[str], options: Dict[str, Any]):
+    from orchestrator.batch_extraction import BatchExtractionJob, LocalBatchProvider
+
+    work_folder = os.path.join('batch', uuid.uuid4().hex[:8])
+    job = BatchExtractionJob(LocalBatchProvider(os.path.join(work_folder, 'local'), respond=_batch_respond),
+                             db_path=os.path.join(work_folder, 'jobs.db'), work_folder=work_folder)
+    started = time.perf_counter()
+    for folder in sorted({os.path.dirname(path) for path in paths}):
+        job.discover(folder)
+    job.run(wait=True, poll_interval=0)
+    per_document = (time.perf_counter() - started) / max(1, len(paths))
+
+    wanted = set(paths)
+    predictions: Dict[str, Dict[str, Any]] = {}
+    tokens = {'input_tokens': 0, 'output_tokens': 0}
+    rows = job.connection.execute(
+        'SELECT path, state, invoice_number, order_number, input_tokens, output_tokens, error FROM batch_items'
+    ).fetchall()
+    for row in rows:
+        path = os.path.abspath(row['path'])
+        if path not in wanted:
+            continue
+        tokens['input_tokens'] += row['input_tokens']
+        tokens['output_tokens'] += row['output_tokens']
+        predictions[path] = ({field: row[field] or '' for field in FIELDS} if row['state'] == 'done'
+                             else {'error': f"{row['state']}: {row['error']}"})
+    job.connection.close()
+    return predictions, [per_document] * len(paths), tokens
+
+
+def run_templates_strategy(paths: Sequence[str], options: Dict[str, Any]):
+    from utils import layout_templates
+
+    # A fresh store per run: templates start empty and are learned from the run's own answers
+    previous = layout_templates._template_store.replace(layout_templates.LayoutTemplateStore(
+        **{**layout_templates.get_templates_config(), 'enabled': True,
+           'db_path': os.path.join('templates', f'{uuid.uuid4().hex[:8]}.db')}))
+    try:
+        return run_graph_strategy(paths, options)
+    finally:
+        layout_templates._template_store.replace(previous)
+
+
+def pattern_extract(text: str) -> Dict[str, str]:
+    """Fields found by PATTERN_RULES (NOT_FOUND where no label matches)"""
+    values = {}
+    for field, pattern in PATTERN_RULES.items():
+        match = pattern.search(text)
+        values[field] = match.group(1) if match else NOT_FOUND
+    return values
+
+
+def run_patterns_strategy(paths: Sequence[str], options: Dict[str, Any]):
+    from orchestrator.langgraph_orchestrator import read_attachment, triage
+
+    predictions, latencies = {}, []
+    for path in paths:
+        started = time.perf_counter()
+        state: Dict[str, Any] = {'attachment': os.path.basename(path), 'data_folder': os.path.dirname(path)}
+        state.update(triage(state))
+        if state['triage']['decision'] == 'extract':
+            state.update(read_attachment(state))
+        predictions[path] = pattern_extract(state['attachment']) if state['triage']['decision'] == 'extract' \
+            else _predict(state)
+        latencies.append(time.perf_counter() - started)
+    return predictions, latencies, {'input_tokens': 0, 'output_tokens': 0}
+
+
+STRATEGIES: Dict[str, Callable] = {
+    'graph': run_graph_strategy,
+    'pruned': run_pruned_strategy,
+    'packed': run_packed_strategy,
+    'batch': run_batch_strategy,
+    'templates': run_templates_strategy,
+    'patterns': run_patterns_strategy,
+}
+
+# Strategies that never call a model run once, not once per backend
+MODEL_FREE_STRATEGIES = {'patterns'}
+
+
+# Scoring ----------------------------------------------------------------------
+
+def score(golden: List[Dict[str, Any]], predictions: Dict[str, Dict[str, Any]],
+          latencies: List[float], tokens: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Accuracy, "Not Found" rate, tokens and latency of one strategy run
+
+    Args:
+        golden: Manifest entries (with 'path')
+        predictions: Path -> {'invoice_number', 'order_number'} or {'error'}
+        latencies: Seconds per document
+        tokens: {'input_tokens', 'output_tokens'} for the whole run
+
+    Returns:
+        Metrics, plus the mistakes for inspection
+    """
+    documents = len(golden)
+    correct = {field: 0 for field in FIELDS}
+    both = not_found = errors = 0
+    by_variant: Dict[str, List[int]] = {}
+    mistakes = []
+    for entry in golden:
+        prediction = predictions.get(entry['path']) or {'error': 'no result'}
+        if 'error' in prediction:
+            errors += 1
+        hits = []
+        for field in FIELDS:
+            predicted = normalize(prediction.get(field))
+            expected = normalize(entry[field])
+            not_found += predicted == NOT_FOUND
+            hits.append(predicted == expected)
+            correct[field] += predicted == expected
+            if predicted != expected:
+                mistakes.append({'file': entry['file'], 'field': field, 'expected': expected,
+                                 'predicted': prediction.get('error') or predicted})
+        both += all(hits)
+        counts = by_variant.setdefault(entry.get('variant', 'all'), [0, 0])
+        counts[0] += all(hits)
+        counts[1] += 1
+
+    total_tokens = tokens['input_tokens'] + tokens['output_tokens']
+    return {
+        'documents': documents,
+        'accuracy': {**{field: round(correct[field] / documents, 4) if documents else 0.0 for field in FIELDS},
+                     'both': round(both / documents, 4) if documents else 0.0},
+        'accuracy_by_variant': {variant: round(hit / total, 4) for variant, (hit, total) in sorted(by_variant.items())},
+        'not_found_rate': round(not_found / (documents * len(FIELDS)), 4) if documents else 0.0,
+        'errors': errors,
+        'tokens': {**tokens, 'total': total_tokens,
+                   'per_document': round(total_tokens / documents, 1) if documents else 0.0},
+        'latency': percentiles(latencies),
+        'mistakes': mistakes,
+    }
+
+
+def evaluate(golden: List[Dict[str, Any]], strategies: Sequence[str], backends: Sequence[str],
+             options: Dict[str, Any], cassette: Optional[Cassette] = None) -> List[Dict[str, Any]]:
+    """
+    Run every strategy under every backend over the golden set
+
+    Args:
+        golden: Manifest entries (with 'path')
+        strategies: Names from STRATEGIES
+        backends: 'stub', 'recorded' and/or 'live'
+        options: Strategy options ('pruned_tokens', 'stub_latency')
+        cassette: Cassette for the recorded/live backends
+
+    Returns:
+        One result per (strategy, backend) run
+    """
+    from orchestrator.langgraph_orchestrator import gateway
+
+    paths = [entry['path'] for entry in golden]
+    results = []
+    for backend in backends:
+        install_backend(backend, cassette, options.get('stub_latency', 0.0))
+        for strategy in strategies:
+            if strategy in MODEL_FREE_STRATEGIES and backend != backends[0]:
+                continue
+            before = gateway.stats()['totals']
+            predictions, latencies, tokens = STRATEGIES[strategy](paths, options)
+            if tokens is None:
+                after = gateway.stats()['totals']
+                tokens = {kind: after[kind] - before[kind] for kind in ('input_tokens', 'output_tokens')}
+            results.append({
+                'strategy': strategy,
+                'backend': 'none' if strategy in MODEL_FREE_STRATEGIES else backend,
+                **score(golden, predictions, latencies, tokens),
+            })
+    return results
+
+
+def check_regressions(baseline: Dict[str, Any], current: Dict[str, Any],
+                      max_accuracy_drop: float, max_latency_regression_pct: float) -> List[str]:
+    """
+    Compare a run with a saved baseline, per strategy and backend
+
+    Args:
+        baseline: Saved results
+        current: Results of this run
+        max_accuracy_drop: Allowed drop in both-fields accuracy (0.02 = 2 points)
+        max_latency_regression_pct: Allowed p95 slowdown in percent
+
+    Returns:
+        Human-readable regression descriptions (empty if none)
+    """
+    failures = []
+    before_runs = {(run['strategy'], run['backend']): run for run in baseline.get('runs', [])}
+    for run in current.get('runs', []):
+        before = before_runs.get((run['strategy'], run['backend']))
+        if not before:
+            continue
+        name = f"{run['strategy']}/{run['backend']}"
+        if run['accuracy']['both'] < before['accuracy']['both'] - max_accuracy_drop:
+            failures.append(f"{name} accuracy: {before['accuracy']['both']:.1%} -> {run['accuracy']['both']:.1%}")
+        old_p95, new_p95 = before['latency']['p95_ms'], run['latency']['p95_ms']
+        if old_p95 and new_p95 > old_p95 * (1 + max_latency_regression_pct / 100) and new_p95 - old_p95 > 5:
+            failures.append(f"{name} p95 latency: {old_p95} -> {new_p95} ms")
+    return failures
+
+
+def print_report(results: Dict[str, Any]):
+    runs = results['runs']
+    print(f"Extraction evaluation @ {results['git_revision']}: {results['golden']['documents']} documents "
+          f"from {results['golden']['folder']}")
+    header = (f"  {'strategy':<10} {'backend':<9} {'both':>7} {'invoice':>8} {'order':>7} {'not found':>10} "
+              f"{'tokens/doc':>11} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    print(header)
+    print('  ' + '-' * (len(header) - 2))
+    for run in runs:
+        accuracy = run['accuracy']
+        print(f"  {run['strategy']:<10} {run['backend']:<9} {accuracy['both']:>7.1%} "
+              f"{accuracy['invoice_number']:>8.1%} {accuracy['order_number']:>7.1%} "
+              f"{run['not_found_rate']:>10.1%} {run['tokens']['per_document']:>11.1f} "
+              f"{run['latency']['p50_ms']:>9.1f} {run['latency']['p95_ms']:>9.1f} {run['errors']:>7}")
+    variants = sorted({variant for run in runs for variant in run['accuracy_by_variant']})
+    if len(variants) > 1:
+        print("\n  Both-fields accuracy by variant:")
+        print(f"  {'':<20} " + ' '.join(f"{variant:>14}" for variant in variants))
+        for run in runs:
+            name = f"{run['strategy']}/{run['backend']}"
+            print(f"  {name:<20} " + ' '.join(f"{run['accuracy_by_variant'].get(variant, 0):>14.0%}"
+                                             for variant in variants))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Accuracy versus cost and latency of the extraction strategies')
+    parser.add_argument('--golden', help='Golden set folder with labels.json (default: generate a synthetic one)')
+    parser.add_argument('--build-golden', metavar='FOLDER', help='Write a synthetic golden set here and exit')
+    parser.add_argument('--count', type=int, default=40, help='Documents in a generated golden set')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES),
+                        help=f"Comma-separated subset of {','.join(STRATEGIES)}")
+    parser.add_argument('--backends', default='stub', help='Comma-separated subset of stub,recorded,live')
+    parser.add_argument('--cassette', help='Recorded answers: replayed by "recorded", written by "live"')
+    parser.add_argument('--pruned-tokens', type=int, default=1000, help='Prompt budget of the pruned strategy')
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0, help='Simulated stub model latency')
+    parser.add_argument('--baseline', help='Fail if results regress against this file')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.0,
+                        help='Allowed drop in both-fields accuracy (fraction, e.g. 0.02)')
+    parser.add_argument('--max-latency-regression', type=float, default=25.0, help='Allowed p95 slowdown in percent')
+    parser.add_argument('--save-baseline', help='Write results to this file')
+    parser.add_argument('--no-save', action='store_true', help='Do not write a results file')
+    args = parser.parse_args(argv)
+
+    if args.build_golden:
+        manifest = generate_golden_set(args.build_golden, args.count)
+        print(f"Wrote {len(manifest)} documents and labels.json to {args.build_golden}")
+        return 0
+
+    strategies = [name.strip() for name in args.strategies.split(',') if name.strip()]
+    backends = [name.strip() for name in args.backends.split(',') if name.strip()]
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"Unknown strategies: {', '.join(unknown)}")
+    unknown = [name for name in backends if name not in ('stub', 'recorded', 'live')]
+    if unknown:
+        parser.error(f"Unknown backends: {', '.join(unknown)}")
+    if 'recorded' in backends and not args.cassette:
+        parser.error('--backends recorded needs --cassette')
+    cassette = Cassette(os.path.abspath(args.cassette)) if args.cassette else None
+
+    from config import DEFAULT_CONFIG
+    # Near-duplicate reuse and layout templates would let earlier answers stand
+    # in for the strategy under test (the templates strategy turns them on)
+    DEFAULT_CONFIG['dedup']['enabled'] = False
+    DEFAULT_CONFIG['templates']['enabled'] = False
+
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='mars-eval-') as workdir:
+        golden_folder = os.path.abspath(args.golden) if args.golden else os.path.join(workdir, 'golden')
+        if not args.golden:
+            generate_golden_set(golden_folder, args.count)
+        golden = load_golden_set(golden_folder)
+
+        # Checkpoints, the search index and batch files use relative paths; keep them out of the repo
+        os.chdir(workdir)
+        try:
+            runs = evaluate(golden, strategies, backends,
+                            {'pruned_tokens': args.pruned_tokens, 'stub_latency': args.stub_latency_ms / 1000},
+                            cassette)
+        finally:
+            os.chdir(original_cwd)
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'parameters': vars(args),
+        'golden': {'folder': args.golden or f'synthetic ({args.count})', 'documents': len(golden)},
+        'runs': runs,
+    }
+    print_report(results)
+    if cassette is not None and cassette.misses:
+        print(f"\n  {cassette.misses} prompt(s) were not in the cassette")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    elif not args.no_save:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        with open(os.path.join(RESULTS_FOLDER, f"eval_{stamp}_{results['git_revision']}.json"), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regressions(json.load(f), results, args.max_accuracy_drop,
+                                         args.max_latency_regression)
+        if failures:
+            print("\nRegressions against the baseline:")
+            for failure in failures:
+                print(f"  - {failure}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+__all__ = [
+    'Cassette',
+    'RecordedModel',
+    'STRATEGIES',
+    'cassette_key',
+    'evaluate',
+    'install_backend',
+    'load_golden_set',
+    'pattern_extract',
+    'score'
+]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
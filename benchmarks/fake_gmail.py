@@ -0,0 +1,222 @@
+"""
+Mars AI Agents - Fake Gmail Service
+In-memory replacement for the googleapiclient Gmail resource that replays a
+configurable synthetic mailbox
+"""
+
+import base64
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.corpus import generate_invoice_pdf, make_labels
+
+# Stand-in bytes for an inline signature image
+_LOGO_DATA = base64.urlsafe_b64encode(b'\x89PNG\r\n\x1a\n' + bytes(6 * 1024)).decode('ascii')
+
+
+class _Request:
+    """Mimics googleapiclient's HttpRequest: work happens on execute()"""
+
+    def __init__(self, service: 'FakeGmailService', method: str, handler, **kwargs):
+        self._service = service
+        self._method = method
+        self._handler = handler
+        self._kwargs = kwargs
+
+    def execute(self) -> Dict[str, Any]:
+        self._service.record_call(self._method)
+        if self._service.latency_seconds:
+            time.sleep(self._service.latency_seconds)
+        return self._handler(**self._kwargs)
+
+
+class _Resource:
+    """Attribute/call chain node: service.users().messages().get(...)"""
+
+    def __init__(self, service: 'FakeGmailService', path: str):
+        self._service = service
+        self._path = path
+
+    def users(self):
+        return _Resource(self._service, 'users')
+
+    def messages(self):
+        return _Resource(self._service, 'messages')
+
+    def attachments(self):
+        return _Resource(self._service, 'messages.attachments')
+
+    def history(self):
+        return _Resource(self._service, 'history')
+
+    def getProfile(self, userId: str = 'me'):
+        return _Request(self._service, 'users.getProfile', self._service.get_profile)
+
+    def list(self, userId: str = 'me', **kwargs):
+        if self._path == 'history':
+            return _Request(self._service, 'history.list', self._service.list_history, **kwargs)
+        return _Request(self._service, 'messages.list', self._service.list_messages, **kwargs)
+
+    def get(self, userId: str = 'me', **kwargs):
+        if self._path == 'messages.attachments':
+            return _Request(self._service, 'messages.attachments.get', self._service.get_attachment, **kwargs)
+        return _Request(self._service, 'messages.get', self._service.get_message, **kwargs)
+
+
+class FakeGmailService:
+    """
+    Replays a synthetic mailbox through the subset of the Gmail API we use
+
+    Attachments are real invoice PDFs (see benchmarks.corpus) so the files
+    written by ingestion can be fed straight into the extraction graph.
+    """
+
+    def __init__(self, message_count: int = 20, attachments_per_message: int = 1,
+                 attachment_size: int = 100 * 1024, latency_seconds: float = 0.0,
+                 email_address: str = 'demotest.tcs@gmail.com', unique_templates: int = 8,
+                 seed: int = 7):
+        """
+        Build the mailbox
+
+        Args:
+            message_count: Number of messages in the mailbox
+            attachments_per_message: PDF attachments per message
+            attachment_size: Approximate size of each attachment in bytes
+            latency_seconds: Simulated round-trip time per API call
+            email_address: Address reported by getProfile
+            unique_templates: Distinct PDF bodies to generate (reused round-robin)
+            seed: Seed for reproducible mailboxes
+        """
+        self.email_address = email_address
+        self.latency_seconds = latency_seconds
+        self.calls: Dict[str, int] = {}
+        self._calls_lock = threading.Lock()
+
+        rng = random.Random(seed)
+        self.labels: Dict[str, Dict[str, str]] = {}
+        self._attachments: Dict[str, str] = {}
+        self._messages: Dict[str, Dict[str, Any]] = {}
+
+        # Generating a PDF per attachment is slow for large mailboxes, so a
+        # handful of bodies are rendered once and shared between messages
+        templates = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for index in range(max(1, unique_templates)):
+                labels = make_labels(index, rng)
+                path = os.path.join(tmp, f"template_{index}.pdf")
+                generate_invoice_pdf(path, labels['invoice_number'], labels['order_number'],
+                                     labels['vendor'], target_size=attachment_size, seed=seed + index)
+                with open(path, 'rb') as f:
+                    templates.append((labels, base64.urlsafe_b64encode(f.read()).decode('ascii')))
+
+        now_ms = int(time.time() * 1000)
+        for m in range(message_count):
+            message_id = f"msg{m:06x}"
+            parts = [{
+                'partId': '0',
+                'mimeType': 'text/plain',
+                'filename': '',
+                'body': {'size': 42, 'data': base64.urlsafe_b64encode(b'Please find the invoice attached.').decode()}
+            }]
+            for a in range(attachments_per_message):
+                labels, data = templates[(m * attachments_per_message + a) % len(templates)]
+                attachment_id = f"att-{message_id}-{a}"
+                filename = f"invoice_{m:05d}_{a}.pdf"
+                self._attachments[attachment_id] = data
+                self.labels[filename] = labels
+                parts.append({
+                    'partId': str(a + 1),
+                    'mimeType': 'application/pdf',
+                    'filename': filename,
+                    'body': {'attachmentId': attachment_id, 'size': len(data) * 3 // 4}
+                })
+
+            # Signature logo, as most mail clients attach one; the default
+            # attachment filter should skip it without fetching it
+            logo_id = f"att-{message_id}-logo"
+            self._attachments[logo_id] = _LOGO_DATA
+            parts.append({
+                'partId': str(attachments_per_message + 1),
+                'mimeType': 'image/png',
+                'filename': 'image001.png',
+                'body': {'attachmentId': logo_id, 'size': len(_LOGO_DATA) * 3 // 4}
+            })
+
+            vendor = templates[m % len(templates)][0]['vendor']
+            self._messages[message_id] = {
+                'id': message_id,
+                'threadId': message_id,
+                'historyId': str(1000 + m),
+                'internalDate': str(now_ms - m * 60_000),
+                'payload': {
+                    'mimeType': 'multipart/mixed',
+                    'headers': [
+                        {'name': 'From', 'value': f"{vendor} <billing@vendor{m % len(templates)}.example>"},
+                        {'name': 'To', 'value': email_address},
+                        {'name': 'Subject', 'value': f"Invoice {m:05d}"},
+                        {'name': 'Date', 'value': time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime(now_ms / 1000 - m * 60))},
+                    ],
+                    'parts': parts
+                }
+            }
+        self._message_ids: List[str] = list(self._messages)
+
+    def users(self):
+        return _Resource(self, 'users')
+
+    def record_call(self, method: str):
+        with self._calls_lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    @property
+    def total_attachment_bytes(self) -> int:
+        return sum(len(data) * 3 // 4 for data in self._attachments.values())
+
+    # Handlers -------------------------------------------------------------
+
+    def get_profile(self) -> Dict[str, Any]:
+        return {
+            'emailAddress': self.email_address,
+            'messagesTotal': len(self._message_ids),
+            'historyId': str(1000 + len(self._message_ids))
+        }
+
+    def list_messages(self, q: str = '', maxResults: int = 100,
+                      pageToken: Optional[str] = None, **_) -> Dict[str, Any]:
+        start = int(pageToken or 0)
+        end = min(start + maxResults, len(self._message_ids))
+        result: Dict[str, Any] = {
+            'messages': [{'id': mid, 'threadId': mid} for mid in self._message_ids[start:end]],
+            'resultSizeEstimate': len(self._message_ids)
+        }
+        if end < len(self._message_ids):
+            result['nextPageToken'] = str(end)
+        return result
+
+    def get_message(self, id: str, **_) -> Dict[str, Any]:
+        return self._messages[id]
+
+    def get_attachment(self, messageId: str, id: str, **_) -> Dict[str, Any]:
+        data = self._attachments[id]
+        return {'attachmentId': id, 'size': len(data) * 3 // 4, 'data': data}
+
+    def list_history(self, startHistoryId: str = '0', **_) -> Dict[str, Any]:
+        start = int(startHistoryId)
+        added = [
+            {'message': {'id': mid}}
+            for mid, message in self._messages.items()
+            if int(message['historyId']) > start
+        ]
+        return {
+            'history': [{'messagesAdded': added}] if added else [],
+            'historyId': str(1000 + len(self._message_ids))
+        }
+
+
+__all__ = [
+    'FakeGmailService'
+]
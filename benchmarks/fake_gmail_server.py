@@ -0,0 +1,222 @@
+"""
+Mars AI Agents - Fake Gmail Server
+Serves a FakeGmailService mailbox over the Gmail REST endpoints the async
+transport calls, so it can be exercised without Google: in-process through
+httpx.ASGITransport, or over real keep-alive sockets with uvicorn.
+
+The server can add latency and answer every Nth request with a 429 (with
+Retry-After) to exercise the retry policy, and it counts the distinct
+client connections it saw, which shows whether requests reuse the pool.
+
+Usage:
+    python -m benchmarks.fake_gmail_server --messages 200 --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from benchmarks.fake_gmail import FakeGmailService
+
+# Mount point matching utils.gmail_transport.GMAIL_API_URL
+USERS_PATH = '/gmail/v1/users'
+
+
+def _gmail_error(status: int, reason: str, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """An error response shaped like Gmail's"""
+    body = {'error': {'code': status, 'message': message,
+                      'errors': [{'reason': reason, 'message': message}]}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+class FakeGmailServer:
+    """ASGI app exposing a FakeGmailService, optionally served by uvicorn"""
+
+    def __init__(self, service: FakeGmailService, rate_limit_every: int = 0,
+                 retry_after_seconds: float = 0.05):
+        """
+        Build the app
+
+        Args:
+            service: Mailbox to serve (its latency_seconds is applied per request)
+            rate_limit_every: Answer every Nth request with a 429 (0: never)
+            retry_after_seconds: Retry-After sent with those 429s
+        """
+        self.service = service
+        self.rate_limit_every = rate_limit_every
+        self.retry_after_seconds = retry_after_seconds
+        self.requests = 0
+        self.rate_limited = 0
+        self.http_versions: Dict[str, int] = {}
+        self.connections: Set[Tuple[str, int]] = set()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self.base_url: Optional[str] = None
+
+        self.app = Starlette(routes=[
+            Route(f'{USERS_PATH}/{{user}}/profile', self._profile),
+            Route(f'{USERS_PATH}/{{user}}/messages', self._list_messages),
+            Route(f'{USERS_PATH}/{{user}}/messages/{{message_id}}', self._get_message),
+            Route(f'{USERS_PATH}/{{user}}/messages/{{message_id}}/attachments/{{attachment_id}}',
+                  self._get_attachment),
+            Route(f'{USERS_PATH}/{{user}}/history', self._list_history),
+        ])
+
+    @property
+    def users_url(self) -> str:
+        """Base URL to hand to AsyncGmailTransport (once started)"""
+        return f"{self.base_url}{USERS_PATH}"
+
+    async def _call(self, request: Request, method: str, handler, **kwargs) -> JSONResponse:
+        """Shared request handling: auth, bookkeeping, latency and injected 429s"""
+        client = request.scope.get('client')
+        if client:
+            self.connections.add(tuple(client))
+        version = request.scope.get('http_version', '1.1')
+        self.http_versions[version] = self.http_versions.get(version, 0) + 1
+        self.requests += 1
+
+        if not request.headers.get('authorization', '').startswith('Bearer '):
+            return _gmail_error(401, 'authError', 'Invalid Credentials')
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return _gmail_error(429, 'rateLimitExceeded', 'Rate Limit Exceeded',
+                                {'Retry-After': str(self.retry_after_seconds)})
+
+        self.service.record_call(method)
+        if self.service.latency_seconds:
+            await asyncio.sleep(self.service.latency_seconds)
+        try:
+            return JSONResponse(handler(**kwargs))
+        except KeyError:
+            return _gmail_error(404, 'notFound', 'Requested entity was not found.')
+
+    async def _profile(self, request: Request) -> JSONResponse:
+        return await self._call(request, 'users.getProfile', self.service.get_profile)
+
+    async def _list_messages(self, request: Request) -> JSONResponse:
+        params = request.query_params
+        return await self._call(request, 'messages.list', self.service.list_messages,
+                                q=params.get('q', ''), maxResults=int(params.get('maxResults', 100)),
+                                pageToken=params.get('pageToken'))
+
+    async def _get_message(self, request: Request) -> JSONResponse:
+        return await self._call(request, 'messages.get', self.service.get_message,
+                                id=request.path_params['message_id'])
+
+    async def _get_attachment(self, request: Request) -> JSONResponse:
+        return await self._call(request, 'messages.attachments.get', self.service.get_attachment,
+                                messageId=request.path_params['message_id'],
+                                id=request.path_params['attachment_id'])
+
+    async def _list_history(self, request: Request) -> JSONResponse:
+        return await self._call(request, 'history.list', self.service.list_history,
+                                startHistoryId=request.query_params.get('startHistoryId', '0'))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'connections': len(self.connections),
+            'http_versions': dict(self.http_versions),
+        }
+
+    # Serving over sockets ---------------------------------------------------
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Serve the app with uvicorn from a background thread
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0: any free port)
+
+        Returns:
+            The server's base URL
+        """
+        import uvicorn
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        self.base_url = f"http://{host}:{sock.getsockname()[1]}"
+
+        config = uvicorn.Config(self.app, log_level='warning', access_log=False,
+                                lifespan='off', backlog=2048)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={'sockets': [sock]},
+                                        name='fake-gmail-server', daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError('Fake Gmail server did not start')
+            time.sleep(0.01)
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._server = None
+
+    def __enter__(self) -> 'FakeGmailServer':
+        if self._server is None:
+            self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+__all__ = [
+    'FakeGmailServer',
+    'USERS_PATH'
+]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Serve a synthetic mailbox over the Gmail REST API')
+    parser.add_argument('--messages', type=int, default=50, help='Messages in the mailbox')
+    parser.add_argument('--attachments', type=int, default=1, help='PDF attachments per message')
+    parser.add_argument('--attachment-kb', type=int, default=100, help='Approximate attachment size')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Simulated latency per request')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Answer every Nth request with a 429')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    service = FakeGmailService(message_count=args.messages, attachments_per_message=args.attachments,
+                               attachment_size=args.attachment_kb * 1024,
+                               latency_seconds=args.latency_ms / 1000)
+    server = FakeGmailServer(service, rate_limit_every=args.rate_limit_every)
+    server.start(args.host, args.port)
+    print(f"Fake Gmail API at {server.users_url} ({args.messages} messages); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats()))
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
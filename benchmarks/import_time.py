@@ -0,0 +1,252 @@
+"""
+Mars AI Agents - Import-Time Benchmark
+Measures the cold-start import cost of the API server, the CLIs and the
+extraction graph with `python -X importtime`, reports the heaviest imports
+of each and fails on regressions against a saved baseline
+
+Each entry point is imported in a fresh interpreter several times (after
+an unmeasured run that writes the bytecode caches), and the median of the
+entry point's cumulative import time is reported. The regression check
+compares the fastest run, since scheduling noise only ever adds time. It
+also fails when an entry point starts importing one of the heavy
+dependencies (FastAPI, the Google API client, langchain_openai, ...) that
+it used to leave alone, which catches an eager import long before it shows
+up as a timing regression.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --save-baseline benchmarks/results/import_baseline.json
+    python -m benchmarks.import_time --baseline benchmarks/results/import_baseline.json --max-regression 25
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.run_benchmarks import RESULTS_FOLDER, git_revision
+
+# Entry point -> module whose import is measured
+ENTRY_POINTS = {
+    'api_server': 'api_server',
+    'gmail_processor': 'get_data',
+    'batch_extraction': 'orchestrator.batch_extraction',
+    'orchestrator': 'orchestrator.langgraph_orchestrator',
+    'config': 'config',
+}
+
+# Dependencies that are slow to import; an entry point that starts loading
+# one of these is reported even if the total is still within the threshold
+HEAVY_MODULES = (
+    'fastapi',
+    'googleapiclient.discovery',
+    'google_auth_oauthlib.flow',
+    'langchain_openai',
+    'langgraph.graph',
+    'langgraph.checkpoint.sqlite',
+    'openai',
+    'pymupdf',
+)
+
+# Timing differences below this are noise
+MIN_REGRESSION_MS = 5.0
+
+
+def parse_importtime(output: str) -> List[Tuple[int, str, int, int]]:
+    """
+    Parse `-X importtime` output
+
+    Args:
+        output: stderr of the interpreter
+
+    Returns:
+        (depth, module, self µs, cumulative µs) per import, in output order
+        (children are listed before their parent)
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip(' ')
+        entries.append(((len(name) - len(stripped) - 1) // 2, stripped,
+                        int(fields[0]), int(fields[1])))
+    return entries
+
+
+def _direct_imports(entries: List[Tuple[int, str, int, int]], module: str) -> List[Tuple[str, int]]:
+    """Imports made directly by `module`, with their cumulative µs"""
+    children: List[Tuple[str, int]] = []
+    for depth, name, _, cumulative in entries:
+        if depth == 0:
+            if name == module:
+                return children
+            children = []
+        elif depth == 1:
+            children.append((name, cumulative))
+    return []
+
+
+def import_module_once(module: str, python: str = sys.executable, cwd: str = REPO_ROOT) -> Dict[str, Any]:
+    """
+    Import a module in a fresh interpreter
+
+    Args:
+        module: Dotted module name
+        python: Interpreter to run
+        cwd: Working directory (the repo root, so top-level modules resolve)
+
+    Returns:
+        {'ms', 'direct_imports': [(module, ms)], 'heavy': [watched modules loaded]}
+    """
+    completed = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True, timeout=120
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    entries = parse_importtime(completed.stderr)
+    top = [cumulative for depth, name, _, cumulative in entries if depth == 0 and name == module]
+    if not top:
+        raise RuntimeError(f"No import time recorded for {module} (already imported at start-up?)")
+    loaded = {name for _, name, _, _ in entries}
+    return {
+        'ms': round(top[-1] / 1000, 2),
+        'direct_imports': [(name, round(us / 1000, 2)) for name, us in _direct_imports(entries, module)],
+        'heavy': sorted(name for name in HEAVY_MODULES if name in loaded),
+    }
+
+
+def measure(entry_points: Dict[str, str], runs: int = 5, top: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Measure the import time of each entry point
+
+    Args:
+        entry_points: Entry point name -> module
+        runs: Measured imports per entry point
+        top: Heaviest direct imports to report
+
+    Returns:
+        Entry point -> {'module', 'median_ms', 'min_ms', 'max_ms', 'heaviest', 'heavy'}
+    """
+    results = {}
+    for name, module in entry_points.items():
+        import_module_once(module)  # writes .pyc files; not measured
+        samples = [import_module_once(module) for _ in range(max(1, runs))]
+        timings = [sample['ms'] for sample in samples]
+        median_sample = sorted(samples, key=lambda sample: sample['ms'])[len(samples) // 2]
+        results[name] = {
+            'module': module,
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': min(timings),
+            'max_ms': max(timings),
+            'heaviest': sorted(median_sample['direct_imports'], key=lambda item: -item[1])[:top],
+            'heavy': median_sample['heavy'],
+        }
+    return results
+
+
+def check_regressions(baseline: Dict[str, Any], current: Dict[str, Any],
+                      max_regression_pct: float) -> List[str]:
+    """
+    Compare a run with a saved baseline
+
+    Args:
+        baseline: Saved results
+        current: Results of this run
+        max_regression_pct: Allowed slowdown in percent
+
+    Returns:
+        Human-readable regression descriptions (empty if none)
+    """
+    failures = []
+    allowed = 1 + max_regression_pct / 100
+    old_entries = baseline.get('entry_points', {})
+    for name, after in current.get('entry_points', {}).items():
+        before = old_entries.get(name)
+        if not before:
+            continue
+        if after['min_ms'] > max(before['min_ms'] * allowed, before['min_ms'] + MIN_REGRESSION_MS):
+            failures.append(f"{name} (fastest run): {before['min_ms']} -> {after['min_ms']} ms")
+        newly_loaded = sorted(set(after['heavy']) - set(before['heavy']))
+        if newly_loaded:
+            failures.append(f"{name} now imports {', '.join(newly_loaded)}")
+    return failures
+
+
+def print_report(results: Dict[str, Any]):
+    print(f"Import times @ {results['git_revision']} ({results['python']}, "
+          f"median of {results['parameters']['runs']} runs)")
+    for name, data in results['entry_points'].items():
+        print(f"  {name:<18} {data['median_ms']:>9.1f} ms  (import {data['module']})")
+        for module, ms in data['heaviest']:
+            print(f"      {ms:>9.1f} ms  {module}")
+        if data['heavy']:
+            print(f"      loads: {', '.join(data['heavy'])}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Cold-start import time of the Mars AI Agents entry points')
+    parser.add_argument('--entry-points', help=f"Comma-separated subset of {','.join(ENTRY_POINTS)}")
+    parser.add_argument('--runs', type=int, default=5, help='Measured imports per entry point')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest direct imports to list')
+    parser.add_argument('--save-baseline', help='Write results to this file')
+    parser.add_argument('--baseline', help='Fail if results regress against this file')
+    parser.add_argument('--max-regression', type=float, default=25.0, help='Allowed regression in percent')
+    parser.add_argument('--no-save', action='store_true', help='Do not write a results file')
+    args = parser.parse_args(argv)
+
+    entry_points = ENTRY_POINTS
+    if args.entry_points:
+        names = [name.strip() for name in args.entry_points.split(',')]
+        unknown = [name for name in names if name not in ENTRY_POINTS]
+        if unknown:
+            parser.error(f"Unknown entry points: {', '.join(unknown)}")
+        entry_points = {name: ENTRY_POINTS[name] for name in names}
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': sys.version.split()[0],
+        'parameters': vars(args),
+        'entry_points': measure(entry_points, args.runs, args.top),
+    }
+    print_report(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    elif not args.no_save:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        with open(os.path.join(RESULTS_FOLDER, f"import_{stamp}_{results['git_revision']}.json"), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regressions(json.load(f), results, args.max_regression)
+        if failures:
+            print(f"\nRegressions beyond {args.max_regression:g}%:")
+            for failure in failures:
+                print(f"  - {failure}")
+            return 1
+        print(f"\nNo regressions beyond {args.max_regression:g}% against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
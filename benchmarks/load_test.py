@@ -0,0 +1,429 @@
+"""
+Mars AI Agents - HTTP Load Test
+Drives api_server.app over real HTTP with a mixed workload, sweeping either
+arrival rates (open loop) or concurrency (closed loop), and reports latency
+percentiles, error rates and the knee of the throughput curve
+
+By default the server is started in a subprocess with stubbed backends:
+a fake Gmail mailbox behind /api/process and a stub LLM behind
+/api/extract-invoice-data, serving a synthetic invoice corpus.
+
+Usage:
+    python -m benchmarks.load_test --rates 5,10,20,40,80 --duration 10
+    python -m benchmarks.load_test --concurrency 1,4,16,64 --save-baseline benchmarks/results/api_baseline.json
+    python -m benchmarks.load_test --baseline benchmarks/results/api_baseline.json --max-regression 20 --no-save
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import httpx
+
+from benchmarks.run_benchmarks import RESULTS_FOLDER, git_revision, percentiles
+
+# Default mix: name -> relative weight
+DEFAULT_MIX = {
+    'files': 40,
+    'invoice_data': 35,
+    'extract': 20,
+    'process': 5,
+}
+
+# A stage whose achieved throughput falls below this share of the offered
+# load, or whose p95 grows past KNEE_LATENCY_FACTOR x the first stage's,
+# is past the knee
+KNEE_THROUGHPUT_RATIO = 0.9
+KNEE_LATENCY_FACTOR = 3.0
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, int]:
+    """Parse 'files=40,extract=20' into a weight mapping"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in spec.split(','):
+        name, weight = item.split('=', 1)
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown endpoint '{name}' (expected one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = int(weight)
+    return mix
+
+
+def build_request(name: str, documents: List[str], rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """
+    Build one request of the given workload type
+
+    Args:
+        name: Workload entry from the mix
+        documents: Document names available in the server's data folder
+        rng: Random source
+
+    Returns:
+        (method, path, json body)
+    """
+    document = rng.choice(documents)
+    if name == 'files':
+        return 'GET', '/api/files', None
+    if name == 'invoice_data':
+        return 'GET', f'/api/invoice-data/{document}', None
+    if name == 'extract':
+        return 'POST', '/api/extract-invoice-data', {'document_path': os.path.join('data', document), 'force': True}
+    return 'POST', '/api/process', {'action': 'start_processing'}
+
+
+async def _send(client: httpx.AsyncClient, name: str, documents: List[str],
+                rng: random.Random, samples: List[Tuple[str, float, bool]]):
+    method, path, body = build_request(name, documents, rng)
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = await client.request(method, path, json=body)
+        ok = response.status_code < 400
+        if ok and response.headers.get('content-type', '').startswith('application/json'):
+            # Several endpoints report failures as 200 with success=false
+            ok = response.json().get('success', True) is not False
+    except httpx.HTTPError:
+        ok = False
+    samples.append((name, time.perf_counter() - started, ok))
+
+
+async def run_stage(client: httpx.AsyncClient, mix: Dict[str, int], documents: List[str],
+                    duration: float, rate: Optional[float] = None,
+                    concurrency: Optional[int] = None, seed: int = 0) -> Dict[str, Any]:
+    """
+    Run one load level
+
+    Args:
+        client: HTTP client bound to the server
+        mix: Workload weights
+        documents: Document names on the server
+        duration: Seconds of load
+        rate: Open-loop Poisson arrival rate (requests/second)
+        concurrency: Closed-loop worker count (used when rate is None)
+        seed: Seed for arrivals and request choice
+
+    Returns:
+        Stage summary
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    samples: List[Tuple[str, float, bool]] = []
+    started = time.perf_counter()
+    deadline = started + duration
+
+    if rate:
+        tasks = []
+        next_arrival = started
+        while next_arrival < deadline:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            tasks.append(asyncio.create_task(_send(client, name, documents, rng, samples)))
+            next_arrival += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    else:
+        async def worker():
+            while time.perf_counter() < deadline:
+                await _send(client, rng.choices(names, weights)[0], documents, rng, samples)
+        await asyncio.gather(*(worker() for _ in range(concurrency or 1)))
+
+    elapsed = time.perf_counter() - started
+    endpoints = {}
+    for name in names:
+        latencies = [latency for endpoint, latency, _ in samples if endpoint == name]
+        errors = sum(1 for endpoint, _, ok in samples if endpoint == name and not ok)
+        endpoints[name] = {
+            'requests': len(latencies),
+            'error_rate': round(errors / len(latencies), 4) if latencies else 0.0,
+            **percentiles(latencies)
+        }
+
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return {
+        'offered_rps': rate,
+        'concurrency': concurrency if not rate else None,
+        'requests': len(samples),
+        'seconds': round(elapsed, 3),
+        'achieved_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        **percentiles([latency for _, latency, _ in samples]),
+        'endpoints': endpoints,
+    }
+
+
+def find_knee(stages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Find the last stage before throughput saturates or latency takes off
+
+    Args:
+        stages: Stage summaries in increasing load order
+
+    Returns:
+        The knee stage, or None if there are no stages
+    """
+    if not stages:
+        return None
+    base_p95 = max(stages[0]['p95_ms'], 1.0)
+    knee = stages[0]
+    best_rps = stages[0]['achieved_rps']
+    for stage in stages[1:]:
+        saturated = (stage['offered_rps'] and stage['achieved_rps'] < KNEE_THROUGHPUT_RATIO * stage['offered_rps'])
+        flattened = not stage['offered_rps'] and stage['achieved_rps'] < best_rps * 1.05
+        slow = stage['p95_ms'] > KNEE_LATENCY_FACTOR * base_p95
+        if saturated or flattened or slow or stage['error_rate'] > 0.01:
+            break
+        knee = stage
+        best_rps = max(best_rps, stage['achieved_rps'])
+    return knee
+
+
+def check_regressions(baseline: Dict[str, Any], current: Dict[str, Any],
+                      max_regression_pct: float) -> List[str]:
+    """
+    Compare a run with a saved baseline
+
+    Checks knee throughput, and the overall and per-endpoint p95 and error
+    rate at every load level both runs share.
+
+    Args:
+        baseline: Saved results
+        current: Results of this run
+        max_regression_pct: Allowed slowdown in percent
+
+    Returns:
+        Human-readable regression descriptions (empty if none)
+    """
+    failures = []
+    allowed = 1 + max_regression_pct / 100
+
+    old_knee, new_knee = baseline.get('knee'), current.get('knee')
+    if old_knee and new_knee and new_knee['achieved_rps'] * allowed < old_knee['achieved_rps']:
+        failures.append(f"knee throughput {old_knee['achieved_rps']} -> {new_knee['achieved_rps']} rps")
+
+    def level(stage):
+        return stage['offered_rps'] or f"c{stage['concurrency']}"
+
+    old_stages = {level(stage): stage for stage in baseline.get('stages', [])}
+    for stage in current.get('stages', []):
+        old = old_stages.get(level(stage))
+        if not old:
+            continue
+        pairs = [('overall', old, stage)] + [
+            (name, old['endpoints'][name], data)
+            for name, data in stage['endpoints'].items() if name in old['endpoints']
+        ]
+        for name, before, after in pairs:
+            # Ignore sub-millisecond noise on very fast endpoints
+            if after['p95_ms'] > max(before['p95_ms'] * allowed, before['p95_ms'] + 1.0):
+                failures.append(f"{name} p95 at {level(stage)}: {before['p95_ms']} -> {after['p95_ms']} ms")
+            if after['error_rate'] > before['error_rate'] + 0.01:
+                failures.append(f"{name} error rate at {level(stage)}: {before['error_rate']} -> {after['error_rate']}")
+    return failures
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_stubbed(port: int, documents: int, attachment_kb: int, llm_latency_ms: float,
+                  gmail_latency_ms: float, process_messages: int):
+    """
+    Run api_server.app with stubbed Gmail and LLM backends (blocks)
+
+    Called in the server subprocess, from inside a scratch working directory.
+    """
+    import uvicorn
+
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_gmail import FakeGmailService
+    from benchmarks.stub_llm import install_stub_llm
+
+    generate_corpus('data', documents, target_size=attachment_kb * 1024)
+    install_stub_llm(llm_latency_ms / 1000)
+
+    import api_server
+    from get_data import GmailDataRetriever
+    from utils.mailbox_registry import Mailbox
+
+    service = FakeGmailService(message_count=process_messages, attachment_size=attachment_kb * 1024,
+                               latency_seconds=gmail_latency_ms / 1000, unique_templates=2)
+
+    class StubRetriever(GmailDataRetriever):
+        def authenticate(self) -> bool:
+            self.service = service
+            return True
+
+    def process_fake_gmail_data() -> Dict[str, Any]:
+        # A throwaway mailbox per call: its checkpoint starts empty, and it
+        # ingests into a scratch folder so repeated runs don't grow /api/files
+        folder = tempfile.mkdtemp(prefix='ingest-', dir='.')
+        mailbox = Mailbox(os.path.basename(folder), data_folder=folder)
+        return StubRetriever(mailbox=mailbox).process_new_emails()
+
+    api_server.process_gmail_data = process_fake_gmail_data
+    uvicorn.run(api_server.app, host='127.0.0.1', port=port, log_config=None,
+                log_level='warning', access_log=False)
+
+
+def start_server(args: argparse.Namespace, workdir: str) -> Tuple[subprocess.Popen, str]:
+    """Start the stubbed server in a subprocess and wait until it answers /health"""
+    port = _free_port()
+    env = dict(os.environ, MARS_LOG_LEVEL=os.environ.get('MARS_LOG_LEVEL', 'WARNING'),
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+    command = [
+        sys.executable, '-m', 'benchmarks.load_test', '--serve', str(port),
+        '--documents', str(args.documents), '--attachment-kb', str(args.attachment_kb),
+        '--llm-latency-ms', str(args.llm_latency_ms), '--gmail-latency-ms', str(args.gmail_latency_ms),
+        '--process-messages', str(args.process_messages),
+    ]
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during start-up:\n{process.stderr.read().decode(errors='replace')}")
+        try:
+            if httpx.get(f'{url}/health', timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('Server did not become healthy within 60s')
+
+
+async def run_load_test(url: str, mix: Dict[str, int], levels: List[float], duration: float,
+                        open_loop: bool, warmup: float) -> Dict[str, Any]:
+    """Run every load level against a server and summarise"""
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        listing = (await client.get('/api/files')).json().get('files', [])
+        documents = [item['name'] for item in listing if item['name'].lower().endswith('.pdf')]
+        if not documents:
+            raise RuntimeError(f'No PDF documents in the data folder of {url}')
+
+        if warmup:
+            await run_stage(client, mix, documents, warmup, concurrency=2)
+
+        stages = []
+        for index, level in enumerate(levels):
+            stage = await run_stage(
+                client, mix, documents, duration,
+                rate=level if open_loop else None,
+                concurrency=None if open_loop else int(level),
+                seed=index
+            )
+            stages.append(stage)
+            label = f"{level:g} rps offered" if open_loop else f"concurrency {int(level)}"
+            print(f"  {label:<22} {stage['achieved_rps']:>8} rps  p50/p95/p99 "
+                  f"{stage['p50_ms']}/{stage['p95_ms']}/{stage['p99_ms']} ms  errors {stage['error_rate']:.1%}")
+
+    return {'stages': stages, 'knee': find_knee(stages)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='HTTP load test for the Mars AI Agents API')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--rates', help='Comma-separated open-loop arrival rates (requests/second)')
+    load.add_argument('--concurrency', help='Comma-separated closed-loop client counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per load level')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured warm-up seconds')
+    parser.add_argument('--mix', help='Workload weights, e.g. files=40,invoice_data=35,extract=20,process=5')
+    parser.add_argument('--url', help='Test an already running server instead of a stubbed one')
+    parser.add_argument('--documents', type=int, default=20, help='Synthetic documents to serve')
+    parser.add_argument('--attachment-kb', type=int, default=100, help='Approximate document size in KB')
+    parser.add_argument('--llm-latency-ms', type=float, default=200.0, help='Stub LLM round trip')
+    parser.add_argument('--gmail-latency-ms', type=float, default=20.0, help='Fake Gmail round trip')
+    parser.add_argument('--process-messages', type=int, default=3, help='Messages per fake /api/process run')
+    parser.add_argument('--save-baseline', help='Write results to this file')
+    parser.add_argument('--no-save', action='store_true', help='Do not write a results file')
+    parser.add_argument('--baseline', help='Fail if results regress against this file')
+    parser.add_argument('--max-regression', type=float, default=20.0, help='Allowed regression in percent')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve_stubbed(args.serve, args.documents, args.attachment_kb, args.llm_latency_ms,
+                      args.gmail_latency_ms, args.process_messages)
+        return 0
+
+    open_loop = not args.concurrency
+    levels = [float(value) for value in (args.concurrency or args.rates or '5,10,20,40').split(',')]
+    mix = parse_mix(args.mix)
+
+    server = None
+    workdir = None
+    try:
+        if args.url:
+            url = args.url.rstrip('/')
+        else:
+            workdir = tempfile.TemporaryDirectory(prefix='mars-load-')
+            server, url = start_server(args, workdir.name)
+        print(f"Load testing {url} with mix {mix}")
+        summary = asyncio.run(run_load_test(url, mix, levels, args.duration, open_loop, args.warmup))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if workdir is not None:
+            workdir.cleanup()
+
+    knee = summary['knee']
+    if knee:
+        print(f"Knee: {knee['achieved_rps']} rps (p95 {knee['p95_ms']} ms)")
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'serve'},
+        'mix': mix,
+        **summary,
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    elif not args.no_save:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        with open(os.path.join(RESULTS_FOLDER, f"api_{stamp}_{results['git_revision']}.json"), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regressions(json.load(f), results, args.max_regression)
+        if failures:
+            print(f"\nRegressions beyond {args.max_regression:g}%:")
+            for failure in failures:
+                print(f"  - {failure}")
+            return 1
+        print(f"\nNo regressions beyond {args.max_regression:g}% against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
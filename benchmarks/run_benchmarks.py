@@ -0,0 +1,386 @@
+"""
+Mars AI Agents - Benchmark Runner
+Drives GmailDataRetriever.process_new_emails() against a fake mailbox and
+the extraction workflow against the downloaded PDFs with a stub LLM, then
+reports throughput, latency percentiles and peak RSS
+
+Usage:
+    python -m benchmarks.run_benchmarks --messages 10 --attachment-kb 200
+    python -m benchmarks.run_benchmarks --llm-latency-ms 200 --pack
+    python -m benchmarks.run_benchmarks --messages 300 --gmail-latency-ms 50 --gmail-transport httpx
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<baseline>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_gmail import FakeGmailService
+from benchmarks.stub_llm import install_stub_llm
+from utils.mailbox_registry import Mailbox
+
+RESULTS_FOLDER = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# Metrics where a larger value is better; everything else is lower-is-better
+HIGHER_IS_BETTER = {'messages_per_second', 'mb_per_second', 'documents_per_second'}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Nearest-rank p50/p95/p99 of a list of latencies
+
+    Args:
+        samples: Latencies in seconds
+
+    Returns:
+        Percentiles in milliseconds
+    """
+    if not samples:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    ordered = sorted(samples)
+
+    def rank(q: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {'p50_ms': rank(0.50), 'p95_ms': rank(0.95), 'p99_ms': rank(0.99)}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def git_revision() -> str:
+    """Short SHA of the checked-out commit, or 'unknown'"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_ingestion(service: FakeGmailService, rounds: int = 1,
+                  transport: str = 'googleapiclient') -> Dict[str, Any]:
+    """
+    Run process_new_emails() against the fake mailbox
+
+    Args:
+        service: Fake Gmail service to ingest from
+        rounds: Number of full ingestion passes (each into a fresh data folder)
+        transport: 'googleapiclient' calls the fake service in-process;
+            'httpx' runs process_new_emails_async() against the fake
+            service served over HTTP by uvicorn
+
+    Returns:
+        Ingestion metrics plus the downloaded file paths of the last round
+    """
+    from get_data import GmailDataRetriever
+
+    message_latencies: List[float] = []
+
+    class BenchmarkRetriever(GmailDataRetriever):
+        def authenticate(self) -> bool:
+            self.service = service
+            return True
+
+        def download_attachments(self, message_id: str) -> List[str]:
+            started = time.perf_counter()
+            try:
+                return super().download_attachments(message_id)
+            finally:
+                message_latencies.append(time.perf_counter() - started)
+
+        async def download_attachments_async(self, gmail: Any, message_id: str) -> List[str]:
+            started = time.perf_counter()
+            try:
+                return await super().download_attachments_async(gmail, message_id)
+            finally:
+                message_latencies.append(time.perf_counter() - started)
+
+    server = None
+    if transport == 'httpx':
+        from benchmarks.fake_gmail_server import FakeGmailServer
+        server = FakeGmailServer(service)
+        server.start()
+
+    async def ingest_async(retriever: BenchmarkRetriever) -> Dict[str, Any]:
+        from config import get_gmail_config
+        from utils.gmail_transport import AsyncGmailTransport
+
+        settings = get_gmail_config()
+        async with AsyncGmailTransport(access_token='benchmark', quota_user=retriever.quota_user,
+                                       base_url=server.users_url,
+                                       max_connections=settings['max_connections']) as gmail:
+            return await retriever.process_new_emails_async(gmail)
+
+    emails = 0
+    downloaded_bytes = 0
+    files: List[str] = []
+    failed: List[str] = []
+    elapsed = 0.0
+
+    try:
+        for round_number in range(rounds):
+            # A fresh mailbox per round, so its checkpoint doesn't skip every message
+            mailbox_id = f'bench-{uuid.uuid4().hex[:8]}'
+            retriever = BenchmarkRetriever(mailbox=Mailbox(mailbox_id, data_folder=os.path.join('data', mailbox_id)))
+            os.makedirs(retriever.data_folder, exist_ok=True)
+
+            started = time.perf_counter()
+            if server is not None:
+                result = asyncio.run(ingest_async(retriever))
+            else:
+                result = retriever.process_new_emails()
+            elapsed += time.perf_counter() - started
+
+            if result.get('error'):
+                raise RuntimeError(result['error'])
+            emails += result['emails_processed']
+            files = result['files_downloaded']
+            failed.extend(result['failed_message_ids'])
+            downloaded_bytes += sum(os.path.getsize(path) for path in files)
+    finally:
+        if server is not None:
+            server.stop()
+
+    return {
+        'rounds': rounds,
+        'emails_processed': emails,
+        'attachments_downloaded': len(files) * rounds,
+        'bytes_downloaded': downloaded_bytes,
+        'failed_messages': len(failed),
+        'seconds': round(elapsed, 4),
+        'messages_per_second': round(emails / elapsed, 2) if elapsed else 0.0,
+        'mb_per_second': round(downloaded_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0,
+        'message_latency': percentiles(message_latencies),
+        'gmail_calls': dict(service.calls),
+        'http': server.stats() if server is not None else None,
+        'files': files,
+    }
+
+
+def run_extraction(files: List[str], labels: Dict[str, Dict[str, str]], pack: bool = False) -> Dict[str, Any]:
+    """
+    Run the extraction workflow over downloaded documents
+
+    Args:
+        files: Paths of the documents to extract
+        labels: Ground truth keyed by original attachment filename
+        pack: Extract through run_documents, packing short documents into
+            shared model calls (document latency is then the amortised time)
+
+    Returns:
+        Extraction metrics
+    """
+    from orchestrator.document_packing import run_documents
+    from orchestrator.langgraph_orchestrator import run_document
+
+    latencies: List[float] = []
+    states: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    if pack:
+        states = run_documents(files, pack=True)
+        latencies = [(time.perf_counter() - started) / len(files)] * len(files) if files else []
+    else:
+        for path in files:
+            doc_started = time.perf_counter()
+            states.append(run_document(path))
+            latencies.append(time.perf_counter() - doc_started)
+    elapsed = time.perf_counter() - started
+
+    correct = 0
+    for path, state in zip(files, states):
+        expected = labels.get(os.path.basename(path))
+        if expected and (state.get('invoice_number') == expected['invoice_number']
+                         and state.get('order_number') == expected['order_number']):
+            correct += 1
+
+    return {
+        'documents': len(files),
+        'seconds': round(elapsed, 4),
+        'documents_per_second': round(len(files) / elapsed, 2) if elapsed else 0.0,
+        'document_latency': percentiles(latencies),
+        'fields_correct': correct,
+    }
+
+
+def save_results(results: Dict[str, Any], folder: str = RESULTS_FOLDER) -> str:
+    """
+    Save a run as <timestamp>_<git sha>.json
+
+    Args:
+        results: Benchmark results
+        folder: Output folder
+
+    Returns:
+        Path of the written file
+    """
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(folder, f"{stamp}_{results['git_revision']}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def _flatten(data: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Compare the headline metrics of two runs
+
+    Args:
+        baseline: Earlier results
+        current: Results of this run
+
+    Returns:
+        One row per metric with the relative change and whether it improved
+    """
+    rows = []
+    keys = ('ingestion', 'extraction', 'peak_rss_mb')
+    old = _flatten({k: baseline.get(k) for k in keys if k in baseline})
+    new = _flatten({k: current.get(k) for k in keys if k in current})
+    for name in sorted(old.keys() & new.keys()):
+        if '.gmail_calls.' in name or not (name.endswith('_ms') or name.endswith('_second')
+                                            or name == 'peak_rss_mb'):
+            continue
+        before, after = old[name], new[name]
+        change = (after - before) / before * 100 if before else 0.0
+        better = change >= 0 if name.rsplit('.', 1)[-1] in HIGHER_IS_BETTER else change <= 0
+        rows.append({'metric': name, 'baseline': before, 'current': after,
+                     'change_pct': round(change, 1), 'better': better})
+    return rows
+
+
+def print_report(results: Dict[str, Any], comparison: Optional[List[Dict[str, Any]]] = None):
+    """Print a human-readable summary of a run"""
+    ingestion = results['ingestion']
+    extraction = results['extraction']
+    print(f"Benchmark @ {results['git_revision']} ({results['timestamp']})")
+    print(f"  Ingestion:  {ingestion['emails_processed']} messages, "
+          f"{ingestion['attachments_downloaded']} attachments, "
+          f"{ingestion['bytes_downloaded'] / (1024 * 1024):.1f} MB in {ingestion['seconds']:.2f}s")
+    print(f"              {ingestion['messages_per_second']} msg/s, {ingestion['mb_per_second']} MB/s, "
+          f"per-message p50/p95/p99 = {ingestion['message_latency']['p50_ms']}/"
+          f"{ingestion['message_latency']['p95_ms']}/{ingestion['message_latency']['p99_ms']} ms")
+    if ingestion.get('http'):
+        http = ingestion['http']
+        print(f"              {http['requests']} HTTP requests over {http['connections']} connection(s)")
+    print(f"  Extraction: {extraction['documents']} documents in {extraction['seconds']:.2f}s, "
+          f"{extraction['documents_per_second']} docs/s, "
+          f"{extraction['fields_correct']}/{extraction['documents']} correct")
+    print(f"              per-document p50/p95/p99 = {extraction['document_latency']['p50_ms']}/"
+          f"{extraction['document_latency']['p95_ms']}/{extraction['document_latency']['p99_ms']} ms")
+    print(f"  Peak RSS:   {results['peak_rss_mb']} MB")
+
+    if comparison:
+        print("\n  Compared with baseline:")
+        for row in comparison:
+            marker = ' ' if row['better'] else '!'
+            print(f"  {marker} {row['metric']:<40} {row['baseline']:>12} -> {row['current']:>12} "
+                  f"({row['change_pct']:+.1f}%)")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description='Offline ingestion/extraction benchmark')
+    parser.add_argument('--messages', type=int, default=10, help='Messages in the fake mailbox')
+    parser.add_argument('--attachments', type=int, default=1, help='Attachments per message')
+    parser.add_argument('--attachment-kb', type=int, default=100, help='Approximate attachment size in KB')
+    parser.add_argument('--rounds', type=int, default=3, help='Ingestion passes over the mailbox')
+    parser.add_argument('--gmail-latency-ms', type=float, default=0.0, help='Simulated Gmail round trip')
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help='Simulated LLM round trip')
+    parser.add_argument('--quota-units', type=float, default=None,
+                        help='Gmail quota units/s (default: config value, 0 = unlimited)')
+    parser.add_argument('--no-warmup', action='store_true',
+                        help='Include first-call costs (imports, thread start-up) in the numbers')
+    parser.add_argument('--pack', action='store_true',
+                        help='Pack short documents into shared model calls')
+    parser.add_argument('--gmail-transport', choices=['googleapiclient', 'httpx'], default='googleapiclient',
+                        help='httpx: async ingestion against the fake mailbox served over HTTP')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    parser.add_argument('--no-save', action='store_true', help='Do not write a results file')
+    args = parser.parse_args(argv)
+
+    from config import DEFAULT_CONFIG
+    if args.quota_units is not None:
+        DEFAULT_CONFIG['gmail']['quota_units_per_second'] = args.quota_units or 1e9
+    # List the whole mailbox rather than the default page of 10
+    DEFAULT_CONFIG['gmail']['max_results'] = max(args.messages, 1)
+
+    service = FakeGmailService(
+        message_count=args.messages,
+        attachments_per_message=args.attachments,
+        attachment_size=args.attachment_kb * 1024,
+        latency_seconds=args.gmail_latency_ms / 1000
+    )
+
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='mars-bench-') as workdir:
+        # The retriever, preview cache and workflow checkpoints use relative
+        # paths; keep them out of the repo
+        os.chdir(workdir)
+        try:
+            install_stub_llm(args.llm_latency_ms / 1000)
+            if not args.no_warmup:
+                warmup = FakeGmailService(message_count=1, attachment_size=args.attachment_kb * 1024,
+                                          unique_templates=1)
+                run_extraction(run_ingestion(warmup, transport=args.gmail_transport)['files'], {}, args.pack)
+            ingestion = run_ingestion(service, args.rounds, args.gmail_transport)
+            extraction = run_extraction(ingestion.pop('files'), service.labels, args.pack)
+        finally:
+            os.chdir(original_cwd)
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'ingestion': ingestion,
+        'extraction': extraction,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    comparison = None
+    if args.compare:
+        with open(args.compare) as f:
+            comparison = compare_results(json.load(f), results)
+        results['comparison'] = comparison
+
+    print_report(results, comparison)
+    if not args.no_save:
+        print(f"\nResults saved to {save_results(results)}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
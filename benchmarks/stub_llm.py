@@ -0,0 +1,141 @@
+"""
+Mars AI Agents - Stub LLM
+Stand-in for the structured-output models used by the extraction graph:
+answers with regexes instead of calling OpenAI, with a simulated latency
+"""
+
+import json
+import re
+import time
+from typing import Any, Dict, Optional, Tuple, Type
+
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+
+from orchestrator.model_gateway import count_tokens
+
+# Field name -> pattern matching the value as printed by benchmarks.corpus
+FIELD_PATTERNS = {
+    'invoice_number': re.compile(r'Invoice\s*(?:No\.?|Number|#)\s*:?\s*([A-Z0-9][A-Z0-9/\-]+)', re.IGNORECASE),
+    'order_number': re.compile(r'Order\s*(?:No\.?|Number|#)\s*:?\s*([A-Z0-9][A-Z0-9/\-]+)', re.IGNORECASE),
+}
+
+DOCUMENT_BLOCK = re.compile(r'<document id="([^"]+)">(.*?)</document>', re.DOTALL)
+
+
+def _match_fields(fields, text: str) -> Dict[str, str]:
+    values = {}
+    for field in fields:
+        pattern = FIELD_PATTERNS.get(field)
+        match = pattern.search(text) if pattern else None
+        values[field] = match.group(1) if match else ''
+    return values
+
+
+class StubStructuredModel:
+    """
+    Mimics ChatOpenAI.with_structured_output(schema, include_raw=True)
+
+    invoke() returns {'raw', 'parsed', 'parsing_error'} with usage metadata
+    so the model gateway's budgets and token ledger behave as in production.
+    """
+
+    def __init__(self, schema: Type[BaseModel], latency_seconds: float = 0.0,
+                 output_tokens: int = 20):
+        """
+        Initialize the stub
+
+        Args:
+            schema: Pydantic model the real call would be bound to
+            latency_seconds: Simulated model round-trip time
+            output_tokens: Output tokens reported per call
+        """
+        self.schema = schema
+        self.latency_seconds = latency_seconds
+        self.output_tokens = output_tokens
+        self.calls = 0
+
+    def invoke(self, prompt: Any, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Only the document is searched: the first message after the instructions
+        if isinstance(prompt, (list, tuple)):
+            text = next((message.content for message in prompt if message.type != 'system'), '')
+            input_tokens = count_tokens('\n'.join(message.content for message in prompt))
+        else:
+            text = prompt if isinstance(prompt, str) else str(prompt)
+            input_tokens = count_tokens(text)
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        if 'documents' in self.schema.model_fields:
+            # Packed call: answer every <document id="..."> block separately
+            values = {'documents': [
+                {'document_id': document_id, **_match_fields(('invoice_number', 'order_number'), body)}
+                for document_id, body in DOCUMENT_BLOCK.findall(text)
+            ]}
+        else:
+            values = _match_fields(self.schema.model_fields, text)
+
+        raw = AIMessage(content='', usage_metadata={
+            'input_tokens': input_tokens,
+            'output_tokens': self.output_tokens,
+            'total_tokens': input_tokens + self.output_tokens
+        })
+        return {'raw': raw, 'parsed': self.schema(**values), 'parsing_error': None}
+
+
+def stub_batch_response(body: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Answer one Batch API chat request the way StubStructuredModel would
+
+    Used by the local batch provider (orchestrator.batch_extraction).
+
+    Args:
+        body: Request body with messages and a json_schema response format
+
+    Returns:
+        (answer matching the schema, usage in the chat completions format)
+    """
+    messages = body['messages']
+    text = next((message['content'] for message in messages if message.get('role') != 'system'), '')
+    fields = body['response_format']['json_schema']['schema'].get('properties', {})
+    answer = {}
+    for field in fields:
+        pattern = FIELD_PATTERNS.get(field)
+        match = pattern.search(text) if pattern else None
+        answer[field] = match.group(1) if match else 'Not Found'
+    prompt_tokens = count_tokens('\n'.join(str(message.get('content', '')) for message in messages))
+    completion_tokens = count_tokens(json.dumps(answer))
+    return answer, {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens}
+
+
+def install_stub_llm(latency_seconds: float = 0.0) -> Tuple[StubStructuredModel, ...]:
+    """
+    Swap the extraction graph's models for stubs
+
+    Must be called before the graph is invoked. The graph builds its models
+    lazily, so the real OpenAI client (and an API key) is never needed.
+
+    Args:
+        latency_seconds: Simulated latency per model call
+
+    Returns:
+        The installed (invoice, order) stub models; the packed one is installed too
+    """
+    from orchestrator import langgraph_orchestrator
+
+    invoice_model = StubStructuredModel(langgraph_orchestrator.GetInvvoice, latency_seconds)
+    order_model = StubStructuredModel(langgraph_orchestrator.GetOrderNumber, latency_seconds)
+    langgraph_orchestrator.invoice_model_pdf = invoice_model
+    langgraph_orchestrator.order_model_pdf = order_model
+    langgraph_orchestrator.packed_model_pdf = StubStructuredModel(langgraph_orchestrator.PackedExtraction,
+                                                                  latency_seconds)
+    return invoice_model, order_model
+
+
+__all__ = [
+    'StubStructuredModel',
+    'install_stub_llm',
+    'stub_batch_response'
+]
@@ -15,11 +15,44 @@ __version__ = "0.1.0"
 # Default configuration values
 DEFAULT_CONFIG = {
     'gmail': {
-        'target_email': 'demotest.tcs@gmail.com',
+        # Mailboxes are listed in the registry file; without one, a single
+        # mailbox is built from the settings below. A target_email of None
+        # means "whichever account token_file is authorised for".
+        'registry_file': 'mailboxes.json',
+        'target_email': None,
         'search_hours_back': 24,
         'max_results': 10,
         'credentials_file': 'credentials.json',
-        'token_file': 'token.json'
+        'token_file': 'token.json',
+        'quota_units_per_second': 250,
+        'max_retries': 6,
+        'backoff_base_seconds': 1.0,
+        'backoff_max_seconds': 64.0,
+        'checkpoint_folder': '.cache/checkpoints',
+        'max_workers': None,
+        # 'googleapiclient' (blocking, one mailbox per worker process) or
+        # 'httpx' (asyncio on the server's event loop over pooled
+        # keep-alive connections, HTTP/2 when the h2 package is installed)
+        'transport': 'googleapiclient',
+        'max_connections': 20,
+        'http2': True,
+        'request_timeout_seconds': 30.0,
+        # Messages fetched at once per mailbox by the httpx transport
+        'concurrency': 100
+    },
+    'attachments': {
+        # Rules applied before anything is downloaded; empty lists allow all.
+        # Extensions, the minimum size and senders are also pushed into the
+        # Gmail search query. Mailboxes may override these in the registry.
+        # Scanned images are kept so triage can queue them for OCR.
+        'extensions': ['.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff'],
+        'mime_types': ['application/pdf', 'application/x-pdf', 'application/octet-stream',
+                       'image/png', 'image/jpeg', 'image/tiff'],
+        'filename_patterns': [],
+        'exclude_filename_patterns': [],
+        'min_size_bytes': 1024,
+        'max_size_bytes': 25 * 1024 * 1024,
+        'sender_allowlist': []
     },
     'server': {
         'host': '0.0.0.0',
@@ -35,6 +68,126 @@ DEFAULT_CONFIG = {
         'folder': 'data',
         'static_folder': 'static',
         'templates_folder': 'templates'
+    },
+    'preview': {
+        'cache_folder': '.cache/previews',
+        'max_cache_mb': 256,
+        'default_dpi': 96,
+        'min_dpi': 36,
+        'max_dpi': 200,
+        'image_format': 'jpeg',
+        'jpeg_quality': 75,
+        'prerender_first_page': True
+    },
+    'llm': {
+        'model': 'gpt-4o-mini',
+        'requests_per_minute': 500,
+        'tokens_per_minute': 200000,
+        'max_concurrency': 8,
+        'max_retries': 5,
+        'backoff_base_seconds': 1.0,
+        'backoff_max_seconds': 30.0,
+        'input_cost_per_million': 0.15,
+        'output_cost_per_million': 0.60,
+        'output_tokens_estimate': 50,
+        'ledger_size': 1000
+    },
+    'logging': {
+        'level': 'INFO',
+        'json': True,
+        'module_levels': {
+            'get_data': 'INFO',
+            'orchestrator': 'INFO',
+            'utils': 'INFO',
+            'httpx': 'WARNING',
+            'googleapiclient.discovery_cache': 'ERROR'
+        }
+    },
+    'tracing': {
+        'enabled': True,
+        'max_traces': 200,
+        'profile_header': 'X-Profile',
+        'profile_folder': '.cache/profiles',
+        'max_profiles': 100,        # oldest profiles are deleted beyond this
+        'otlp_endpoint': None
+    },
+    'search': {
+        'db_path': '.cache/search.db',
+        'index_full_text': True,
+        'max_text_chars': 200000
+    },
+    'dedup': {
+        'enabled': True,
+        'db_path': '.cache/near_duplicates.db',
+        'num_perm': 128,
+        'bands': 16,
+        'shingle_size': 3,
+        'threshold': 0.9,
+        'min_shingles': 20
+    },
+    'templates': {
+        'enabled': True,
+        'db_path': '.cache/layout_templates.db',
+        'max_per_vendor': 5,
+        'min_confirmations': 2,
+        'tolerance': 3.0,
+        'header_band': 0.15,
+        'max_anchor_words': 4
+    },
+    'triage': {
+        'db_path': '.cache/triage.db',
+        'min_chars_per_page': 25,
+        'max_pages': 50
+    },
+    'prompts': {
+        # None: the newest version in prompt/prompt_library.py (PROMPT_VERSION)
+        'version': None,
+        # Whole-prompt budget; longer documents keep their start and end
+        'max_input_tokens': 6000
+    },
+    'packing': {
+        # Short documents extracted together in one model call
+        'enabled': True,
+        'max_documents': 8,
+        'max_input_tokens': 6000,
+        'max_document_tokens': 1500
+    },
+    'batch': {
+        # Backlog extraction (python -m orchestrator.batch_extraction)
+        'provider': 'openai',
+        'db_path': '.cache/batch/jobs.db',
+        'work_folder': '.cache/batch',
+        'completion_window': '24h',
+        'max_requests_per_file': 50000,
+        'max_file_bytes': 190 * 1024 * 1024,
+        'poll_interval_seconds': 60,
+        'price_discount': 0.5
+    },
+    'workflow': {
+        # Extraction runs are checkpointed after every node, per document,
+        # so a crashed or failed run resumes where it stopped
+        'checkpoint_db': '.cache/workflow_checkpoints.db',
+        'durability': 'sync',
+        # Delete threads of documents that were removed or replaced, or of
+        # an old prompt version, when the API server starts
+        'prune_on_startup': True
+    },
+    'events': {
+        # Server-sent events at /api/events
+        'queue_size': 256,          # events buffered per client before it must resync
+        'replay_size': 1000,        # recent events kept for reconnects (Last-Event-ID)
+        'heartbeat_seconds': 15,
+        'max_subscribers': 200,
+        'retry_ms': 3000            # browser reconnect delay
+    },
+    'executors': {
+        # Worker threads per API stage, so one slow stage (e.g. a burst of
+        # extractions) can't take every thread from the others
+        'extraction': 16,
+        'gmail': 4,
+        'search': 8,
+        'hashing': 4,
+        'preview': 4
     }
 }
 
@@ -52,13 +205,93 @@ def get_gmail_config():
     """Get Gmail-specific configuration."""
     return DEFAULT_CONFIG['gmail'].copy()
 
+def get_attachment_filter_config():
+    """Get the attachment filter rules applied during Gmail ingestion."""
+    config = DEFAULT_CONFIG['attachments'].copy()
+    for key in ('extensions', 'mime_types', 'filename_patterns', 'exclude_filename_patterns', 'sender_allowlist'):
+        config[key] = list(config[key])
+    return config
+
 def get_server_config():
     """Get server-specific configuration."""
     return DEFAULT_CONFIG['server'].copy()
 
+def get_preview_config():
+    """Get page-preview rendering configuration."""
+    return DEFAULT_CONFIG['preview'].copy()
+
+def get_llm_config():
+    """Get LLM gateway budgets, retry policy and pricing."""
+    return DEFAULT_CONFIG['llm'].copy()
+
+def get_logging_config():
+    """Get logging levels and output format."""
+    config = DEFAULT_CONFIG['logging'].copy()
+    config['module_levels'] = dict(config['module_levels'])
+    return config
+
+def get_tracing_config():
+    """Get request tracing and profiling configuration."""
+    return DEFAULT_CONFIG['tracing'].copy()
+
+def get_search_config():
+    """Get document search index configuration."""
+    return DEFAULT_CONFIG['search'].copy()
+
+def get_dedup_config():
+    """Get near-duplicate detection configuration."""
+    return DEFAULT_CONFIG['dedup'].copy()
+
+def get_templates_config():
+    """Get per-vendor layout template configuration."""
+    return DEFAULT_CONFIG['templates'].copy()
+
+def get_triage_config():
+    """Get document triage thresholds."""
+    return DEFAULT_CONFIG['triage'].copy()
+
+def get_prompt_config():
+    """Get extraction prompt version and token budget."""
+    return DEFAULT_CONFIG['prompts'].copy()
+
+def get_packing_config():
+    """Get multi-document packing limits."""
+    return DEFAULT_CONFIG['packing'].copy()
+
+def get_batch_config():
+    """Get batch (backlog) extraction settings."""
+    return DEFAULT_CONFIG['batch'].copy()
+
+def get_workflow_config():
+    """Get extraction workflow persistence settings."""
+    return DEFAULT_CONFIG['workflow'].copy()
+
+def get_events_config():
+    """Get server-sent event stream settings."""
+    return DEFAULT_CONFIG['events'].copy()
+
+def get_executors_config():
+    """Get the worker thread count of each API executor."""
+    return DEFAULT_CONFIG['executors'].copy()
+
 __all__ = [
     'DEFAULT_CONFIG',
     'get_config',
     'get_gmail_config', 
-    'get_server_config'
+    'get_attachment_filter_config',
+    'get_server_config',
+    'get_preview_config',
+    'get_llm_config',
+    'get_logging_config',
+    'get_tracing_config',
+    'get_search_config',
+    'get_dedup_config',
+    'get_templates_config',
+    'get_triage_config',
+    'get_prompt_config',
+    'get_packing_config',
+    'get_batch_config',
+    'get_workflow_config',
+    'get_events_config',
+    'get_executors_config'
 ]
\ No newline at end of file
@@ -6,47 +6,126 @@ Connects to Gmail API to check for new emails and download attachments
 
 import os
 import io
+import asyncio
 import base64
+import hashlib
 import json
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from config import get_gmail_config
+from utils.email_utils import AttachmentFilter
+from utils.file_utils import file_content_hash
+from utils.event_stream import publish_event
+from utils.gmail_quota import execute_gmail, get_quota_bucket
+from utils.logging_utils import configure_logging
+from utils.mailbox_registry import Mailbox, MailboxCheckpoint, default_mailbox, get_mailbox, load_mailboxes
+from utils.metrics import (
+    ATTACHMENTS_DOWNLOADED, ATTACHMENTS_SKIPPED, BYTES_DOWNLOADED, MESSAGES_PROCESSED, STAGE_SECONDS
+)
+from utils.preview_utils import schedule_prerender
+from utils.search_index import get_search_index
+from utils.tracing import current_span, span, traced
+
+logger = logging.getLogger(__name__)
+
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Files whose document.downloaded event was published by this process, so the
+# API server announces only the rest (those written by worker processes)
+_announced_downloads: 'OrderedDict[str, None]' = OrderedDict()
+_announced_downloads_lock = threading.Lock()
+ANNOUNCED_DOWNLOADS_KEPT = 10000
+
+def _mark_announced(file_path: str):
+    with _announced_downloads_lock:
+        _announced_downloads[file_path] = None
+        while len(_announced_downloads) > ANNOUNCED_DOWNLOADS_KEPT:
+            _announced_downloads.popitem(last=False)
+
+def take_announced_downloads(file_paths: List[str]) -> set:
+    """
+    Which of a run's files were already announced in this process
+    
+    The returned paths are forgotten, so the record only holds runs in progress.
+    
+    Args:
+        file_paths: Files downloaded by a run
+        
+    Returns:
+        The subset whose document.downloaded event was published
+    """
+    with _announced_downloads_lock:
+        announced = {path for path in file_paths if path in _announced_downloads}
+        for path in announced:
+            del _announced_downloads[path]
+    return announced
+
 class GmailDataRetriever:
     """Class to handle Gmail API operations for retrieving email attachments"""
     
-    def __init__(self, credentials_file: str = 'credentials.json', token_file: str = 'token.json'):
+    def __init__(self, credentials_file: Optional[str] = None, token_file: Optional[str] = None,
+                 mailbox: Optional[Mailbox] = None, interactive: bool = True):
         """
         Initialize Gmail API client
         
         Args:
-            credentials_file: Path to Gmail API credentials file
-            token_file: Path to store authentication token
+            credentials_file: Path to Gmail API credentials file (overrides the mailbox's)
+            token_file: Path to store authentication token (overrides the mailbox's)
+            mailbox: Mailbox to ingest from (defaults to the configured default mailbox)
+            interactive: Allow the browser OAuth flow when there is no valid token
         """
-        self.credentials_file = credentials_file
-        self.token_file = token_file
+        self.mailbox = mailbox or default_mailbox()
+        self.credentials_file = credentials_file or self.mailbox.credentials_file
+        self.token_file = token_file or self.mailbox.token_file
+        self.interactive = interactive
         self.service = None
-        self.target_email = "demotest.tcs@gmail.com"
-        self.data_folder = "data"
+        self.target_email = self.mailbox.email
+        self.data_folder = self.mailbox.data_folder
+        
+        # Quota is charged per mailbox; the bucket lives in this process
+        self.quota_user = self.mailbox.quota_user
+        get_quota_bucket(self.quota_user, self.mailbox.quota_units_per_second)
+        
+        # Messages already handled in earlier runs
+        self.checkpoint = MailboxCheckpoint(self.mailbox.id)
+        
+        # Which attachments are worth downloading at all
+        self.attachment_filter = AttachmentFilter.from_config(self.mailbox.attachment_filter)
+        self.attachments_skipped = 0
+        
+        # Messages that could not be fetched even after retrying
+        self.failed_message_ids: List[str] = []
+        
+        # Serialises picking unique filenames when attachments are saved concurrently
+        self._paths_lock = threading.Lock()
         
         # Ensure data folder exists
         os.makedirs(self.data_folder, exist_ok=True)
     
-    def authenticate(self) -> bool:
+    def _load_credentials(self) -> Any:
         """
-        Authenticate with Gmail API
+        Load, refresh or (interactively) obtain the mailbox's OAuth credentials
         
         Returns:
-            bool: True if authentication successful, False otherwise
+            google.oauth2 Credentials, or None if they could not be obtained
         """
+        # The Google auth and discovery clients take ~0.5s to import, so
+        # they are loaded where they are used, not when this module is imported
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        
         creds = None
         
         # Load existing token
@@ -59,51 +138,124 @@ class GmailDataRetriever:
                 try:
                     creds.refresh(Request())
                 except Exception as e:
-                    print(f"Error refreshing credentials: {e}")
-                    return False
+                    logger.error("Error refreshing credentials: %s", e)
+                    return None
             else:
+                if not self.interactive:
+                    logger.error("Mailbox '%s' has no valid token in %s. "
+                                 "Run 'python get_data.py --authorize %s' to authorise it.",
+                                 self.mailbox.id, self.token_file, self.mailbox.id)
+                    return None
                 if not os.path.exists(self.credentials_file):
-                    print(f"Error: Gmail API credentials file '{self.credentials_file}' not found.")
-                    print("Please download credentials.json from Google Cloud Console.")
-                    return False
+                    logger.error("Gmail API credentials file '%s' not found. "
+                                 "Please download credentials.json from Google Cloud Console.",
+                                 self.credentials_file)
+                    return None
                 
                 try:
                     flow = InstalledAppFlow.from_client_secrets_file(
                         self.credentials_file, SCOPES)
                     creds = flow.run_local_server(port=0)
                 except Exception as e:
-                    print(f"Error during authentication: {e}")
-                    return False
+                    logger.error("Error during authentication: %s", e)
+                    return None
             
             # Save credentials for next run
+            os.makedirs(os.path.dirname(self.token_file) or '.', exist_ok=True)
             with open(self.token_file, 'w') as token:
                 token.write(creds.to_json())
         
+        return creds
+    
+    @traced('gmail.authenticate')
+    def authenticate(self) -> bool:
+        """
+        Authenticate with Gmail API
+        
+        Returns:
+            bool: True if authentication successful, False otherwise
+        """
+        creds = self._load_credentials()
+        if creds is None:
+            return False
+        
+        from googleapiclient.discovery import build
+        
         try:
             self.service = build('gmail', 'v1', credentials=creds)
             # Check which account we're authenticated as
             self._check_authenticated_account()
             return True
         except Exception as e:
-            print(f"Error building Gmail service: {e}")
+            logger.error("Error building Gmail service: %s", e)
             return False
     
+    async def open_transport(self) -> Any:
+        """
+        Authenticate and open a pooled async transport for this mailbox
+        
+        Returns:
+            AsyncGmailTransport (the caller closes it), or None if authentication failed
+        """
+        from utils.gmail_transport import AsyncGmailTransport
+        
+        creds = await asyncio.to_thread(self._load_credentials)
+        if creds is None:
+            return None
+        settings = get_gmail_config()
+        return AsyncGmailTransport(
+            credentials=creds,
+            quota_user=self.quota_user,
+            max_connections=settings.get('max_connections', 20),
+            http2=settings.get('http2', True),
+            timeout=settings.get('request_timeout_seconds', 30.0)
+        )
+    
     def _check_authenticated_account(self):
         """Check which Gmail account we're authenticated as"""
         try:
-            profile = self.service.users().getProfile(userId='me').execute()
-            email_address = profile.get('emailAddress', 'Unknown')
-            print(f"Debug: Authenticated as Gmail account: {email_address}")
-            
-            if email_address != self.target_email:
-                print(f"Warning: Authenticated as {email_address} but target is {self.target_email}")
-                print(f"Note: Will search inbox of {email_address} for emails")
-            else:
-                print(f"Info: Correctly authenticated as target account {self.target_email}")
-                
+            profile = execute_gmail(
+                self.service.users().getProfile(userId='me'),
+                'users.getProfile', self.quota_user
+            )
+            self._record_profile(profile)
+        except Exception as e:
+            logger.warning("Could not check authenticated account: %s", e)
+    
+    async def _check_authenticated_account_async(self, transport: Any):
+        """Check which Gmail account the async transport is authenticated as"""
+        try:
+            self._record_profile(await transport.get_profile())
         except Exception as e:
-            print(f"Warning: Could not check authenticated account: {e}")
+            logger.warning("Could not check authenticated account: %s", e)
+    
+    def _record_profile(self, profile: Dict[str, Any]):
+        """Compare the authenticated account with the mailbox's target address"""
+        email_address = profile.get('emailAddress', 'Unknown')
+        logger.debug("Authenticated as Gmail account: %s", email_address)
+        
+        if self.target_email is None:
+            # No address configured: the mailbox is whichever account authorised
+            self.target_email = email_address
+        elif email_address != self.target_email:
+            logger.warning("Authenticated as %s but target is %s; will search inbox of %s",
+                           email_address, self.target_email, email_address)
+        else:
+            logger.info("Correctly authenticated as target account %s", self.target_email)
+    
+    def _search_query(self, hours_back: int) -> Tuple[str, str]:
+        """The Gmail search query for recent mail with attachments, and its date bound"""
+        # Calculate date filter (emails from the last 24 hours)
+        date_filter = datetime.now() - timedelta(hours=hours_back)
+        date_str = date_filter.strftime('%Y/%m/%d')
+        
+        # Search query for emails TO target address with attachments
+        # Note: This assumes we're authenticated as the target Gmail account
+        # The filter rules Gmail can evaluate narrow the search server-side
+        query = ' '.join(['has:attachment', *self.attachment_filter.gmail_query_terms(), f'after:{date_str}'])
+        return query, date_str
     
+    @traced('gmail.get_recent_emails')
     def get_recent_emails(self, hours_back: int = 24) -> List[str]:
         """
         Get recent emails to the target email address (checking inbox)
@@ -115,50 +267,82 @@ class GmailDataRetriever:
             List of message IDs
         """
         try:
-            # Calculate date filter (emails from the last 24 hours)
-            date_filter = datetime.now() - timedelta(hours=hours_back)
-            date_str = date_filter.strftime('%Y/%m/%d')
-            
-            print(f"Debug: Searching for emails after {date_str}")
-            print(f"Debug: Looking for emails TO {self.target_email}")
-            
-            # Search query for emails TO target address with attachments
-            # Note: This assumes we're authenticated as the target Gmail account
-            query = f'has:attachment after:{date_str}'
-            
-            print(f"Debug: Using query: {query}")
+            query, date_str = self._search_query(hours_back)
+            logger.debug("Searching for emails TO %s after %s", self.target_email, date_str)
+            logger.debug("Using query: %s", query)
             
             # Get message list
-            result = self.service.users().messages().list(
-                userId='me', 
-                q=query,
-                maxResults=10
-            ).execute()
+            with STAGE_SECONDS.labels(stage='gmail_list').time():
+                result = execute_gmail(self.service.users().messages().list(
+                    userId='me', 
+                    q=query,
+                    maxResults=min(500, get_gmail_config().get('max_results', 10))
+                ), 'messages.list', self.quota_user)
             
             messages = result.get('messages', [])
-            print(f"Debug: Found {len(messages)} messages")
+            logger.debug("Found %d messages", len(messages))
+            current_span().set_attribute('messages', len(messages))
             
             # If no messages found with attachments, try without attachment filter
             if not messages:
-                print("Debug: No messages with attachments found, trying without attachment filter...")
+                logger.debug("No messages with attachments found, trying without attachment filter")
                 query_no_attachment = f'after:{date_str}'
-                result_no_attachment = self.service.users().messages().list(
-                    userId='me',
-                    q=query_no_attachment,
-                    maxResults=5
-                ).execute()
+                with STAGE_SECONDS.labels(stage='gmail_list').time():
+                    result_no_attachment = execute_gmail(self.service.users().messages().list(
+                        userId='me',
+                        q=query_no_attachment,
+                        maxResults=5
+                    ), 'messages.list', self.quota_user)
                 messages_no_attachment = result_no_attachment.get('messages', [])
-                print(f"Debug: Found {len(messages_no_attachment)} total messages (without attachment filter)")
+                logger.debug("Found %d total messages (without attachment filter)", len(messages_no_attachment))
             
             return [msg['id'] for msg in messages]
             
         except HttpError as error:
-            print(f'Gmail API error occurred: {error}')
+            logger.error("Gmail API error occurred: %s", error)
             return []
         except Exception as e:
-            print(f'Error retrieving emails: {e}')
+            logger.error("Error retrieving emails: %s", e)
             return []
     
+    async def get_recent_emails_async(self, transport: Any, hours_back: int = 24) -> List[str]:
+        """
+        Get recent emails with attachments over the async transport
+        
+        Pages through the results up to the configured max_results.
+        
+        Args:
+            transport: Open AsyncGmailTransport for this mailbox
+            hours_back: Number of hours to look back for emails
+            
+        Returns:
+            List of message IDs
+        """
+        query, date_str = self._search_query(hours_back)
+        logger.debug("Searching for emails TO %s after %s using query: %s", self.target_email, date_str, query)
+        limit = get_gmail_config().get('max_results', 10)
+        
+        message_ids: List[str] = []
+        page_token = None
+        try:
+            while len(message_ids) < limit:
+                with STAGE_SECONDS.labels(stage='gmail_list').time():
+                    # Gmail returns at most 500 messages per page
+                    page = await transport.list_messages(q=query, max_results=min(500, limit - len(message_ids)),
+                                                         page_token=page_token)
+                message_ids.extend(msg['id'] for msg in page.get('messages', []))
+                page_token = page.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as error:
+            logger.error("Gmail API error occurred: %s", error)
+        except Exception as e:
+            logger.error("Error retrieving emails: %s", e)
+        
+        logger.debug("Found %d messages", len(message_ids))
+        return message_ids
+    
+    @traced('gmail.get_message_details')
     def get_message_details(self, message_id: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a specific message
@@ -170,15 +354,19 @@ class GmailDataRetriever:
             Message details dictionary or None if error
         """
         try:
-            message = self.service.users().messages().get(
-                userId='me', 
-                id=message_id
-            ).execute()
+            with STAGE_SECONDS.labels(stage='gmail_get').time():
+                message = execute_gmail(self.service.users().messages().get(
+                    userId='me', 
+                    id=message_id
+                ), 'messages.get', self.quota_user)
+            MESSAGES_PROCESSED.inc()
             return message
         except HttpError as error:
-            print(f'Error retrieving message {message_id}: {error}')
+            logger.error("Error retrieving message %s: %s", message_id, error)
+            self._record_failure(message_id)
             return None
     
+    @traced('gmail.download_attachments')
     def download_attachments(self, message_id: str) -> List[str]:
         """
         Download all attachments from a message
@@ -196,56 +384,219 @@ class GmailDataRetriever:
             if not message:
                 return downloaded_files
             
-            # Save files directly in data folder (no date subfolders)
-            download_path = self.data_folder
-            
-            # Process message parts to find attachments
-            parts = self._get_message_parts(message)
-            
+            headers, parts = self._select_attachments(message_id, message)
             for part in parts:
-                if part.get('filename') and part.get('body', {}).get('attachmentId'):
-                    filename = part['filename']
-                    attachment_id = part['body']['attachmentId']
-                    
-                    # Download attachment
-                    attachment = self.service.users().messages().attachments().get(
+                filename = part['filename']
+                
+                # Download attachment
+                with span('gmail.attachments.get', filename=filename) as attachment_span, \
+                        STAGE_SECONDS.labels(stage='attachment_download').time():
+                    attachment = execute_gmail(self.service.users().messages().attachments().get(
                         userId='me',
                         messageId=message_id,
-                        id=attachment_id
-                    ).execute()
-                    
-                    # Decode and save file
-                    file_data = base64.urlsafe_b64decode(attachment['data'])
-                    file_path = os.path.join(download_path, filename)
-                    
-                    # Handle duplicate filenames with timestamp
-                    if os.path.exists(file_path):
-                        timestamp = int(message['internalDate']) / 1000
-                        time_str = datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S')
-                        base_name, extension = os.path.splitext(filename)
-                        filename = f"{base_name}_{time_str}{extension}"
-                        file_path = os.path.join(download_path, filename)
-                        
-                        # If still duplicate, add counter
-                        counter = 1
-                        while os.path.exists(file_path):
-                            new_filename = f"{base_name}_{time_str}_{counter}{extension}"
-                            file_path = os.path.join(download_path, new_filename)
-                            counter += 1
-                    
-                    with open(file_path, 'wb') as f:
-                        f.write(file_data)
-                    
-                    downloaded_files.append(file_path)
-                    print(f"Downloaded: {file_path}")
+                        id=part['body']['attachmentId']
+                    ), 'messages.attachments.get', self.quota_user)
+                
+                file_data = base64.urlsafe_b64decode(attachment['data'])
+                attachment_span.set_attribute('bytes', len(file_data))
+                downloaded_files.append(self._save_attachment(message, headers, filename, file_data))
+            
+            # Remember the message so later runs over the same window skip it. A
+            # message whose attachments were all filtered out isn't remembered, so
+            # it is picked up again if the attachment filter is relaxed
+            if parts:
+                self.checkpoint.mark_processed(message_id, message.get('internalDate'))
             
         except HttpError as error:
-            print(f'Error downloading attachments: {error}')
+            logger.error("Error downloading attachments for %s: %s", message_id, error)
+            self._record_failure(message_id)
         except Exception as e:
-            print(f'Unexpected error: {e}')
+            logger.exception("Unexpected error downloading attachments for %s", message_id)
+            self._record_failure(message_id)
         
         return downloaded_files
     
+    async def download_attachments_async(self, transport: Any, message_id: str) -> List[str]:
+        """
+        Download all attachments from a message over the async transport
+        
+        The message's attachments are fetched concurrently; files are decoded
+        and written in worker threads so the event loop keeps serving other
+        requests.
+        
+        Args:
+            transport: Open AsyncGmailTransport for this mailbox
+            message_id: Gmail message ID
+            
+        Returns:
+            List of downloaded file paths
+        """
+        try:
+            with STAGE_SECONDS.labels(stage='gmail_get').time():
+                message = await transport.get_message(message_id)
+            MESSAGES_PROCESSED.inc()
+            
+            headers, parts = self._select_attachments(message_id, message)
+            
+            async def fetch(part: Dict[str, Any]) -> str:
+                with STAGE_SECONDS.labels(stage='attachment_download').time():
+                    attachment = await transport.get_attachment(message_id, part['body']['attachmentId'])
+                return await asyncio.to_thread(self._save_encoded_attachment, message, headers,
+                                               part['filename'], attachment['data'])
+            
+            results = await asyncio.gather(*(fetch(part) for part in parts), return_exceptions=True)
+            downloaded_files = [result for result in results if isinstance(result, str)]
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                # The saved attachments are still reported; the message isn't
+                # checkpointed, so a retry fetches the rest (and finds the saved
+                # ones already on disk)
+                for error in errors:
+                    logger.error("Error downloading an attachment of %s: %s", message_id, error)
+                self._record_failure(message_id)
+                return downloaded_files
+            
+            # Remember the message so later runs over the same window skip it (not
+            # when every attachment was filtered out; see download_attachments)
+            if parts:
+                self.checkpoint.mark_processed(message_id, message.get('internalDate'))
+            return downloaded_files
+            
+        except HttpError as error:
+            logger.error("Error downloading attachments for %s: %s", message_id, error)
+        except Exception:
+            logger.exception("Unexpected error downloading attachments for %s", message_id)
+        self._record_failure(message_id)
+        return []
+    
+    def _select_attachments(self, message_id: str,
+                            message: Dict[str, Any]) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+        """
+        Pick the attachment parts of a message the filter lets through
+        
+        Args:
+            message_id: Gmail message ID
+            message: Gmail message object
+            
+        Returns:
+            (lower-cased headers, attachment parts to download)
+        """
+        headers = {
+            header['name'].lower(): header['value']
+            for header in message.get('payload', {}).get('headers', [])
+        }
+        sender_allowed = self.attachment_filter.allows_sender(headers.get('from', ''))
+        
+        selected = []
+        for part in self._get_message_parts(message):
+            if part.get('filename') and part.get('body', {}).get('attachmentId'):
+                # Reject on part metadata so filtered attachments are never fetched
+                reason = self.attachment_filter.rejection_reason(part) if sender_allowed else 'sender'
+                if reason:
+                    ATTACHMENTS_SKIPPED.labels(reason=reason).inc()
+                    self.attachments_skipped += 1
+                    logger.debug("Skipping attachment %s (%s)", part['filename'], reason,
+                                 extra={'message_id': message_id})
+                    continue
+                selected.append(part)
+        return headers, selected
+    
+    def _save_encoded_attachment(self, message: Dict[str, Any], headers: Dict[str, str],
+                                 filename: str, encoded_data: str) -> str:
+        """Decode an attachments.get body (base64url) and save it; see _save_attachment"""
+        return self._save_attachment(message, headers, filename, base64.urlsafe_b64decode(encoded_data))
+    
+    def _save_attachment(self, message: Dict[str, Any], headers: Dict[str, str],
+                         filename: str, file_data: bytes) -> str:
+        """
+        Write a downloaded attachment to the data folder and announce it
+        
+        An attachment already saved with the same content (by a retry of a
+        partly failed message) isn't written or announced again.
+        
+        Args:
+            message: Gmail message the attachment belongs to
+            headers: The message's lower-cased headers
+            filename: Attachment filename
+            file_data: Decoded attachment bytes
+            
+        Returns:
+            Path of the written file
+        """
+        # Save files directly in data folder (no date subfolders)
+        download_path = self.data_folder
+        write_started = time.perf_counter()
+        BYTES_DOWNLOADED.inc(len(file_data))
+        
+        content_hash = hashlib.sha256(file_data).hexdigest()
+        with self._paths_lock:
+            # Duplicate filenames get the message timestamp, then a counter
+            for file_path in self._candidate_paths(download_path, filename, message):
+                if not os.path.exists(file_path):
+                    break
+                if os.path.getsize(file_path) == len(file_data) and file_content_hash(file_path) == content_hash:
+                    logger.debug("Already downloaded: %s", file_path, extra={'message_id': message.get('id')})
+                    # Announced when it was first saved
+                    _mark_announced(file_path)
+                    return file_path
+            
+            # Created under the lock so a concurrent save can't pick the same name
+            f = open(file_path, 'wb')
+        
+        with f:
+            f.write(file_data)
+        STAGE_SECONDS.labels(stage='attachment_write').observe(time.perf_counter() - write_started)
+        ATTACHMENTS_DOWNLOADED.inc()
+        logger.debug("Downloaded: %s", file_path, extra={'bytes': len(file_data), 'message_id': message.get('id')})
+        
+        # Warm the viewer's first-page preview
+        schedule_prerender(file_path)
+        
+        # Make the document findable by sender/subject straight away
+        self._index_download(file_path, message, headers)
+        
+        # Tell connected viewers (/api/events) without waiting for the run to end
+        publish_event('document.downloaded', {
+            'document_path': file_path,
+            'document_name': os.path.basename(file_path),
+            'mailbox': self.mailbox.id
+        })
+        _mark_announced(file_path)
+        return file_path
+    
+    @staticmethod
+    def _candidate_paths(download_path: str, filename: str, message: Dict[str, Any]):
+        """Paths an attachment may be saved under, in the order they are tried"""
+        yield os.path.join(download_path, filename)
+        timestamp = int(message['internalDate']) / 1000
+        time_str = datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S')
+        base_name, extension = os.path.splitext(filename)
+        yield os.path.join(download_path, f"{base_name}_{time_str}{extension}")
+        counter = 1
+        while True:
+            yield os.path.join(download_path, f"{base_name}_{time_str}_{counter}{extension}")
+            counter += 1
+    
+    def _index_download(self, file_path: str, message: Dict[str, Any], headers: Dict[str, str]):
+        """Record a downloaded attachment's email metadata in the search index"""
+        try:
+            received_at = datetime.fromtimestamp(int(message['internalDate']) / 1000).isoformat()
+            get_search_index().record_download(
+                file_path,
+                sender=headers.get('from', ''),
+                subject=headers.get('subject', ''),
+                received_at=received_at,
+                message_id=message.get('id')
+            )
+        except Exception:
+            # The index is a convenience; never fail a download because of it
+            logger.warning("Could not index %s", file_path, exc_info=True)
+    
+    def _record_failure(self, message_id: str):
+        """Remember a message that failed so the run can report it"""
+        if message_id not in self.failed_message_ids:
+            self.failed_message_ids.append(message_id)
+    
     def _get_message_parts(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Recursively extract all parts from a message
@@ -285,6 +636,43 @@ class GmailDataRetriever:
             parts.append(part)
         return parts
     
+    def _new_result(self) -> Dict[str, Any]:
+        """Start a processing result and reset the per-run counters"""
+        self.failed_message_ids = []
+        self.attachments_skipped = 0
+        return {
+            'success': False,
+            'message': 'No new records to display',
+            'mailbox': self.mailbox.id,
+            'files_downloaded': [],
+            'emails_processed': 0,
+            'emails_skipped': 0,
+            'attachments_skipped': 0,
+            'failed_message_ids': [],
+            'error': None
+        }
+    
+    def _finish_result(self, result: Dict[str, Any], message_ids: List[str], all_downloaded_files: List[str]):
+        """Fill in a processing result once every new message has been handled"""
+        if all_downloaded_files:
+            result['success'] = True
+            result['message'] = f'Successfully downloaded {len(all_downloaded_files)} attachment(s) from {len(message_ids)} email(s)'
+            result['files_downloaded'] = all_downloaded_files
+            result['emails_processed'] = len(message_ids)
+        else:
+            result['message'] = 'Emails found but no attachments to download'
+        
+        if self.failed_message_ids:
+            result['failed_message_ids'] = list(self.failed_message_ids)
+            result['message'] += f' ({len(self.failed_message_ids)} email(s) failed and should be retried)'
+    
+    def _save_checkpoint(self):
+        try:
+            self.checkpoint.save()
+        except OSError as e:
+            logger.warning("Could not save checkpoint for mailbox %s: %s", self.mailbox.id, e)
+    
+    @traced('gmail.process_new_emails')
     def process_new_emails(self) -> Dict[str, Any]:
         """
         Main method to check for new emails and download attachments
@@ -292,13 +680,7 @@ class GmailDataRetriever:
         Returns:
             Dictionary with processing results
         """
-        result = {
-            'success': False,
-            'message': 'No new records to display',
-            'files_downloaded': [],
-            'emails_processed': 0,
-            'error': None
-        }
+        result = self._new_result()
         
         try:
             # Authenticate
@@ -306,8 +688,10 @@ class GmailDataRetriever:
                 result['error'] = 'Failed to authenticate with Gmail API'
                 return result
             
-            # Get recent emails
-            message_ids = self.get_recent_emails()
+            # Get recent emails, minus those handled by an earlier run
+            found_ids = self.get_recent_emails()
+            message_ids = [mid for mid in found_ids if not self.checkpoint.is_processed(mid)]
+            result['emails_skipped'] = len(found_ids) - len(message_ids)
             
             if not message_ids:
                 result['message'] = 'No new emails with attachments found'
@@ -319,16 +703,67 @@ class GmailDataRetriever:
                 downloaded_files = self.download_attachments(message_id)
                 all_downloaded_files.extend(downloaded_files)
             
-            if all_downloaded_files:
-                result['success'] = True
-                result['message'] = f'Successfully downloaded {len(all_downloaded_files)} attachment(s) from {len(message_ids)} email(s)'
-                result['files_downloaded'] = all_downloaded_files
-                result['emails_processed'] = len(message_ids)
-            else:
-                result['message'] = 'Emails found but no attachments to download'
+            self._finish_result(result, message_ids, all_downloaded_files)
+            
+        except Exception as e:
+            result['error'] = f'Unexpected error during processing: {str(e)}'
+        finally:
+            result['attachments_skipped'] = self.attachments_skipped
+            self._save_checkpoint()
+        
+        return result
+    
+    @traced('gmail.process_new_emails')
+    async def process_new_emails_async(self, transport: Any = None) -> Dict[str, Any]:
+        """
+        Check for new emails and download attachments on the running event loop
+        
+        Messages are fetched concurrently (up to the configured concurrency)
+        over one pooled transport.
+        
+        Args:
+            transport: Open AsyncGmailTransport to use (e.g. one pointed at a
+                       fake server); by default one is opened and closed here
+            
+        Returns:
+            Dictionary with processing results
+        """
+        result = self._new_result()
+        owns_transport = transport is None
+        
+        try:
+            if owns_transport:
+                transport = await self.open_transport()
+                if transport is None:
+                    result['error'] = 'Failed to authenticate with Gmail API'
+                    return result
+            await self._check_authenticated_account_async(transport)
+            
+            # Get recent emails, minus those handled by an earlier run
+            found_ids = await self.get_recent_emails_async(transport)
+            message_ids = [mid for mid in found_ids if not self.checkpoint.is_processed(mid)]
+            result['emails_skipped'] = len(found_ids) - len(message_ids)
+            
+            if not message_ids:
+                result['message'] = 'No new emails with attachments found'
+                return result
+            
+            semaphore = asyncio.Semaphore(max(1, get_gmail_config().get('concurrency', 100)))
+            
+            async def download(message_id: str) -> List[str]:
+                async with semaphore:
+                    return await self.download_attachments_async(transport, message_id)
+            
+            downloaded = await asyncio.gather(*(download(message_id) for message_id in message_ids))
+            self._finish_result(result, message_ids, [path for files in downloaded for path in files])
             
         except Exception as e:
             result['error'] = f'Unexpected error during processing: {str(e)}'
+        finally:
+            result['attachments_skipped'] = self.attachments_skipped
+            if owns_transport and transport is not None:
+                await transport.aclose()
+            self._save_checkpoint()
         
         return result
 
@@ -360,11 +795,11 @@ def test_gmail_search():
     for query in test_queries:
         print(f"\nTesting query: '{query}'")
         try:
-            result = retriever.service.users().messages().list(
+            result = execute_gmail(retriever.service.users().messages().list(
                 userId='me',
                 q=query,
                 maxResults=5
-            ).execute()
+            ), 'messages.list', retriever.quota_user)
             messages = result.get('messages', [])
             print(f"  Found: {len(messages)} messages")
             
@@ -385,8 +820,154 @@ def test_gmail_search():
     
     print("\n=== Search test completed ===\n")
 
+def _ingest_mailbox(mailbox_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Ingest one mailbox (runs in a supervisor worker process)"""
+    configure_logging()
+    mailbox = Mailbox.from_dict(mailbox_data)
+    try:
+        return GmailDataRetriever(mailbox=mailbox, interactive=False).process_new_emails()
+    except Exception as e:
+        logger.exception("Ingestion failed for mailbox %s", mailbox.id)
+        return {'success': False, 'mailbox': mailbox.id, 'message': 'Ingestion failed',
+                'files_downloaded': [], 'emails_processed': 0, 'failed_message_ids': [],
+                'error': str(e)}
+
+def _merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-mailbox results into one processing result"""
+    files = [path for r in results for path in r.get('files_downloaded', [])]
+    emails = sum(r.get('emails_processed', 0) for r in results)
+    failed = [mid for r in results for mid in r.get('failed_message_ids', [])]
+    errors = [f"{r['mailbox']}: {r['error']}" for r in results if r.get('error')]
+    
+    if files:
+        message = f'Successfully downloaded {len(files)} attachment(s) from {emails} email(s) across {len(results)} mailbox(es)'
+    elif errors and len(errors) == len(results):
+        message = 'Processing failed for every mailbox'
+    else:
+        message = 'No new emails with attachments found'
+    if failed:
+        message += f' ({len(failed)} email(s) failed and should be retried)'
+    if errors and files:
+        message += f' ({len(errors)} mailbox(es) failed)'
+    
+    return {
+        'success': bool(files),
+        'message': message,
+        'files_downloaded': files,
+        'emails_processed': emails,
+        'failed_message_ids': failed,
+        'attachments_skipped': sum(r.get('attachments_skipped', 0) for r in results),
+        'error': '; '.join(errors) if errors else None,
+        'mailboxes': [
+            {
+                'id': r.get('mailbox'),
+                'success': r.get('success', False),
+                'message': r.get('message'),
+                'files_downloaded': len(r.get('files_downloaded', [])),
+                'emails_processed': r.get('emails_processed', 0),
+                'emails_skipped': r.get('emails_skipped', 0),
+                'attachments_skipped': r.get('attachments_skipped', 0),
+                'error': r.get('error'),
+            }
+            for r in results
+        ]
+    }
+
+@traced('gmail.process_all_mailboxes')
+def process_all_mailboxes(mailboxes: Optional[List[Mailbox]] = None,
+                          max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Ingest every registered mailbox, spread across worker processes
+    
+    Each worker process has its own Gmail quota buckets, and each mailbox
+    its own token, checkpoint and output folder. A single mailbox is
+    processed in this process (with the interactive OAuth flow allowed).
+    
+    Args:
+        mailboxes: Mailboxes to ingest (defaults to the enabled registry entries)
+        max_workers: Worker processes (defaults to the gmail config, else one per core)
+        
+    Returns:
+        Combined processing results with a per-mailbox breakdown
+    """
+    if get_gmail_config().get('transport') == 'httpx':
+        return asyncio.run(process_all_mailboxes_async(mailboxes))
+    
+    mailboxes = load_mailboxes() if mailboxes is None else mailboxes
+    if not mailboxes:
+        return _merge_results([])
+    if len(mailboxes) == 1:
+        result = GmailDataRetriever(mailbox=mailboxes[0]).process_new_emails()
+        return {**result, 'mailboxes': _merge_results([result])['mailboxes']}
+    
+    workers = max_workers or get_gmail_config().get('max_workers') or os.cpu_count() or 1
+    workers = max(1, min(workers, len(mailboxes)))
+    logger.info("Ingesting %d mailboxes with %d worker processes", len(mailboxes), workers)
+    
+    # spawn: forking a process that runs logging/executor threads is unsafe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(_ingest_mailbox, mailbox.to_dict()): mailbox for mailbox in mailboxes}
+        results = []
+        for future, mailbox in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error("Worker for mailbox %s crashed: %s", mailbox.id, e)
+                results.append({'success': False, 'mailbox': mailbox.id, 'error': str(e)})
+    
+    return _merge_results(results)
+
+async def _ingest_mailbox_async(mailbox: Mailbox, interactive: bool) -> Dict[str, Any]:
+    """Ingest one mailbox with the async transport"""
+    try:
+        return await GmailDataRetriever(mailbox=mailbox, interactive=interactive).process_new_emails_async()
+    except Exception as e:
+        logger.exception("Ingestion failed for mailbox %s", mailbox.id)
+        return {'success': False, 'mailbox': mailbox.id, 'message': 'Ingestion failed',
+                'files_downloaded': [], 'emails_processed': 0, 'failed_message_ids': [],
+                'error': str(e)}
+
+@traced('gmail.process_all_mailboxes')
+async def process_all_mailboxes_async(mailboxes: Optional[List[Mailbox]] = None) -> Dict[str, Any]:
+    """
+    Ingest every registered mailbox concurrently on the running event loop
+    
+    Ingestion is network-bound, so with the async transport all mailboxes
+    share one process; each keeps its own connection pool, quota bucket,
+    checkpoint and output folder.
+    
+    Args:
+        mailboxes: Mailboxes to ingest (defaults to the enabled registry entries)
+        
+    Returns:
+        Combined processing results with a per-mailbox breakdown
+    """
+    mailboxes = load_mailboxes() if mailboxes is None else mailboxes
+    if not mailboxes:
+        return _merge_results([])
+    # As with the process pool, only a lone mailbox may open the browser OAuth flow
+    results = await asyncio.gather(*(_ingest_mailbox_async(mailbox, len(mailboxes) == 1)
+                                     for mailbox in mailboxes))
+    if len(results) == 1:
+        return {**results[0], 'mailboxes': _merge_results(results)['mailboxes']}
+    return _merge_results(list(results))
+
 def main():
     """Main function for standalone execution"""
+    configure_logging(json_output=False)
+    
+    # Non-interactive: authorise a registered mailbox and exit
+    if len(sys.argv) == 3 and sys.argv[1] == '--authorize':
+        try:
+            mailbox = get_mailbox(sys.argv[2])
+        except KeyError:
+            print(f"Unknown mailbox '{sys.argv[2]}'")
+            return
+        retriever = GmailDataRetriever(mailbox=mailbox)
+        print("Authorised" if retriever.authenticate() else "Authentication failed!")
+        return
+    
     print("Mars AI Agents - Gmail Data Retrieval")
     print("=" * 40)
     
@@ -417,10 +998,18 @@ def process_gmail_data() -> Dict[str, Any]:
     Function to be called by Flask API
     
     Returns:
-        Processing results dictionary
+        Processing results dictionary (with a per-mailbox breakdown)
     """
-    retriever = GmailDataRetriever()
-    return retriever.process_new_emails()
+    return process_all_mailboxes()
+
+async def process_gmail_data_async() -> Dict[str, Any]:
+    """
+    Ingest every mailbox on the caller's event loop (httpx transport)
+    
+    Returns:
+        Processing results dictionary (with a per-mailbox breakdown)
+    """
+    return await process_all_mailboxes_async()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
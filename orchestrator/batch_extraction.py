@@ -0,0 +1,746 @@
+"""
+Mars AI Agents - Batch Extraction
+Backlog mode for large folders of historical documents: reads each PDF,
+writes the extraction prompts as OpenAI Batch API JSONL, submits it through
+a pluggable provider, polls until done and merges the answers into the
+search index. Every item's state is kept in SQLite, so an interrupted run
+continues where it stopped.
+
+Usage:
+    python -m orchestrator.batch_extraction run data/ap-east --wait
+    python -m orchestrator.batch_extraction poll --wait
+    python -m orchestrator.batch_extraction status
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import get_batch_config, get_llm_config
+from utils.file_utils import file_content_hash
+from utils.logging_utils import configure_logging
+from utils.sqlite_store import connect
+
+logger = logging.getLogger(__name__)
+
+# Item states
+PENDING = 'pending'        # discovered, not read yet
+READY = 'ready'            # text read, prompts not yet submitted
+SUBMITTING = 'submitting'  # written to a batch file whose submission isn't confirmed
+SUBMITTED = 'submitted'    # part of a batch that hasn't finished
+DONE = 'done'              # fields merged into the search index
+FAILED = 'failed'          # the batch returned an error for it
+SKIPPED = 'skipped'        # rejected by triage or no readable text
+
+ITEM_STATES = (PENDING, READY, SUBMITTING, SUBMITTED, DONE, FAILED, SKIPPED)
+
+# Provider batch states (plus SUBMITTING for a batch file recorded before it is sent)
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+FINISHED_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Batch calls per document: (prompt template and custom_id suffix, result field)
+_CALLS = (('invoice', 'invoice_number'), ('order', 'order_number'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batch_items (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    batch_id TEXT,
+    prompt_version TEXT,
+    text BLOB,
+    invoice_number TEXT,
+    order_number TEXT,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batch_items_state ON batch_items(state);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    input_file TEXT NOT NULL,
+    status TEXT NOT NULL,
+    request_count INTEGER NOT NULL,
+    submitted_at TEXT NOT NULL,
+    finished_at TEXT
+);
+"""
+
+
+def _strict_schema(model: Any) -> Dict[str, Any]:
+    """JSON schema of a pydantic model in the form strict structured outputs require"""
+    schema = model.model_json_schema()
+    schema['additionalProperties'] = False
+    schema['required'] = list(schema.get('properties', {}))
+    return schema
+
+
+def batch_request(custom_id: str, messages: List[Any], schema_model: Any, model: str) -> Dict[str, Any]:
+    """
+    One line of an OpenAI Batch API input file
+
+    Args:
+        custom_id: ID echoed back in the output line
+        messages: Chat messages (langchain messages or OpenAI dicts)
+        schema_model: Pydantic model the answer must follow
+        model: Chat model name
+
+    Returns:
+        {'custom_id', 'method', 'url', 'body'}
+    """
+    from langchain_core.messages import convert_to_openai_messages
+
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': '/v1/chat/completions',
+        'body': {
+            'model': model,
+            'messages': convert_to_openai_messages(messages),
+            'response_format': {
+                'type': 'json_schema',
+                'json_schema': {
+                    'name': schema_model.__name__,
+                    'schema': _strict_schema(schema_model),
+                    'strict': True,
+                },
+            },
+        },
+    }
+
+
+class BatchProvider:
+    """Where batch files are sent; subclasses talk to a real or fake backend"""
+
+    name = ''
+
+    def submit(self, input_path: str) -> str:
+        """Upload a JSONL input file and start a batch; returns the batch ID"""
+        raise NotImplementedError
+
+    def find(self, input_path: str) -> Optional[str]:
+        """ID of a batch already started from this input file, if any (used when resuming)"""
+        return None
+
+    def status(self, batch_id: str) -> str:
+        """in_progress, completed, failed, expired or cancelled"""
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Output (and error) lines of a finished batch, in the Batch API output format"""
+        raise NotImplementedError
+
+
+class OpenAIBatchProvider(BatchProvider):
+    """OpenAI Batch API (/v1/batches), billed at the batch discount"""
+
+    name = 'openai'
+
+    def __init__(self, completion_window: str = '24h', client: Any = None):
+        """
+        Initialize the provider
+
+        Args:
+            completion_window: Batch completion window
+            client: openai.OpenAI client (created from the environment if None)
+        """
+        if client is None:
+            import openai
+            client = openai.OpenAI()
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint='/v1/chat/completions',
+            completion_window=self.completion_window,
+            metadata={'source': 'mars-batch-extraction', 'input_file': os.path.basename(input_path)}
+        )
+        return batch.id
+
+    def find(self, input_path: str) -> Optional[str]:
+        # A resumed submission is recent, so the latest page of batches is enough
+        for batch in self.client.batches.list(limit=100).data:
+            metadata = batch.metadata or {}
+            if (metadata.get('source') == 'mars-batch-extraction'
+                    and metadata.get('input_file') == os.path.basename(input_path)):
+                return batch.id
+        return None
+
+    def status(self, batch_id: str) -> str:
+        status = self.client.batches.retrieve(batch_id).status
+        return status if status in FINISHED_STATES else IN_PROGRESS
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = self.client.files.content(file_id).text
+                lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchProvider(BatchProvider):
+    """
+    Offline stand-in that answers batches on this machine
+
+    Requests are answered by `respond(body) -> (answer dict, usage dict)`,
+    and a batch reports in_progress for `polls_until_complete` polls first,
+    so submit/poll/resume paths can be exercised without the API.
+    """
+
+    name = 'local'
+
+    def __init__(self, folder: str, respond: Optional[Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Dict[str, int]]]] = None,
+                 polls_until_complete: int = 0):
+        """
+        Initialize the stand-in
+
+        Args:
+            folder: Where submitted batches and their output are kept
+            respond: Answers one request body (defaults to the benchmark stub)
+            polls_until_complete: status() calls that report in_progress
+        """
+        if respond is None:
+            from benchmarks.stub_llm import stub_batch_response
+            respond = stub_batch_response
+        self.folder = folder
+        self.respond = respond
+        self.polls_until_complete = polls_until_complete
+        os.makedirs(folder, exist_ok=True)
+
+    def _meta_path(self, batch_id: str) -> str:
+        return os.path.join(self.folder, f'{batch_id}.json')
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f'batch_local_{uuid.uuid4().hex[:12]}'
+        shutil.copyfile(input_path, os.path.join(self.folder, f'{batch_id}.input.jsonl'))
+        with open(self._meta_path(batch_id), 'w') as f:
+            json.dump({'polls_left': self.polls_until_complete, 'input_file': os.path.basename(input_path)}, f)
+        return batch_id
+
+    def find(self, input_path: str) -> Optional[str]:
+        for name in os.listdir(self.folder):
+            if name.startswith('batch_local_') and name.endswith('.json'):
+                with open(os.path.join(self.folder, name)) as f:
+                    if json.load(f).get('input_file') == os.path.basename(input_path):
+                        return name[:-len('.json')]
+        return None
+
+    def status(self, batch_id: str) -> str:
+        with open(self._meta_path(batch_id)) as f:
+            meta = json.load(f)
+        if meta['polls_left'] > 0:
+            meta['polls_left'] -= 1
+            with open(self._meta_path(batch_id), 'w') as f:
+                json.dump(meta, f)
+            return IN_PROGRESS
+        return COMPLETED
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        lines = []
+        with open(os.path.join(self.folder, f'{batch_id}.input.jsonl')) as f:
+            for raw_line in f:
+                request = json.loads(raw_line)
+                try:
+                    answer, usage = self.respond(request['body'])
+                except Exception as e:
+                    lines.append({'id': f'req_{uuid.uuid4().hex[:12]}', 'custom_id': request['custom_id'],
+                                  'response': None, 'error': {'code': 'local_error', 'message': str(e)}})
+                    continue
+                lines.append({
+                    'id': f'req_{uuid.uuid4().hex[:12]}',
+                    'custom_id': request['custom_id'],
+                    'response': {
+                        'status_code': 200,
+                        'body': {
+                            'model': request['body']['model'],
+                            'choices': [{'index': 0, 'finish_reason': 'stop',
+                                         'message': {'role': 'assistant', 'content': json.dumps(answer)}}],
+                            'usage': usage,
+                        },
+                    },
+                    'error': None,
+                })
+        return lines
+
+
+BATCH_PROVIDERS = {
+    'openai': OpenAIBatchProvider,
+    'local': LocalBatchProvider,
+}
+
+
+def get_batch_provider(name: Optional[str] = None, **kwargs) -> BatchProvider:
+    """
+    Build a batch provider by name
+
+    Args:
+        name: 'openai' or 'local' (defaults to the batch config)
+        **kwargs: Provider constructor arguments
+
+    Returns:
+        BatchProvider
+    """
+    settings = get_batch_config()
+    name = name or settings['provider']
+    if name not in BATCH_PROVIDERS:
+        raise ValueError(f"Unknown batch provider '{name}' (choose from {', '.join(BATCH_PROVIDERS)})")
+    if name == 'openai':
+        kwargs.setdefault('completion_window', settings['completion_window'])
+    elif name == 'local':
+        kwargs.setdefault('folder', os.path.join(settings['work_folder'], 'local'))
+    return BATCH_PROVIDERS[name](**kwargs)
+
+
+def _parse_answer(line: Dict[str, Any], field: str) -> Tuple[Optional[str], Dict[str, int], Optional[str]]:
+    """(value, usage, error) of one output line"""
+    response = line.get('response') or {}
+    if line.get('error') or response.get('status_code') != 200:
+        error = line.get('error') or (response.get('body') or {}).get('error') or {}
+        return None, {}, error.get('message') or f"status {response.get('status_code')}"
+    body = response['body']
+    usage = body.get('usage') or {}
+    try:
+        answer = json.loads(body['choices'][0]['message']['content'])
+        return str(answer.get(field) or ''), usage, None
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return None, usage, f"Unparseable answer: {e}"
+
+
+class BatchExtractionJob:
+    """Resumable bulk extraction of a document backlog through batch submission"""
+
+    def __init__(self, provider: BatchProvider, db_path: Optional[str] = None,
+                 work_folder: Optional[str] = None, max_requests_per_file: Optional[int] = None,
+                 max_file_bytes: Optional[int] = None):
+        """
+        Open (and create if needed) the job store
+
+        Args:
+            provider: Where batches are submitted
+            db_path: SQLite file holding item and batch state (defaults to the batch config)
+            work_folder: Where input JSONL files are written (defaults to the batch config)
+            max_requests_per_file: Requests per batch file
+            max_file_bytes: Size limit of a batch file
+        """
+        settings = get_batch_config()
+        self.provider = provider
+        self.db_path = db_path or settings['db_path']
+        self.work_folder = work_folder or settings['work_folder']
+        self.max_requests_per_file = max_requests_per_file or settings['max_requests_per_file']
+        self.max_file_bytes = max_file_bytes or settings['max_file_bytes']
+        self.discount = settings['price_discount']
+
+        if self.work_folder:
+            os.makedirs(self.work_folder, exist_ok=True)
+        self.connection = connect(self.db_path, _SCHEMA)
+
+    def _set(self, item_id: str, **values):
+        values['updated_at'] = datetime.now().isoformat()
+        columns = ', '.join(f'{column} = ?' for column in values)
+        with self.connection:
+            self.connection.execute(f'UPDATE batch_items SET {columns} WHERE id = ?', [*values.values(), item_id])
+
+    def discover(self, folder: str) -> int:
+        """
+        Register the PDFs in a folder (recursively)
+
+        Known documents keep their state unless their content changed.
+
+        Args:
+            folder: Folder to scan
+
+        Returns:
+            Number of new or changed documents
+        """
+        added = 0
+        for root, _, files in os.walk(folder):
+            for filename in sorted(files):
+                if not filename.lower().endswith('.pdf'):
+                    continue
+                path = os.path.normpath(os.path.join(root, filename))
+                content_hash = file_content_hash(path)
+                row = self.connection.execute(
+                    'SELECT id, content_hash FROM batch_items WHERE path = ?', (path,)
+                ).fetchone()
+                if row and row['content_hash'] == content_hash:
+                    continue
+                item_id = hashlib.sha1(f'{os.path.abspath(path)}#{content_hash}'.encode()).hexdigest()[:20]
+                with self.connection:
+                    if row:
+                        self.connection.execute('DELETE FROM batch_items WHERE id = ?', (row['id'],))
+                    self.connection.execute(
+                        'INSERT INTO batch_items (id, path, content_hash, state, updated_at) VALUES (?, ?, ?, ?, ?)',
+                        (item_id, path, content_hash, PENDING, datetime.now().isoformat())
+                    )
+                added += 1
+        return added
+
+    def prepare(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        Read pending documents (triage, text extraction, near-duplicate lookup)
+
+        Near-duplicates of already extracted documents are finished here
+        without a model call.
+
+        Args:
+            limit: Maximum documents to read in this call
+
+        Returns:
+            Counts of documents made ready, skipped and resolved as duplicates
+        """
+        from orchestrator.langgraph_orchestrator import check_duplicate, read_attachment, triage
+        from utils.pdf_triage import EXTRACT
+
+        counts = {'ready': 0, 'skipped': 0, 'duplicates': 0}
+        query = 'SELECT id, path FROM batch_items WHERE state = ? ORDER BY path'
+        rows = self.connection.execute(query + (f' LIMIT {int(limit)}' if limit else ''), (PENDING,)).fetchall()
+        for row in rows:
+            state: Dict[str, Any] = {'attachment': os.path.basename(row['path']),
+                                     'data_folder': os.path.dirname(row['path'])}
+            state.update(triage(state))
+            if state['triage']['decision'] != EXTRACT:
+                self._set(row['id'], state=SKIPPED, error=state['triage']['reason'])
+                counts['skipped'] += 1
+                continue
+            state.update(read_attachment(state))
+            if not state['attachment']:
+                self._set(row['id'], state=SKIPPED, error=state['triage']['reason'])
+                counts['skipped'] += 1
+                continue
+
+            text = state['attachment']
+            state.update(check_duplicate(state))
+            if state.get('duplicate_of'):
+                self._merge_fields(row['id'], row['path'], text, state['invoice_number'], state['order_number'])
+                counts['duplicates'] += 1
+                continue
+            self._set(row['id'], state=READY, text=zlib.compress(text.encode('utf-8')), error=None)
+            counts['ready'] += 1
+        return counts
+
+    def _batch_lines(self, rows: Iterable[sqlite3.Row], model: str) -> Iterable[Tuple[str, List[str], str]]:
+        """Yield (item id, JSONL lines, prompt version) for ready items"""
+        from orchestrator.langgraph_orchestrator import GetInvvoice, GetOrderNumber
+        from prompt.prompt_library import build_extraction_prompt
+
+        schemas = {'invoice': GetInvvoice, 'order': GetOrderNumber}
+        for row in rows:
+            text = zlib.decompress(row['text']).decode('utf-8')
+            lines = []
+            for call, _ in _CALLS:
+                prompt = build_extraction_prompt(call, text, model=model)
+                request = batch_request(f"{row['id']}-{call}", prompt['messages'], schemas[call], model)
+                lines.append(json.dumps(request, ensure_ascii=False))
+            yield row['id'], lines, prompt['version']
+
+    def submit(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Write ready items to batch files and submit them
+
+        Args:
+            limit: Maximum documents to submit in this call
+
+        Returns:
+            IDs of the submitted batches
+        """
+        batch_ids = self._resume_submissions()
+        model = get_llm_config()['model']
+        query = 'SELECT id, text FROM batch_items WHERE state = ? ORDER BY path'
+        rows = self.connection.execute(query + (f' LIMIT {int(limit)}' if limit else ''), (READY,)).fetchall()
+
+        chunk: List[Tuple[str, List[str], str]] = []
+        chunk_bytes = 0
+        for item_id, lines, version in self._batch_lines(rows, model):
+            size = sum(len(line.encode('utf-8')) + 1 for line in lines)
+            if chunk and (chunk_bytes + size > self.max_file_bytes
+                          or (len(chunk) + 1) * len(_CALLS) > self.max_requests_per_file):
+                batch_ids.append(self._submit_chunk(chunk))
+                chunk, chunk_bytes = [], 0
+            chunk.append((item_id, lines, version))
+            chunk_bytes += size
+        if chunk:
+            batch_ids.append(self._submit_chunk(chunk))
+        return batch_ids
+
+    def _submit_chunk(self, chunk: List[Tuple[str, List[str], str]]) -> str:
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        input_path = os.path.join(self.work_folder, f'batch_{stamp}_{uuid.uuid4().hex[:6]}.jsonl')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for _, lines, _ in chunk:
+                f.write('\n'.join(lines) + '\n')
+
+        # Recorded before it is sent: if the process dies during submit(), the
+        # next run finds the batch at the provider instead of paying for it twice
+        submission_id = f'submitting_{uuid.uuid4().hex[:12]}'
+        now = datetime.now().isoformat()
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO batches (id, provider, input_file, status, request_count, submitted_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (submission_id, self.provider.name, input_path, SUBMITTING, len(chunk) * len(_CALLS), now)
+            )
+            self.connection.executemany(
+                'UPDATE batch_items SET state = ?, batch_id = ?, prompt_version = ?, updated_at = ? WHERE id = ?',
+                [(SUBMITTING, submission_id, version, now, item_id) for item_id, _, version in chunk]
+            )
+        return self._confirm_submission(submission_id, input_path, self.provider.submit(input_path))
+
+    def _confirm_submission(self, submission_id: str, input_path: str, batch_id: str) -> str:
+        """Replace a recorded submission with the provider's batch"""
+        now = datetime.now().isoformat()
+        with self.connection:
+            self.connection.execute(
+                'UPDATE batches SET id = ?, status = ?, submitted_at = ? WHERE id = ?',
+                (batch_id, IN_PROGRESS, now, submission_id)
+            )
+            cursor = self.connection.execute(
+                'UPDATE batch_items SET state = ?, batch_id = ?, updated_at = ? WHERE batch_id = ?',
+                (SUBMITTED, batch_id, now, submission_id)
+            )
+        logger.info("Submitted batch %s with %d documents (%s)", batch_id, cursor.rowcount, input_path)
+        return batch_id
+
+    def _resume_submissions(self) -> List[str]:
+        """
+        Settle submissions interrupted before the provider's batch ID was stored
+
+        A batch the provider already started from the input file is adopted;
+        otherwise the same file is submitted now. Items whose batch file is
+        gone go back to ready.
+
+        Returns:
+            IDs of the adopted or submitted batches
+        """
+        batch_ids = []
+        rows = self.connection.execute(
+            'SELECT id, input_file FROM batches WHERE status = ?', (SUBMITTING,)
+        ).fetchall()
+        for row in rows:
+            if not os.path.exists(row['input_file']):
+                with self.connection:
+                    self.connection.execute(
+                        'UPDATE batch_items SET state = ?, batch_id = NULL, updated_at = ? WHERE batch_id = ?',
+                        (READY, datetime.now().isoformat(), row['id'])
+                    )
+                    self.connection.execute('DELETE FROM batches WHERE id = ?', (row['id'],))
+                continue
+            batch_id = self.provider.find(row['input_file'])
+            if batch_id:
+                logger.info("Found batch %s for interrupted submission of %s", batch_id, row['input_file'])
+            else:
+                batch_id = self.provider.submit(row['input_file'])
+            batch_ids.append(self._confirm_submission(row['id'], row['input_file'], batch_id))
+        return batch_ids
+
+    def poll(self) -> Dict[str, str]:
+        """
+        Check unfinished batches and merge the results of finished ones
+
+        Items of a batch that failed or expired without an answer go back
+        to ready, so the next submit() retries them.
+
+        Returns:
+            {batch ID: status} of the batches checked
+        """
+        statuses = {}
+        self._resume_submissions()
+        pending = self.connection.execute('SELECT id FROM batches WHERE status = ?', (IN_PROGRESS,)).fetchall()
+        for row in pending:
+            batch_id = row['id']
+            status = self.provider.status(batch_id)
+            statuses[batch_id] = status
+            if status == IN_PROGRESS:
+                continue
+
+            lines = self.provider.results(batch_id) if status in ('completed', 'expired', 'cancelled') else []
+            self._merge_results(lines)
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE batch_items SET state = ?, batch_id = NULL, updated_at = ? WHERE batch_id = ? AND state = ?',
+                    (READY, datetime.now().isoformat(), batch_id, SUBMITTED)
+                )
+                self.connection.execute(
+                    'UPDATE batches SET status = ?, finished_at = ? WHERE id = ?',
+                    (status, datetime.now().isoformat(), batch_id)
+                )
+            logger.info("Batch %s %s", batch_id, status)
+        return statuses
+
+    def _merge_results(self, lines: List[Dict[str, Any]]):
+        """Apply the answers of a finished batch to its items"""
+        answers: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for line in lines:
+            item_id, _, call = line.get('custom_id', '').rpartition('-')
+            answers.setdefault(item_id, {})[call] = line
+
+        fields = dict(_CALLS)
+        for item_id, calls in answers.items():
+            row = self.connection.execute(
+                'SELECT path, text, state FROM batch_items WHERE id = ?', (item_id,)
+            ).fetchone()
+            if row is None or row['state'] != SUBMITTED:
+                continue
+
+            values: Dict[str, str] = {}
+            errors = []
+            input_tokens = output_tokens = 0
+            for call, field in fields.items():
+                if call not in calls:
+                    errors.append(f'{call}: no answer')
+                    continue
+                value, usage, error = _parse_answer(calls[call], field)
+                input_tokens += usage.get('prompt_tokens', 0)
+                output_tokens += usage.get('completion_tokens', 0)
+                if error:
+                    errors.append(f'{call}: {error}')
+                else:
+                    values[field] = value
+
+            if errors:
+                self._set(item_id, state=FAILED, error='; '.join(errors),
+                          input_tokens=input_tokens, output_tokens=output_tokens)
+                continue
+            text = zlib.decompress(row['text']).decode('utf-8')
+            self._merge_fields(item_id, row['path'], text, values['invoice_number'], values['order_number'],
+                               input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def _merge_fields(self, item_id: str, path: str, text: str, invoice_number: str, order_number: str,
+                      **usage):
+        """Store an item's fields in the search index and near-duplicate index"""
+        from utils.near_duplicates import get_duplicate_index
+        from utils.search_index import get_search_index
+
+        get_search_index().record_extraction(path, invoice_number, order_number, text=text, source='batch')
+        duplicate_index = get_duplicate_index()
+        signature = duplicate_index.signature(text) if duplicate_index.enabled else None
+        if signature is not None:
+            duplicate_index.add(path, signature, invoice_number, order_number)
+        # The text has served its purpose; don't keep a second copy of the backlog
+        self._set(item_id, state=DONE, invoice_number=invoice_number, order_number=order_number,
+                  text=None, error=None, **usage)
+
+    def retry_failed(self) -> int:
+        """Send failed items back to ready; returns how many"""
+        with self.connection:
+            cursor = self.connection.execute(
+                'UPDATE batch_items SET state = ?, batch_id = NULL, updated_at = ? WHERE state = ?',
+                (READY, datetime.now().isoformat(), FAILED)
+            )
+        return cursor.rowcount
+
+    def status(self) -> Dict[str, Any]:
+        """Item counts by state, batch statuses and token usage"""
+        from orchestrator.model_gateway import ModelGateway
+
+        counts = {state: 0 for state in ITEM_STATES}
+        for row in self.connection.execute('SELECT state, COUNT(*) AS n FROM batch_items GROUP BY state'):
+            counts[row['state']] = row['n']
+        tokens = self.connection.execute(
+            'SELECT COALESCE(SUM(input_tokens), 0) AS input, COALESCE(SUM(output_tokens), 0) AS output FROM batch_items'
+        ).fetchone()
+        batches = [dict(row) for row in self.connection.execute('SELECT * FROM batches ORDER BY submitted_at')]
+        cost = ModelGateway.from_config().cost(tokens['input'], tokens['output']) * self.discount
+        return {
+            'items': counts,
+            'batches': batches,
+            'tokens': {'input': tokens['input'], 'output': tokens['output']},
+            'cost_usd': round(cost, 6),
+        }
+
+    def run(self, folder: Optional[str] = None, wait: bool = False,
+            poll_interval: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Discover, read, submit and poll; safe to re-run after an interruption
+
+        Args:
+            folder: Folder to scan for new documents (None: only continue)
+            wait: Keep polling until no batch is in progress
+            poll_interval: Seconds between polls (defaults to the batch config)
+
+        Returns:
+            status() after the run
+        """
+        poll_interval = poll_interval if poll_interval is not None else get_batch_config()['poll_interval_seconds']
+        if folder:
+            logger.info("Found %d new or changed documents in %s", self.discover(folder), folder)
+        logger.info("Prepared: %s", self.prepare())
+        self.poll()
+        self.submit()
+        while True:
+            statuses = self.poll()
+            if not wait or IN_PROGRESS not in statuses.values():
+                break
+            time.sleep(poll_interval)
+        return self.status()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Bulk extraction of a document backlog through batch submission')
+    parser.add_argument('--provider', choices=sorted(BATCH_PROVIDERS), help='Batch provider (default: config)')
+    parser.add_argument('--db', help='Job state database (default: config)')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    run_parser = subcommands.add_parser('run', help='Discover, read, submit and poll')
+    run_parser.add_argument('folder', nargs='?', help='Folder of PDFs to add to the backlog')
+    run_parser.add_argument('--wait', action='store_true', help='Poll until every batch has finished')
+    run_parser.add_argument('--poll-interval', type=float, help='Seconds between polls')
+    poll_parser = subcommands.add_parser('poll', help='Check batches and merge finished ones')
+    poll_parser.add_argument('--wait', action='store_true', help='Poll until every batch has finished')
+    poll_parser.add_argument('--poll-interval', type=float, help='Seconds between polls')
+    subcommands.add_parser('retry', help='Resubmit failed items on the next run')
+    subcommands.add_parser('status', help='Show item and batch state')
+    args = parser.parse_args(argv)
+
+    configure_logging(json_output=False)
+    job = BatchExtractionJob(get_batch_provider(args.provider or get_batch_config()['provider']), db_path=args.db)
+
+    if args.command == 'run':
+        result = job.run(args.folder, wait=args.wait, poll_interval=args.poll_interval)
+    elif args.command == 'poll':
+        interval = args.poll_interval if args.poll_interval is not None else get_batch_config()['poll_interval_seconds']
+        while IN_PROGRESS in job.poll().values() and args.wait:
+            time.sleep(interval)
+        result = job.status()
+    elif args.command == 'retry':
+        print(f"{job.retry_failed()} failed item(s) will be resubmitted")
+        result = job.status()
+    else:
+        result = job.status()
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+__all__ = [
+    'BATCH_PROVIDERS',
+    'BatchExtractionJob',
+    'BatchProvider',
+    'LocalBatchProvider',
+    'OpenAIBatchProvider',
+    'batch_request',
+    'get_batch_provider'
+]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
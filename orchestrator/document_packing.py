@@ -0,0 +1,221 @@
+"""
+Mars AI Agents - Document Packing
+Extracts several short documents with one structured-output call. Each
+document's graph run pauses before get_details; packed answers are checked
+against their documents and written back as that node's result, and any
+document whose answer can't be trusted falls back to its own calls.
+"""
+
+import logging
+import re
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import get_packing_config, get_workflow_config
+from orchestrator import langgraph_orchestrator as graph_module
+from orchestrator.model_gateway import count_tokens, empty_usage
+from prompt.prompt_library import build_packed_prompt, get_prompt_template
+from utils.metrics import Counter
+from utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+PACKED_DOCUMENTS = Counter(
+    'mars_packed_documents',
+    'Documents sent in packed model calls, by outcome',
+    ['result']
+)
+
+# Answers that mean "absent" rather than a value to look for in the text
+_ABSENT_VALUES = {'', 'NOTFOUND', 'NONE', 'NULL', 'N/A'}
+
+
+# Shorter values (e.g. "1") occur in almost any document, so they prove nothing
+_MIN_VALUE_CHARS = 3
+
+
+def _compact(value: str) -> str:
+    return re.sub(r'\s+', '', value or '').upper()
+
+
+def _occurs_in(value: str, text: str) -> bool:
+    """Whether a value appears in the text as a whole token (whitespace inside it ignored)"""
+    compact = _compact(value)
+    if len(compact) < _MIN_VALUE_CHARS:
+        return False
+    pattern = r'\s*'.join(re.escape(char) for char in compact)
+    return re.search(rf'(?<![A-Z0-9]){pattern}(?![A-Z0-9])', text, re.IGNORECASE) is not None
+
+
+def plan_packs(documents: Sequence[Tuple[str, int]], max_documents: int = 8, max_input_tokens: int = 6000,
+               max_document_tokens: int = 1500, overhead_tokens: int = 0) -> Tuple[List[List[str]], List[str]]:
+    """
+    Group documents into packs, in order, within the limits
+
+    Args:
+        documents: (key, token count) pairs
+        max_documents: Documents per pack
+        max_input_tokens: Prompt budget of a pack
+        max_document_tokens: Larger documents are never packed
+        overhead_tokens: Instruction tokens every pack pays once
+
+    Returns:
+        (packs of two or more keys, keys to extract on their own)
+    """
+    packs: List[List[str]] = []
+    singles: List[str] = []
+    current: List[str] = []
+    used = overhead_tokens
+    for key, tokens in documents:
+        # Tags and separators around each document
+        tokens += 12
+        if tokens > max_document_tokens:
+            singles.append(key)
+            continue
+        if current and (len(current) >= max_documents or used + tokens > max_input_tokens):
+            packs.append(current)
+            current, used = [], overhead_tokens
+        current.append(key)
+        used += tokens
+    if current:
+        packs.append(current)
+
+    # A pack of one saves nothing
+    singles.extend(pack[0] for pack in packs if len(pack) == 1)
+    return [pack for pack in packs if len(pack) > 1], singles
+
+
+def check_answers(texts: Dict[str, str], answers: Sequence[Any]) -> Dict[str, Dict[str, str]]:
+    """
+    Map packed answers back to their documents, keeping only trustworthy ones
+
+    An answer is accepted when its document ID is known and unique, at least
+    one field has a value, and each value (other than "Not Found") occurs in
+    that document's text as a whole token of three or more characters. That
+    catches values attributed to the wrong document; an answer with nothing
+    found is usually one the model dropped, so it falls back as well.
+
+    Args:
+        texts: Document ID -> document text
+        answers: PackedDocumentFields returned by the model
+
+    Returns:
+        Document ID -> {'invoice_number', 'order_number'} for accepted answers
+    """
+    by_id: Dict[str, List[Any]] = {}
+    for answer in answers:
+        by_id.setdefault(answer.document_id.strip(), []).append(answer)
+
+    accepted = {}
+    for document_id, text in texts.items():
+        matches = by_id.get(document_id, [])
+        if len(matches) != 1:
+            continue
+        answer = matches[0]
+        values = {'invoice_number': answer.invoice_number, 'order_number': answer.order_number}
+        present = [value for value in values.values() if _compact(value) not in _ABSENT_VALUES]
+        if present and all(_occurs_in(value, text) for value in present):
+            accepted[document_id] = values
+    return accepted
+
+
+def _extract_pack(pack: List[Tuple[str, Dict[str, Any]]], packed_ids: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    """Run one packed call; returns accepted answers keyed by document path"""
+    texts = {packed_ids[path]: state['attachment'] for path, state in pack}
+    prompt = build_packed_prompt(list(texts.items()))
+    # Tokens are charged to each document in proportion to its length
+    charge_to = {state.get('document_path') or path: count_tokens(state['attachment']) for path, state in pack}
+    try:
+        result = graph_module.gateway.invoke_structured(
+            graph_module.packed_model_pdf, 'packed', prompt['messages'],
+            prompt_version=prompt['version'], charge_to=charge_to
+        )
+    except Exception as e:
+        logger.warning("Packed call for %d documents failed (%s), extracting them one by one", len(pack), e)
+        return {}
+
+    accepted = check_answers(texts, result.documents)
+    by_id = {document_id: path for path, document_id in packed_ids.items()}
+    return {by_id[document_id]: fields for document_id, fields in accepted.items()}
+
+
+@traced('workflow.run_documents')
+def run_documents(document_paths: Sequence[str], force: bool = False,
+                  pack: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """
+    Extract several documents, packing short ones into shared model calls
+
+    Each document still has its own checkpointed graph run: runs are paused
+    before get_details, packed answers are stored as get_details' result,
+    and the rest of the graph (record_signature, record_template) runs as
+    usual. Documents that are too long, or whose packed answer fails the
+    checks, go through get_details on their own; documents read from a
+    layout template never reach get_details.
+
+    Args:
+        document_paths: Documents to extract
+        force: Start every run over even if one exists
+        pack: Override the packing config's enabled flag
+
+    Returns:
+        Final workflow states, in the order of document_paths
+    """
+    settings = get_packing_config()
+    if not (settings['enabled'] if pack is None else pack):
+        return [graph_module.run_document(path, force) for path in document_paths]
+
+    durability = get_workflow_config()['durability']
+    paths = list(dict.fromkeys(document_paths))
+    thread_ids = {path: graph_module.document_thread_id(path) for path in paths}
+    configs = {path: {'configurable': {'thread_id': thread_ids[path]}} for path in paths}
+    results: Dict[str, Dict[str, Any]] = {}
+
+    # Locks in a fixed order, so two overlapping calls can't deadlock
+    with ExitStack() as locks:
+        for thread_id in sorted(set(thread_ids.values())):
+            locks.enter_context(graph_module.document_lock(thread_id))
+
+        waiting: Dict[str, Dict[str, Any]] = {}
+        for path in paths:
+            state = graph_module.advance_document(path, thread_ids[path], force, interrupt_before=['get_details'])
+            if graph_module.workflow.get_state(configs[path]).next == ('get_details',):
+                waiting[path] = state
+            else:
+                results[path] = state
+
+        overhead = count_tokens(get_prompt_template('packed').static_text)
+        packs, singles = plan_packs(
+            [(path, count_tokens(state['attachment'])) for path, state in waiting.items()],
+            settings['max_documents'], settings['max_input_tokens'], settings['max_document_tokens'], overhead
+        )
+
+        for keys in packs:
+            members = [(path, waiting[path]) for path in keys]
+            packed_ids = {path: f'D{index + 1}' for index, path in enumerate(keys)}
+            with graph_module.gateway.track_usage() as usage:
+                accepted = _extract_pack(members, packed_ids)
+            for path, state in members:
+                fields = accepted.get(path)
+                if fields is None:
+                    PACKED_DOCUMENTS.labels(result='fallback').inc()
+                    singles.append(path)
+                    continue
+                PACKED_DOCUMENTS.labels(result='accepted').inc()
+                graph_module.workflow.update_state(configs[path], {
+                    **fields,
+                    'token_usage': usage.get(state.get('document_path') or path) or empty_usage(),
+                    'prompt': {'version': get_prompt_template('packed').version, 'packed_with': len(keys)}
+                }, as_node='get_details')
+                results[path] = graph_module.workflow.invoke(None, configs[path], durability=durability)
+
+        for path in singles:
+            results[path] = graph_module.workflow.invoke(None, configs[path], durability=durability)
+
+    return [results[path] for path in document_paths]
+
+
+__all__ = [
+    'check_answers',
+    'plan_packs',
+    'run_documents'
+]
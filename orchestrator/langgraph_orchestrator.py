@@ -1,32 +1,89 @@
-from langgraph.graph import StateGraph,START,END
-from typing import Annotated,List,TypedDict
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING,Annotated,Any,Callable,Dict,Iterator,List,Optional,TypedDict
 from pydantic import BaseModel,Field
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from prompt.prompt_library import Promptlibrary
+from prompt.prompt_library import active_prompt_version, build_extraction_prompt
+from orchestrator.model_gateway import ModelGateway, empty_usage
+from utils.metrics import CACHE_REQUESTS, STAGE_SECONDS
+from utils.layout_templates import get_template_store
+from utils.near_duplicates import get_duplicate_index
+from utils.pdf_triage import EXTRACT, REJECT, get_triage_log, triage_document
+from config import get_triage_config, get_workflow_config
+from utils.file_utils import file_content_hash
+from utils.search_index import get_search_index
+from utils.tracing import traced
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.sqlite import SqliteSaver
 
 load_dotenv()
 
+# Marks the end of the graph; same value as langgraph.graph.END, which is
+# only imported when the graph is built
+END = "__end__"
+
+logger = logging.getLogger(__name__)
+
 class GetInvvoice(BaseModel):
     invoice_number:Annotated[str,Field(description="Extract the invoice number from the given details")]
 
 class GetOrderNumber(BaseModel):
     order_number:Annotated[str,Field(description="Extract the order number from the given details")]
 
-llm = ChatOpenAI(model='gpt-4o-mini')
-invoice_model_pdf = llm.with_structured_output(GetInvvoice)
-order_model_pdf = llm.with_structured_output(GetOrderNumber)
+class PackedDocumentFields(BaseModel):
+    document_id:Annotated[str,Field(description="ID of the document exactly as given in its <document id=...> tag")]
+    invoice_number:Annotated[str,Field(description="Invoice number of this document")]
+    order_number:Annotated[str,Field(description="Order number of this document")]
+
+class PackedExtraction(BaseModel):
+    documents:Annotated[List[PackedDocumentFields],Field(description="One entry per document, in the order given")]
+
+# All model calls go through the gateway (budgets, retries, token ledger)
+gateway = ModelGateway.from_config()
 
 from typing_extensions import TypedDict
 
 class AgenticState(TypedDict):
     attachment: str
     data_folder: str
+    document_path: str
     invoice_number: str
     order_number: str
+    token_usage: dict
+    signature: tuple
+    duplicate_of: str
+    similarity: float
+    triage: dict
+    prompt: dict
+    template: dict
+    force: bool
+
+# Nodes return only the keys they change: each update is what gets
+# checkpointed, so the (possibly large) document text is stored once
+
+@traced('node.triage')
+def triage(state: AgenticState) -> AgenticState:
+    """Classify the document's pages and decide whether it can be extracted"""
+    document_path = os.path.join(state['data_folder'], state['attachment'])
+    settings = get_triage_config()
+    with STAGE_SECONDS.labels(stage='triage').time():
+        decision = triage_document(document_path, settings['min_chars_per_page'], settings['max_pages'])
+    
+    if decision['decision'] != EXTRACT:
+        # Extractable documents are recorded once read_attachment confirms there is text
+        get_triage_log().record(document_path, decision)
+        logger.info("Triage routed %s to %s (%s)", document_path, decision['decision'], decision['reason'])
+    return {'document_path': document_path, 'triage': decision}
 
+def route_after_triage(state: AgenticState) -> str:
+    return "read_attachment" if state['triage']['decision'] == EXTRACT else END
+
+@traced('node.read_attachment')
 def read_attachment(state: AgenticState) -> AgenticState:
-    import os
     import PyPDF2
     
     def read_pdf(file_path):
@@ -39,34 +96,366 @@ def read_attachment(state: AgenticState) -> AgenticState:
                     text += page.extract_text() + "\n"
                 return text.strip()
         except Exception as e:
-            print(f"Error reading PDF {file_path}: {e}")
+            logger.error("Error reading PDF %s: %s", file_path, e)
+            return ""
+
+    def read_pdf_pymupdf(file_path):
+        """Fallback for PDFs PyPDF2 can't read (triage already opened them with PyMuPDF)"""
+        import pymupdf
+        try:
+            with pymupdf.open(file_path) as doc:
+                return "\n".join(page.get_text('text') for page in doc).strip()
+        except Exception as e:
+            logger.error("Error reading PDF %s with PyMuPDF: %s", file_path, e)
             return ""
 
     attachment_path = os.path.join(state['data_folder'], state['attachment'])
-    pdf_text = read_pdf(attachment_path)
+    with STAGE_SECONDS.labels(stage='pdf_extract').time():
+        pdf_text = read_pdf(attachment_path) or read_pdf_pymupdf(attachment_path)
+    
+    decision = dict(state.get('triage') or {'decision': EXTRACT, 'reason': 'text'})
+    if not pdf_text:
+        decision.update(decision=REJECT, reason='no_extractable_text')
+        logger.info("No text could be extracted from %s, skipping the model", attachment_path)
+    get_triage_log().record(attachment_path, decision)
+    
+    return {
+        'document_path': attachment_path,
+        'attachment': pdf_text,
+        'triage': decision
+    }
+
+def route_after_read(state: AgenticState) -> str:
+    return "check_duplicate" if state['attachment'] else END
+
+@traced('node.check_duplicate')
+def check_duplicate(state: AgenticState) -> AgenticState:
+    """Reuse the extraction of an earlier near-identical document, if any"""
+    index = get_duplicate_index()
+    if not index.enabled or not state.get('attachment'):
+        return {}
     
+    with STAGE_SECONDS.labels(stage='minhash').time():
+        signature = index.signature(state['attachment'])
+    if signature is None:
+        return {}
+    
+    match = index.find_duplicate(signature, state['attachment'], exclude_path=state.get('document_path'))
+    if match is None:
+        CACHE_REQUESTS.labels(cache='near_duplicate', result='miss').inc()
+        return {'signature': signature}
+    
+    CACHE_REQUESTS.labels(cache='near_duplicate', result='hit').inc()
+    logger.info("%s is a likely duplicate of %s (similarity %.2f), reusing its extraction",
+                state.get('document_path'), match['path'], match['similarity'])
     return {
-        **state,
-        'attachment': pdf_text
+        'invoice_number': match['invoice_number'],
+        'order_number': match['order_number'],
+        'duplicate_of': match['path'],
+        'similarity': match['similarity'],
+        'token_usage': {}
     }
 
+def route_after_check(state: AgenticState) -> str:
+    return END if state.get('duplicate_of') else "apply_template"
+
+@traced('node.apply_template')
+def apply_template(state: AgenticState) -> AgenticState:
+    """Read the fields from a learned layout of the document's vendor, if one validates"""
+    store = get_template_store()
+    # A forced re-extraction asks the model again rather than repeating a template's answer
+    if not store.enabled or not state.get('document_path') or state.get('force'):
+        return {}
+    
+    with STAGE_SECONDS.labels(stage='template').time():
+        match = store.extract(state['document_path'], state.get('attachment'))
+    if match is None:
+        CACHE_REQUESTS.labels(cache='layout_template', result='miss').inc()
+        return {}
+    
+    CACHE_REQUESTS.labels(cache='layout_template', result='hit').inc()
+    logger.info("Read %s from layout template %d of its vendor", state['document_path'], match['template_id'])
+    return {
+        'invoice_number': match['invoice_number'],
+        'order_number': match['order_number'],
+        'template': {'id': match['template_id'], 'fingerprint': match['fingerprint']},
+        'token_usage': {}
+    }
+
+def route_after_template(state: AgenticState) -> str:
+    return "record_signature" if state.get('template') else "get_details"
+
+@traced('node.get_details')
 def get_details(state: AgenticState) -> AgenticState:
-    invoice_details = invoice_model_pdf.invoke(state['attachment'])
-    order_details = order_model_pdf.invoke(state['attachment'])
+    document_id = state.get('document_path')
+    invoice_prompt = build_extraction_prompt('invoice', state['attachment'], model=gateway.model_name)
+    order_prompt = build_extraction_prompt('order', state['attachment'], model=gateway.model_name)
+    if invoice_prompt['truncated']:
+        logger.info("Truncated %s from %d tokens to fit the prompt budget",
+                    document_id, invoice_prompt['document_tokens'])
+    
+    # Usage of this run only; the gateway's ledger also counts earlier runs
+    with gateway.track_usage() as usage:
+        invoice_details = gateway.invoke_structured(_lazy('invoice_model_pdf'), 'invoice', invoice_prompt['messages'],
+                                                    document_id, invoice_prompt['version'])
+        order_details = gateway.invoke_structured(_lazy('order_model_pdf'), 'order', order_prompt['messages'],
+                                                  document_id, order_prompt['version'])
     
     return {
-        **state,
         'invoice_number': invoice_details.invoice_number,
-        'order_number': order_details.order_number
+        'order_number': order_details.order_number,
+        'token_usage': (usage.get(document_id) or empty_usage()) if document_id else {},
+        'prompt': {
+            'version': invoice_prompt['version'],
+            'truncated': invoice_prompt['truncated'],
+            'document_tokens': invoice_prompt['document_tokens']
+        }
     }
+
+def record_signature(state: AgenticState) -> AgenticState:
+    """Remember this document's signature and fields for later duplicates"""
+    if state.get('signature') and state.get('document_path'):
+        get_duplicate_index().add(state['document_path'], state['signature'],
+                                  state.get('invoice_number', ''), state.get('order_number', ''))
+    return {}
+
+def record_template(state: AgenticState) -> AgenticState:
+    """Learn the vendor's layout from the model's answer, for its next invoices"""
+    store = get_template_store()
+    document_path = state.get('document_path')
+    if not store.enabled or not document_path or state.get('template'):
+        return {}
+    indexed = get_search_index().get_document(document_path) or {}
+    store.learn(document_path, state.get('invoice_number', ''), state.get('order_number', ''),
+                sender=indexed.get('sender', ''), text=state.get('attachment'))
+    return {}
+    
+def _build_graph():
+    from langgraph.graph import StateGraph,START
+    
+    graph = StateGraph(AgenticState)
+    
+    graph.add_node("triage",triage)
+    graph.add_node("read_attachment",read_attachment)
+    graph.add_node("check_duplicate",check_duplicate)
+    graph.add_node("apply_template",apply_template)
+    graph.add_node("get_details",get_details)
+    graph.add_node("record_signature",record_signature)
+    graph.add_node("record_template",record_template)
+    
+    graph.add_edge(START,"triage")
+    graph.add_conditional_edges("triage",route_after_triage,["read_attachment",END])
+    graph.add_conditional_edges("read_attachment",route_after_read,["check_duplicate",END])
+    graph.add_conditional_edges("check_duplicate",route_after_check,["apply_template",END])
+    graph.add_conditional_edges("apply_template",route_after_template,["get_details","record_signature"])
+    graph.add_edge("get_details","record_signature")
+    graph.add_edge("record_signature","record_template")
+    graph.add_edge("record_template",END)
+    return graph
+
+def _build_llm():
+    from langchain_openai import ChatOpenAI
+    # The gateway does the retrying, so the client's own retries are disabled
+    return ChatOpenAI(model=gateway.model_name, max_retries=0)
+
+def _structured_model(schema: type) -> Callable[[], Any]:
+    # include_raw keeps the provider response so token usage can be recorded
+    return lambda: _lazy('llm').with_structured_output(schema, include_raw=True)
+
+def _open_checkpointer() -> 'SqliteSaver':
+    """SQLite checkpointer shared by every extraction run in this process"""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    
+    db_path = get_workflow_config()['checkpoint_db']
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # The saver serialises access itself; runs happen on executor threads
+    connection = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return SqliteSaver(connection)
+
+# The model client and the compiled workflow are built on first use, so
+# importing this module (API server start-up, CLIs, the batch mode) doesn't
+# pay for langchain_openai, langgraph or the checkpoint database.
+# Tests and benchmarks can still replace them by plain assignment.
+_LAZY_ATTRIBUTES: Dict[str, Callable[[], Any]] = {
+    'llm': _build_llm,
+    'invoice_model_pdf': _structured_model(GetInvvoice),
+    'order_model_pdf': _structured_model(GetOrderNumber),
+    # Several short documents in one call (orchestrator.document_packing)
+    'packed_model_pdf': _structured_model(PackedExtraction),
+    'graph': _build_graph,
+    'checkpointer': _open_checkpointer,
+    'workflow': lambda: _lazy('graph').compile(checkpointer=_lazy('checkpointer')),
+}
+_lazy_lock = threading.RLock()
+
+def __getattr__(name: str) -> Any:
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lazy_lock:
+        if name not in globals():
+            globals()[name] = factory()
+    return globals()[name]
+
+def _lazy(name: str) -> Any:
+    # Module __getattr__ only covers access from outside; code in this module
+    # looks lazy attributes up through here
+    return globals()[name] if name in globals() else __getattr__(name)
+
+# thread ID -> [lock, callers holding or waiting for it]; an entry is
+# dropped when its last caller leaves, so the dict only holds active runs
+_thread_locks: Dict[str, list] = {}
+_thread_locks_lock = threading.Lock()
+
+def document_thread_id(document_path: str) -> str:
+    """
+    Checkpoint thread of a document
+    
+    The content hash and prompt version are part of the ID, so a file
+    replaced under the same name, or a new prompt version, starts a new run
+    instead of resuming (or returning) the old one.
+    """
+    content_hash = file_content_hash(document_path)[:16]
+    return f"{os.path.abspath(document_path)}#{content_hash}#{active_prompt_version()}"
+
+@contextmanager
+def document_lock(thread_id: str) -> Iterator[None]:
+    """Hold the lock serialising runs of one document thread within this process"""
+    with _thread_locks_lock:
+        entry = _thread_locks.setdefault(thread_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _thread_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _thread_locks[thread_id]
+
+def _current_hashes(checkpointer: 'SqliteSaver', document_paths: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Content hash prefix (as in thread IDs) of each document, None if it is gone
+    
+    Hashes are remembered in the checkpoint database with the file's size and
+    mtime, so a restart only re-reads documents that changed since the last prune.
+    """
+    with checkpointer.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS document_hashes '
+                       '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT)')
+        known = {row[0]: row[1:] for row in cursor.execute(
+            'SELECT path, size, mtime_ns, content_hash FROM document_hashes')}
+    
+    hashes: Dict[str, Optional[str]] = {}
+    changed = []
+    for path in document_paths:
+        try:
+            stat = os.stat(path)
+            entry = known.get(path)
+            if entry and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                hashes[path] = entry[2]
+                continue
+            hashes[path] = file_content_hash(path)[:16]
+        except OSError:
+            hashes[path] = None
+            continue
+        changed.append((path, stat.st_size, stat.st_mtime_ns, hashes[path]))
     
-graph = StateGraph(AgenticState)
+    with checkpointer.cursor() as cursor:
+        cursor.executemany('INSERT OR REPLACE INTO document_hashes VALUES (?, ?, ?, ?)', changed)
+        cursor.executemany('DELETE FROM document_hashes WHERE path = ?',
+                           [(path,) for path, content_hash in hashes.items() if content_hash is None])
+    return hashes
 
-graph.add_node("read_attachment",read_attachment)
-graph.add_node("get_details",get_details)
+def prune_checkpoints() -> int:
+    """
+    Delete checkpoint threads no extraction can return to
+    
+    A thread is stale once its document is gone, its content changed (the
+    new content runs on a new thread) or the prompt version moved on.
+    
+    Returns:
+        Number of threads deleted
+    """
+    checkpointer = _lazy('checkpointer')
+    with checkpointer.cursor() as cursor:
+        thread_ids = [row[0] for row in cursor.execute('SELECT DISTINCT thread_id FROM checkpoints')]
+    
+    # thread ID = "<absolute path>#<content hash prefix>#<prompt version>"
+    parts = {thread_id: thread_id.rsplit('#', 2) for thread_id in thread_ids if thread_id.count('#') >= 2}
+    version = active_prompt_version()
+    hashes = _current_hashes(checkpointer, sorted({path for path, _, thread_version in parts.values()
+                                                   if thread_version == version}))
+    
+    deleted = 0
+    for thread_id, (path, content_hash, thread_version) in parts.items():
+        if thread_version == version and hashes.get(path) == content_hash:
+            continue
+        with document_lock(thread_id):
+            checkpointer.delete_thread(thread_id)
+        deleted += 1
+    if deleted:
+        logger.info("Pruned %d stale extraction checkpoint thread(s)", deleted)
+    return deleted
 
-graph.add_edge(START,"read_attachment")
-graph.add_edge("read_attachment","get_details")
-graph.add_edge("get_details",END)
+def advance_document(document_path: str, thread_id: str, force: bool = False,
+                     interrupt_before: Optional[List[str]] = None) -> dict:
+    """
+    Start, resume or look up a document's run (the caller holds its lock)
+    
+    Args:
+        document_path: Path of the document
+        thread_id: Its checkpoint thread (document_thread_id)
+        force: Start over from the first node even if a run exists
+        interrupt_before: Nodes to pause in front of (the run can be resumed later)
+        
+    Returns:
+        Workflow state where the run stopped
+    """
+    config = {'configurable': {'thread_id': thread_id}}
+    durability = get_workflow_config()['durability']
+    workflow = _lazy('workflow')
+    if force:
+        # Values persist per thread, so a fresh run needs a fresh thread
+        _lazy('checkpointer').delete_thread(thread_id)
+    snapshot = workflow.get_state(config)
+    
+    if snapshot.next:
+        CACHE_REQUESTS.labels(cache='workflow_checkpoint', result='resume').inc()
+        logger.info("Resuming extraction of %s at %s", document_path, ', '.join(snapshot.next))
+        return workflow.invoke(None, config, durability=durability, interrupt_before=interrupt_before)
+    if snapshot.values:
+        CACHE_REQUESTS.labels(cache='workflow_checkpoint', result='hit').inc()
+        return snapshot.values
+    
+    CACHE_REQUESTS.labels(cache='workflow_checkpoint', result='miss').inc()
+    initial_state = {
+        'attachment': os.path.basename(document_path),
+        'data_folder': os.path.dirname(document_path),
+        'force': force
+    }
+    return workflow.invoke(initial_state, config, durability=durability, interrupt_before=interrupt_before)
 
-workflow = graph.compile()
+@traced('workflow.run_document')
+def run_document(document_path: str, force: bool = False) -> dict:
+    """
+    Run the extraction workflow for a document, resuming earlier progress
+    
+    A run that was interrupted or failed part-way continues from the last
+    completed node; a document whose run already finished gets its stored
+    result back without any node running again.
+    
+    Args:
+        document_path: Path of the document
+        force: Start over from the first node even if a run exists
+        
+    Returns:
+        Final workflow state
+    """
+    thread_id = document_thread_id(document_path)
+    # Concurrent requests for one document wait for the first run instead of repeating it
+    with document_lock(thread_id):
+        return advance_document(document_path, thread_id, force)
@@ -0,0 +1,442 @@
+"""
+Mars AI Agents - Model Call Gateway
+Single entry point for LLM calls made by the extraction graph: enforces
+requests-per-minute and tokens-per-minute budgets, caps concurrency,
+estimates prompt tokens up front, retries rate limits with jitter and
+keeps a per-document token ledger
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import get_llm_config
+from utils.metrics import LLM_TOKENS, STAGE_SECONDS, Counter
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Usage collectors opened by ModelGateway.track_usage in the current context
+_usage_scopes: contextvars.ContextVar[Tuple[Dict[str, Dict[str, Any]], ...]] = \
+    contextvars.ContextVar('mars_usage_scopes', default=())
+
+
+def empty_usage() -> Dict[str, Any]:
+    """Usage entry of a document no call has been charged to"""
+    return {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0}
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    """Errors worth retrying: throttling, timeouts and provider-side failures"""
+    # Imported on first failure rather than with this module: openai is slow
+    # to import and only the model client needs it up front
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+LLM_RETRIES = Counter(
+    'mars_llm_retries',
+    'LLM calls retried after a rate-limit or transient error',
+    ['call', 'error']
+)
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _prompt_text(prompt: Any) -> str:
+    """Flatten a string or list of messages to the text sent to the model"""
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return '\n'.join(_prompt_text(item) for item in prompt)
+    content = getattr(prompt, 'content', None)
+    if content is not None:
+        return content if isinstance(content, str) else str(content)
+    return str(prompt)
+
+
+def count_tokens(text: str, model: str = 'gpt-4o-mini') -> int:
+    """
+    Count tokens in a text, falling back to a character heuristic
+
+    tiktoken downloads its encodings on first use, so an offline machine
+    falls back to ~4 characters per token rather than failing the call.
+
+    Args:
+        text: Text to count
+        model: Model whose tokenizer should be used
+
+    Returns:
+        Token count (exact with tiktoken, approximate otherwise)
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model(model)
+                except Exception:
+                    _encoding_failed = True
+
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = 'gpt-4o-mini',
+                       head_fraction: float = 0.75) -> str:
+    """
+    Shorten a text to a token budget, keeping its beginning and end
+
+    Args:
+        text: Text to shorten
+        max_tokens: Tokens the result may use (including the omission marker)
+        model: Model whose tokenizer should be used
+        head_fraction: Share of the budget kept from the start of the text
+
+    Returns:
+        The text itself if it fits, otherwise head + marker + tail
+    """
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+
+    marker_budget = 16
+    keep = max(0, max_tokens - marker_budget)
+    head_tokens = int(keep * head_fraction)
+    tail_tokens = keep - head_tokens
+    marker = f"\n[... {total - keep} tokens omitted ...]\n"
+
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        head = _encoding.decode(tokens[:head_tokens])
+        tail = _encoding.decode(tokens[len(tokens) - tail_tokens:]) if tail_tokens else ''
+    else:
+        head = text[:head_tokens * CHARS_PER_TOKEN]
+        tail = text[len(text) - tail_tokens * CHARS_PER_TOKEN:] if tail_tokens else ''
+    return head + marker + tail
+
+
+def estimate_prompt_tokens(prompt: Any, model: str = 'gpt-4o-mini') -> int:
+    """Estimate the input tokens a prompt will be billed for"""
+    # Per-message framing plus the structured-output tool schema
+    return count_tokens(_prompt_text(prompt), model) + 100
+
+
+class SlidingWindowBudget:
+    """Budget of units (requests or tokens) allowed per rolling 60 seconds"""
+
+    def __init__(self, per_minute: int, window_seconds: float = 60.0):
+        self.per_minute = per_minute
+        self.window_seconds = window_seconds
+        self._entries: Deque[List] = deque()
+        self._used = 0
+
+    def _expire(self, now: float):
+        while self._entries and now - self._entries[0][0] >= self.window_seconds:
+            _, amount = self._entries.popleft()
+            self._used -= amount
+
+    def wait_time(self, amount: int, now: float) -> float:
+        """Seconds until `amount` more units fit in the window (0 if they fit now)"""
+        self._expire(now)
+        # A single oversized call is allowed through on an empty window
+        if self._used + amount <= self.per_minute or not self._entries:
+            return 0.0
+        excess = self._used + amount - self.per_minute
+        for timestamp, entry_amount in self._entries:
+            excess -= entry_amount
+            if excess <= 0:
+                return max(0.0, timestamp + self.window_seconds - now)
+        return self.window_seconds
+
+    def record(self, amount: int, now: float) -> List:
+        """Reserve units now; returns the entry so it can be corrected later"""
+        entry = [now, amount]
+        self._entries.append(entry)
+        self._used += amount
+        return entry
+
+    def adjust(self, entry: List, amount: int, now: float):
+        """Replace a reservation with the real usage once it is known"""
+        self._expire(now)
+        if now - entry[0] < self.window_seconds:
+            self._used += amount - entry[1]
+            entry[1] = amount
+
+    @property
+    def used(self) -> int:
+        self._expire(time.monotonic())
+        return self._used
+
+
+class ModelGateway:
+    """Rate-limited, retrying, token-accounting front door for LLM calls"""
+
+    def __init__(self, model_name: str = 'gpt-4o-mini', requests_per_minute: int = 500,
+                 tokens_per_minute: int = 200000, max_concurrency: int = 8,
+                 max_retries: int = 5, backoff_base_seconds: float = 1.0,
+                 backoff_max_seconds: float = 30.0, input_cost_per_million: float = 0.0,
+                 output_cost_per_million: float = 0.0, output_tokens_estimate: int = 50,
+                 ledger_size: int = 1000):
+        """
+        Initialize the gateway
+
+        Args:
+            model_name: Model used for token counting and reporting
+            requests_per_minute: Request budget per rolling minute
+            tokens_per_minute: Token budget per rolling minute
+            max_concurrency: Maximum calls in flight at once
+            max_retries: Retries for rate-limit and transient errors
+            backoff_base_seconds: Base delay for exponential backoff
+            backoff_max_seconds: Cap for a single backoff delay
+            input_cost_per_million: Price of a million input tokens (USD)
+            output_cost_per_million: Price of a million output tokens (USD)
+            output_tokens_estimate: Output tokens reserved per call up front
+            ledger_size: Number of documents kept in the token ledger
+        """
+        self.model_name = model_name
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.input_cost_per_million = input_cost_per_million
+        self.output_cost_per_million = output_cost_per_million
+        self.output_tokens_estimate = output_tokens_estimate
+        self.ledger_size = ledger_size
+
+        self.request_budget = SlidingWindowBudget(requests_per_minute)
+        self.token_budget = SlidingWindowBudget(tokens_per_minute)
+        self._budget_lock = threading.Lock()
+        self._concurrency = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+
+        self._ledger: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._totals = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0,
+                        'cached_input_tokens': 0, 'retries': 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> 'ModelGateway':
+        """Build a gateway from the LLM configuration"""
+        settings = get_llm_config()
+        settings['model_name'] = settings.pop('model')
+        return cls(**settings)
+
+    def _reserve(self, tokens: int) -> List:
+        """Block until both budgets have room; returns the token reservation"""
+        while True:
+            with self._budget_lock:
+                now = time.monotonic()
+                wait = max(self.request_budget.wait_time(1, now),
+                           self.token_budget.wait_time(tokens, now))
+                if wait <= 0:
+                    self.request_budget.record(1, now)
+                    return self.token_budget.record(tokens, now)
+            time.sleep(min(wait, 1.0))
+
+    def _backoff_delay(self, error: Exception, attempt: int) -> float:
+        """Retry-After from the provider if given, else full-jitter exponential backoff"""
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(self.backoff_max_seconds, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt)))
+
+    def invoke_structured(self, model: Any, call_name: str, prompt: Any,
+                          document_id: Optional[str] = None, prompt_version: str = '',
+                          charge_to: Optional[Dict[str, float]] = None) -> Any:
+        """
+        Invoke a structured-output model built with include_raw=True
+
+        Args:
+            model: Runnable returning {'raw', 'parsed', 'parsing_error'}
+            call_name: Short name of the call for metrics and the ledger
+            prompt: Prompt string or list of messages
+            document_id: Document the tokens are charged to
+            prompt_version: Version of the prompt template, for metrics
+            charge_to: Documents sharing the call, with weights for splitting its tokens and the call itself
+
+        Returns:
+            The parsed structured output
+        """
+        estimated = estimate_prompt_tokens(prompt, self.model_name) + self.output_tokens_estimate
+
+        with span(f'llm.{call_name}') as llm_span:
+            llm_span.set_attribute('estimated_tokens', estimated)
+            if prompt_version:
+                llm_span.set_attribute('prompt_version', prompt_version)
+            attempt = 0
+            while True:
+                reservation = self._reserve(estimated)
+                try:
+                    with self._concurrency, STAGE_SECONDS.labels(stage=f'llm_{call_name}').time():
+                        response = model.invoke(prompt)
+                    break
+                except retryable_errors() as error:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff_delay(error, attempt)
+                    LLM_RETRIES.labels(call=call_name, error=type(error).__name__).inc()
+                    with self._stats_lock:
+                        self._totals['retries'] += 1
+                    logger.warning("LLM call %s failed (%s), retrying in %.1fs (attempt %d/%d)",
+                                   call_name, type(error).__name__, delay, attempt + 1, self.max_retries)
+                    time.sleep(delay)
+                    attempt += 1
+
+            usage = getattr(response['raw'], 'usage_metadata', None) or {}
+            input_tokens = usage.get('input_tokens', 0)
+            output_tokens = usage.get('output_tokens', 0)
+            # Input tokens served from the provider's prompt-prefix cache
+            cached_tokens = (usage.get('input_token_details') or {}).get('cache_read', 0) or 0
+            if usage:
+                with self._budget_lock:
+                    self.token_budget.adjust(reservation, input_tokens + output_tokens, time.monotonic())
+
+            self._record_usage(call_name, document_id, input_tokens, output_tokens,
+                               cached_tokens, prompt_version, charge_to)
+            llm_span.set_attribute('input_tokens', input_tokens)
+            llm_span.set_attribute('cached_input_tokens', cached_tokens)
+            llm_span.set_attribute('output_tokens', output_tokens)
+            llm_span.set_attribute('retries', attempt)
+
+        if response.get('parsing_error') is not None:
+            raise response['parsing_error']
+        return response['parsed']
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        """Cost in USD of a number of tokens"""
+        return (input_tokens * self.input_cost_per_million
+                + output_tokens * self.output_cost_per_million) / 1_000_000
+
+    def _record_usage(self, call_name: str, document_id: Optional[str],
+                      input_tokens: int, output_tokens: int, cached_tokens: int = 0,
+                      prompt_version: str = '', charge_to: Optional[Dict[str, float]] = None):
+        LLM_TOKENS.labels(call=call_name, kind='input', prompt_version=prompt_version).inc(input_tokens)
+        LLM_TOKENS.labels(call=call_name, kind='output', prompt_version=prompt_version).inc(output_tokens)
+        LLM_TOKENS.labels(call=call_name, kind='cached_input', prompt_version=prompt_version).inc(cached_tokens)
+
+        with self._stats_lock:
+            self._totals['calls'] += 1
+            self._totals['input_tokens'] += input_tokens
+            self._totals['output_tokens'] += output_tokens
+            self._totals['cached_input_tokens'] += cached_tokens
+
+            if charge_to is None:
+                charge_to = {document_id: 1.0} if document_id is not None else {}
+            total_weight = sum(charge_to.values()) or 1.0
+            for charged_id, weight in charge_to.items():
+                share = weight / total_weight
+                charged_input = round(input_tokens * share)
+                charged_output = round(output_tokens * share)
+                entry = self._ledger.pop(charged_id, None) or empty_usage()
+                self._charge(entry, share, charged_input, charged_output)
+                self._ledger[charged_id] = entry
+                for scope in _usage_scopes.get():
+                    self._charge(scope.setdefault(charged_id, empty_usage()), share, charged_input, charged_output)
+            while len(self._ledger) > self.ledger_size:
+                self._ledger.popitem(last=False)
+
+    def _charge(self, entry: Dict[str, Any], calls: float, input_tokens: int, output_tokens: int):
+        # A packed call is split like its tokens, so calls sum to real requests
+        entry['calls'] = round(entry['calls'] + calls, 4)
+        entry['input_tokens'] += input_tokens
+        entry['output_tokens'] += output_tokens
+        entry['cost_usd'] = self.cost(entry['input_tokens'], entry['output_tokens'])
+
+    @contextmanager
+    def track_usage(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """
+        Collect the usage charged by calls made inside the block
+
+        Unlike document_usage, which accumulates over every run of a
+        document, this covers one run only.
+
+        Yields:
+            Usage entries keyed by document ID, filled in as calls finish
+        """
+        usage: Dict[str, Dict[str, Any]] = {}
+        token = _usage_scopes.set(_usage_scopes.get() + (usage,))
+        try:
+            yield usage
+        finally:
+            _usage_scopes.reset(token)
+
+    def document_usage(self, document_id: str) -> Dict[str, Any]:
+        """Tokens and cost charged to a document so far, over all its runs"""
+        with self._stats_lock:
+            return dict(self._ledger.get(document_id) or empty_usage())
+
+    def stats(self) -> Dict[str, Any]:
+        """Budgets, current usage, totals and the implied throughput limits"""
+        with self._stats_lock:
+            totals = dict(self._totals)
+            documents = len(self._ledger)
+            doc_input = sum(e['input_tokens'] for e in self._ledger.values())
+            doc_output = sum(e['output_tokens'] for e in self._ledger.values())
+            doc_calls = sum(e['calls'] for e in self._ledger.values())
+        doc_tokens = doc_input + doc_output
+
+        tokens_per_document = doc_tokens / documents if documents else None
+        calls_per_document = doc_calls / documents if documents else None
+        limits = {}
+        if tokens_per_document and calls_per_document:
+            limits = {
+                'documents_per_minute_by_requests': self.request_budget.per_minute / calls_per_document,
+                'documents_per_minute_by_tokens': self.token_budget.per_minute / tokens_per_document,
+            }
+            limits['documents_per_minute'] = min(limits.values())
+
+        with self._budget_lock:
+            requests_used = self.request_budget.used
+            tokens_used = self.token_budget.used
+
+        return {
+            'model': self.model_name,
+            'budgets': {
+                'requests_per_minute': self.request_budget.per_minute,
+                'tokens_per_minute': self.token_budget.per_minute,
+                'max_concurrency': self.max_concurrency
+            },
+            'last_minute': {'requests': requests_used, 'tokens': tokens_used},
+            'totals': {**totals, 'cost_usd': self.cost(totals['input_tokens'], totals['output_tokens'])},
+            'per_document': {
+                'documents': documents,
+                'avg_tokens': tokens_per_document,
+                'avg_calls': calls_per_document,
+                'avg_cost_usd': self.cost(doc_input, doc_output) / documents if documents else None
+            },
+            'throughput_limits': limits
+        }
+
+
+__all__ = [
+    'ModelGateway',
+    'count_tokens',
+    'empty_usage',
+    'estimate_prompt_tokens',
+    'retryable_errors',
+    'truncate_to_tokens'
+]
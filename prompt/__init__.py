@@ -1,3 +1,15 @@
-from .prompt_library import Promptlibrary
+from .prompt_library import (
+    PROMPT_TEMPLATES, PROMPT_VERSION, PromptTemplate, Promptlibrary,
+    active_prompt_version, build_extraction_prompt, build_packed_prompt, get_prompt_template
+)
 
-__all__ = ['Promptlibrary']
+__all__ = [
+    'PROMPT_TEMPLATES',
+    'PROMPT_VERSION',
+    'PromptTemplate',
+    'Promptlibrary',
+    'active_prompt_version',
+    'build_extraction_prompt',
+    'build_packed_prompt',
+    'get_prompt_template'
+]
@@ -1,3 +1,201 @@
+"""
+Mars AI Agents - Prompt Library
+Versioned extraction prompt templates. A prompt is shared instructions,
+then the document, then the field to extract. The invoice and order calls
+for a document therefore start with the same instructions-plus-document
+prefix, which the provider can serve from its prompt cache on the second
+call once the prefix passes its minimum cacheable length (1,024 tokens
+for OpenAI). The instructions alone are far shorter than that.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from config import get_prompt_config
+from orchestrator.model_gateway import count_tokens, truncate_to_tokens
+
+# Bump whenever the wording of any extraction template changes: the
+# version keys workflow checkpoints and the LLM token metrics
+PROMPT_VERSION = 'extract-v3'
+
+# extract-v2: field-specific instructions before the document, so the
+# invoice and order calls share only this short preamble. Kept only for
+# checkpoint compatibility: runs checkpointed under extract-v2 (or a
+# prompts.version pinned to it) still find their templates.
+_EXTRACTION_PREAMBLE = """You are an AI assistant that specializes in reading and extracting structured data from business documents such as invoices.
+
+You will be given the text of one invoice, extracted from a PDF or produced by OCR. Long documents may have a marked gap where text was omitted.
+
+Rules:
+- Extract the exact value as written on the document. Do not infer or guess.
+- If several candidate numbers are present, choose the one whose label matches the field below.
+- If the value cannot be found, return "Not Found".
+"""
+
+_INVOICE_FIELD = """Field: Invoice Number - may appear as "Invoice No.", "Invoice #", "Inv No." or similar variations."""
+
+_ORDER_FIELD = """Field: Order Number - may appear as "Order No.", "Buyer's Order No.", "Order ID", "PO Number", "Purchase Order" or similar terms. Prefer values labelled "Order No." or "Buyer's Order No."."""
+
+
+_PACKED_FIELDS = """You will be given several invoices at once, each inside <document id="..."> tags. Treat every document separately and never combine values from different documents.
+
+For each document, return its id exactly as given and:
+- Invoice Number - may appear as "Invoice No.", "Invoice #", "Inv No." or similar variations.
+- Order Number - may appear as "Order No.", "Buyer's Order No.", "Order ID", "PO Number", "Purchase Order" or similar terms. Prefer values labelled "Order No." or "Buyer's Order No.".
+
+Return exactly one entry per document."""
+
+# extract-v3: the preamble names no field, so it and the document form the
+# shared prefix; the field comes last
+_SHARED_PREAMBLE = """You are an AI assistant that specializes in reading and extracting structured data from business documents such as invoices.
+
+You will be given invoice text, extracted from a PDF or produced by OCR, followed by the field to extract. Long documents may have a marked gap where text was omitted.
+
+Rules:
+- Extract the exact value as written on the document. Do not infer or guess.
+- If several candidate numbers are present, choose the one whose label matches the requested field.
+- If the value cannot be found, return "Not Found".
+"""
+
+_INVOICE_REQUEST = f"""Extract the invoice number from the invoice above.
+{_INVOICE_FIELD}"""
+
+_ORDER_REQUEST = f"""Extract the order number from the invoice above.
+{_ORDER_FIELD}"""
+
+class PromptTemplate:
+    """Static instructions, the document, and an optional trailing request"""
+
+    def __init__(self, name: str, version: str, instructions: str, document_label: str = 'Invoice content',
+                 request: str = ''):
+        """
+        Define a template
+
+        Args:
+            name: Call the template is for ('invoice', 'order', ...)
+            version: Prompt version the template belongs to
+            instructions: Static system instructions (no per-document values)
+            document_label: Heading placed before the document text
+            request: Static call-specific instructions placed after the document,
+                so calls differing only in it share the document prefix
+        """
+        self.name = name
+        self.version = version
+        self.instructions = instructions
+        self.document_label = document_label
+        self.request = request
+
+    @property
+    def static_text(self) -> str:
+        """All of the template's fixed text, for token budgeting"""
+        return f"{self.instructions}\n{self.document_label}\n{self.request}"
+
+    def render(self, document_text: str) -> List[Any]:
+        """Messages for one document: instructions, document, then the request"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        messages = [
+            SystemMessage(content=self.instructions),
+            HumanMessage(content=f"{self.document_label}:\n{document_text}")
+        ]
+        if self.request:
+            messages.append(HumanMessage(content=self.request))
+        return messages
+
+
+# version -> call name -> template
+PROMPT_TEMPLATES: Dict[str, Dict[str, PromptTemplate]] = {
+    'extract-v2': {
+        'invoice': PromptTemplate('invoice', 'extract-v2', f"{_EXTRACTION_PREAMBLE}\n{_INVOICE_FIELD}"),
+        'order': PromptTemplate('order', 'extract-v2', f"{_EXTRACTION_PREAMBLE}\n{_ORDER_FIELD}"),
+        'packed': PromptTemplate('packed', 'extract-v2', f"{_EXTRACTION_PREAMBLE}\n{_PACKED_FIELDS}",
+                                 document_label='Invoices'),
+    },
+    'extract-v3': {
+        'invoice': PromptTemplate('invoice', 'extract-v3', _SHARED_PREAMBLE, request=_INVOICE_REQUEST),
+        'order': PromptTemplate('order', 'extract-v3', _SHARED_PREAMBLE, request=_ORDER_REQUEST),
+        'packed': PromptTemplate('packed', 'extract-v3', _SHARED_PREAMBLE, document_label='Invoices',
+                                 request=_PACKED_FIELDS),
+    },
+}
+
+
+def active_prompt_version() -> str:
+    """Prompt version extraction currently uses (configured, else the newest)"""
+    return get_prompt_config()['version'] or PROMPT_VERSION
+
+
+def get_prompt_template(name: str, version: Optional[str] = None) -> PromptTemplate:
+    """
+    Look up a template
+
+    Args:
+        name: Call name ('invoice' or 'order')
+        version: Prompt version (defaults to the configured one, else PROMPT_VERSION)
+
+    Returns:
+        PromptTemplate
+
+    Raises:
+        KeyError: If the version or name is not registered
+    """
+    return PROMPT_TEMPLATES[version or active_prompt_version()][name]
+
+
+def build_extraction_prompt(name: str, document_text: str, version: Optional[str] = None,
+                            max_input_tokens: Optional[int] = None, model: str = 'gpt-4o-mini') -> Dict[str, Any]:
+    """
+    Render an extraction prompt within a token budget
+
+    The document text is shortened (keeping its start and end) so the whole
+    prompt fits max_input_tokens; the instructions are never cut.
+
+    Args:
+        name: Call name ('invoice' or 'order')
+        document_text: Text of the document
+        version: Prompt version (defaults to the configured one)
+        max_input_tokens: Prompt token budget (defaults to the prompts config)
+        model: Model whose tokenizer is used for counting
+
+    Returns:
+        {'messages', 'version', 'prompt_tokens', 'document_tokens', 'truncated'}
+    """
+    template = get_prompt_template(name, version)
+    budget = max_input_tokens or get_prompt_config()['max_input_tokens']
+
+    framing_tokens = count_tokens(template.static_text, model) + 16
+    document_budget = max(1, budget - framing_tokens)
+    document_tokens = count_tokens(document_text, model)
+    truncated = document_tokens > document_budget
+    if truncated:
+        document_text = truncate_to_tokens(document_text, document_budget, model)
+
+    return {
+        'messages': template.render(document_text),
+        'version': template.version,
+        'prompt_tokens': framing_tokens + min(document_tokens, document_budget),
+        'document_tokens': document_tokens,
+        'truncated': truncated,
+    }
+
+
+def build_packed_prompt(documents: List[Any], version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Render one prompt covering several documents
+
+    Args:
+        documents: (document ID, text) pairs; IDs should be short and unique
+        version: Prompt version (defaults to the configured one)
+
+    Returns:
+        {'messages', 'version'}
+    """
+    template = get_prompt_template('packed', version)
+    body = '\n\n'.join(f'<document id="{document_id}">\n{text}\n</document>' for document_id, text in documents)
+    return {'messages': template.render(body), 'version': template.version}
+
+
+# Legacy single-string prompts (version extract-v1): the document sits
+# inside the instructions, so no two documents share a prompt prefix.
+# The extraction graph uses build_extraction_prompt() instead.
 class Promptlibrary:
     def __init__(self,ticket_header,ticket_details,attachment=None):
         self.ticket_header = ticket_header
@@ -65,4 +263,16 @@ class Promptlibrary:
 
             {invoice_text}
                 """
-        return prompt
\ No newline at end of file
+        return prompt
+
+
+__all__ = [
+    'PROMPT_TEMPLATES',
+    'PROMPT_VERSION',
+    'PromptTemplate',
+    'Promptlibrary',
+    'active_prompt_version',
+    'build_extraction_prompt',
+    'build_packed_prompt',
+    'get_prompt_template'
+]
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import './DocumentViewer.css';
+import useServerEvents from './useServerEvents';
 
 const DocumentViewer = ({ documentPath, onBack }) => {
   const [documentUrl, setDocumentUrl] = useState('');
@@ -7,6 +8,11 @@ const DocumentViewer = ({ documentPath, onBack }) => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   
+  // Page preview states
+  const [previewPage, setPreviewPage] = useState(1);
+  const [pageCount, setPageCount] = useState(0);
+  const [showFullDocument, setShowFullDocument] = useState(false);
+  
   // Invoice data states
   const [invoiceNumber, setInvoiceNumber] = useState('');
   const [orderNumber, setOrderNumber] = useState('');
@@ -14,6 +20,7 @@ const DocumentViewer = ({ documentPath, onBack }) => {
   const [updating, setUpdating] = useState(false);
   const [extractionError, setExtractionError] = useState(null);
   const [lastUpdated, setLastUpdated] = useState(null);
+  const [duplicateOf, setDuplicateOf] = useState(null);
 
   useEffect(() => {
     if (documentPath) {
@@ -21,19 +28,112 @@ const DocumentViewer = ({ documentPath, onBack }) => {
       const extension = documentPath.split('.').pop().toLowerCase();
       setDocumentType(extension);
       
-      // Create document URL for serving
-      // Convert path like "data/file.pdf" to "http://localhost:8000/documents/file.pdf"
-      const relativePath = documentPath.replace('data/', '');
-      const url = `http://localhost:8000/documents/${relativePath}`;
-      setDocumentUrl(url);
-      setLoading(false);
+      loadDocumentUrl();
     }
     // Extract invoice data when document is loaded
     if (documentPath) {
       extractInvoiceData();
+      loadPreviewInfo();
     }
   }, [documentPath]);
 
+  const documentName = documentPath ? documentPath.replace('data/', '') : '';
+  const previewUrl = `http://localhost:8000/api/preview/${encodeURIComponent(documentName)}?page=${previewPage}`;
+
+  // Extraction results and edits for this document are pushed by the server
+  // (from this or any other client), so there is nothing to poll
+  useServerEvents((event) => {
+    if (event.type === 'resync') {
+      loadInvoiceData();
+      return;
+    }
+    if (!event.data || event.data.document_path !== documentPath) {
+      return;
+    }
+    
+    switch (event.type) {
+      case 'extraction.started':
+        setExtracting(true);
+        break;
+      case 'extraction.finished':
+        setExtracting(false);
+        if (event.data.success) {
+          setInvoiceNumber(event.data.invoice_number || '');
+          setOrderNumber(event.data.order_number || '');
+          setDuplicateOf(event.data.duplicate_of ? { path: event.data.duplicate_of, similarity: event.data.similarity } : null);
+          setExtractionError(null);
+        } else {
+          setExtractionError(event.data.error || 'Failed to extract invoice data');
+        }
+        break;
+      case 'invoice_data.updated':
+        if (!updating) {
+          setInvoiceNumber(event.data.invoice_number || '');
+          setOrderNumber(event.data.order_number || '');
+        }
+        setLastUpdated(new Date(event.data.updated_at).toLocaleString());
+        break;
+      default:
+        break;
+    }
+  });
+
+  const loadInvoiceData = async () => {
+    // Current values after missed events (the stream asked us to resync)
+    try {
+      const response = await fetch(`http://localhost:8000/api/invoice-data/${encodeURIComponent(documentName)}`);
+      const data = await response.json();
+      if (data.success && (data.invoice_number || data.order_number)) {
+        setInvoiceNumber(data.invoice_number);
+        setOrderNumber(data.order_number);
+      }
+    } catch (error) {
+      console.error('Error reloading invoice data:', error);
+    }
+  };
+
+  const loadDocumentUrl = async () => {
+    setLoading(true);
+    const relativePath = documentPath.replace('data/', '');
+    
+    try {
+      // Ask the server for the content-addressed URL so the browser can
+      // cache the document forever and fetch it with Range requests
+      const response = await fetch(`http://localhost:8000/api/documents/${encodeURIComponent(relativePath)}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data = await response.json();
+      setDocumentUrl(`http://localhost:8000${data.url}`);
+    } catch (error) {
+      console.error('Error loading document metadata:', error);
+      // Fall back to the name-based URL, which is revalidated with ETags
+      setDocumentUrl(`http://localhost:8000/documents/${relativePath}`);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const loadPreviewInfo = async () => {
+    setPreviewPage(1);
+    setPageCount(0);
+    setShowFullDocument(false);
+    
+    try {
+      const response = await fetch(`http://localhost:8000/api/preview/${encodeURIComponent(documentName)}/info`);
+      if (!response.ok) {
+        // Fall back to the original document when no preview can be rendered
+        setShowFullDocument(true);
+        return;
+      }
+      const data = await response.json();
+      setPageCount(data.page_count || 0);
+    } catch (error) {
+      console.error('Error loading preview info:', error);
+      setShowFullDocument(true);
+    }
+  };
+
   const extractInvoiceData = async () => {
     setExtracting(true);
     setExtractionError(null);
@@ -54,6 +154,7 @@ const DocumentViewer = ({ documentPath, onBack }) => {
       if (data.success) {
         setInvoiceNumber(data.invoice_number || '');
         setOrderNumber(data.order_number || '');
+        setDuplicateOf(data.duplicate_of ? { path: data.duplicate_of, similarity: data.similarity } : null);
       } else {
         setExtractionError(data.error || 'Failed to extract invoice data');
       }
@@ -123,6 +224,43 @@ const DocumentViewer = ({ documentPath, onBack }) => {
 
     switch (documentType) {
       case 'pdf':
+        if (!showFullDocument && pageCount > 0) {
+          return (
+            <div className="document-preview-container">
+              <div className="preview-controls">
+                <button
+                  onClick={() => setPreviewPage(previewPage - 1)}
+                  disabled={previewPage <= 1}
+                  className="preview-nav-btn"
+                >
+                  ◀ Prev
+                </button>
+                <span className="preview-page-indicator">
+                  Page {previewPage} of {pageCount}
+                </span>
+                <button
+                  onClick={() => setPreviewPage(previewPage + 1)}
+                  disabled={previewPage >= pageCount}
+                  className="preview-nav-btn"
+                >
+                  Next ▶
+                </button>
+                <button
+                  onClick={() => setShowFullDocument(true)}
+                  className="preview-nav-btn"
+                >
+                  📄 Load Full PDF
+                </button>
+              </div>
+              <img
+                src={previewUrl}
+                alt={`Page ${previewPage}`}
+                className="document-image"
+                onError={() => setShowFullDocument(true)}
+              />
+            </div>
+          );
+        }
         return (
           <iframe
             src={documentUrl}
@@ -239,6 +377,15 @@ const DocumentViewer = ({ documentPath, onBack }) => {
               </div>
             )}
 
+            {duplicateOf && (
+              <div className="duplicate-notice">
+                <p>
+                  ♻️ Likely duplicate of <strong>{duplicateOf.path.replace('data/', '')}</strong>
+                  {' '}({Math.round(duplicateOf.similarity * 100)}% similar). Values were copied from it.
+                </p>
+              </div>
+            )}
+
             <div className="invoice-fields">
               <div className="field-group">
                 <label htmlFor="invoice-number">Invoice Number:</label>
@@ -1,6 +1,7 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import './ProcessingPage.css';
 import DocumentViewer from './DocumentViewer';
+import useServerEvents from './useServerEvents';
 
 const ProcessingPage = () => {
   const [isProcessing, setIsProcessing] = useState(false);
@@ -8,6 +9,51 @@ const ProcessingPage = () => {
   const [error, setError] = useState(null);
   const [showDocumentViewer, setShowDocumentViewer] = useState(false);
   const [selectedDocument, setSelectedDocument] = useState(null);
+  
+  // Documents pushed by the server (/api/events) since this page was opened,
+  // whichever client or mailbox run downloaded them
+  const [liveDocuments, setLiveDocuments] = useState([]);
+  const [mailRunning, setMailRunning] = useState(false);
+  const openedAt = useRef(new Date());
+  
+  const addLiveDocuments = (paths) => {
+    setLiveDocuments((current) => {
+      const fresh = paths.filter((path) => !current.includes(path));
+      return fresh.length ? [...fresh, ...current] : current;
+    });
+  };
+  
+  const reloadLiveDocuments = async () => {
+    // Events were missed: rebuild the list from the files on disk
+    try {
+      const response = await fetch('http://localhost:8000/api/files');
+      const data = await response.json();
+      addLiveDocuments((data.files || [])
+        .filter((file) => new Date(file.modified) >= openedAt.current)
+        .map((file) => file.path));
+    } catch (err) {
+      console.error('Error reloading files:', err);
+    }
+  };
+  
+  useServerEvents((event) => {
+    switch (event.type) {
+      case 'document.downloaded':
+        addLiveDocuments([event.data.document_path]);
+        break;
+      case 'processing.started':
+        setMailRunning(true);
+        break;
+      case 'processing.finished':
+        setMailRunning(false);
+        break;
+      case 'resync':
+        reloadLiveDocuments();
+        break;
+      default:
+        break;
+    }
+  });
 
   const handleStartProcessing = async () => {
     setIsProcessing(true);
@@ -111,6 +157,34 @@ const ProcessingPage = () => {
                   <div className="button-ripple"></div>
                 </button>
                 
+                {mailRunning && !isProcessing && (
+                  <p className="live-status">Checking mailboxes...</p>
+                )}
+                
+                {/* Documents pushed by the server as they arrive */}
+                {liveDocuments.length > 0 && (
+                  <div className="files-info live-documents">
+                    <h4>New Documents ({liveDocuments.length}):</h4>
+                    <ul className="files-list">
+                      {liveDocuments.map((file) => (
+                        <li key={file} className="file-item">
+                          <div className="file-info">
+                            <span className="file-name">{file.split('/').pop()}</span>
+                            <span className="file-path">{file}</span>
+                          </div>
+                          <button 
+                            className="view-document-btn"
+                            onClick={() => handleViewDocument(file)}
+                            title="View Document"
+                          >
+                            👁️ View
+                          </button>
+                        </li>
+                      ))}
+                    </ul>
+                  </div>
+                )}
+                
                 {/* Result Display Section */}
                 {(result || error) && (
                   <div className="result-section">
@@ -154,7 +228,7 @@ const ProcessingPage = () => {
                         
                         {!result.success && result.message === 'No new records to display' && (
                           <div className="no-records">
-                            <p>✉️ No new emails with attachments found from demotest.tcs@gmail.com</p>
+                            <p>✉️ No new emails with attachments found{result.mailboxes && result.mailboxes.length > 1 ? ` in ${result.mailboxes.length} mailboxes` : ''}</p>
                           </div>
                         )}
                         
@@ -0,0 +1,63 @@
+import { useEffect, useRef } from 'react';
+
+const EVENTS_URL = 'http://localhost:8000/api/events';
+
+// Named SSE events only reach listeners registered for their type
+const EVENT_TYPES = [
+  'processing.started',
+  'processing.finished',
+  'document.downloaded',
+  'extraction.started',
+  'extraction.finished',
+  'invoice_data.updated',
+  'resync',
+];
+
+// One EventSource shared by every mounted component. The browser reconnects
+// on its own and resumes with Last-Event-ID, so missed events are replayed
+let source = null;
+const listeners = new Set();
+
+const dispatch = (message) => {
+  let event;
+  try {
+    event = JSON.parse(message.data);
+  } catch (error) {
+    console.error('Malformed server event:', error);
+    return;
+  }
+  listeners.forEach((listener) => listener(event));
+};
+
+const connect = () => {
+  source = new EventSource(EVENTS_URL);
+  EVENT_TYPES.forEach((type) => source.addEventListener(type, dispatch));
+};
+
+/**
+ * Call onEvent({ id, type, timestamp, data }) for every server event while
+ * the component is mounted. A 'resync' event means events were missed
+ * (the client fell behind or reconnected too late); reload state instead.
+ */
+const useServerEvents = (onEvent) => {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    const listener = (event) => handler.current(event);
+    listeners.add(listener);
+    if (!source) {
+      connect();
+    }
+
+    return () => {
+      listeners.delete(listener);
+      if (listeners.size === 0 && source) {
+        source.close();
+        source = null;
+      }
+    };
+  }, []);
+};
+
+export default useServerEvents;
@@ -0,0 +1,79 @@
+"""
+Mars AI Agents - Document Packing Tests
+"""
+
+from orchestrator.document_packing import check_answers, plan_packs
+from orchestrator.langgraph_orchestrator import PackedDocumentFields
+
+
+def answer(document_id, invoice_number, order_number):
+    return PackedDocumentFields(document_id=document_id, invoice_number=invoice_number,
+                                order_number=order_number)
+
+
+class TestPlanPacks:
+    def test_keeps_order_and_limits_documents_per_pack(self):
+        documents = [(key, 100) for key in 'abcde']
+        packs, singles = plan_packs(documents, max_documents=2)
+        assert packs == [['a', 'b'], ['c', 'd']]
+        assert singles == ['e']
+
+    def test_long_documents_are_never_packed(self):
+        packs, singles = plan_packs([('a', 100), ('long', 1500), ('b', 100)], max_document_tokens=1500)
+        assert packs == [['a', 'b']]
+        assert singles == ['long']
+
+    def test_token_budget_starts_a_new_pack(self):
+        # 112 tokens each with tags; a third document would exceed 250
+        documents = [(key, 100) for key in 'abcd']
+        packs, singles = plan_packs(documents, max_input_tokens=250)
+        assert packs == [['a', 'b'], ['c', 'd']]
+        assert singles == []
+
+    def test_overhead_counts_once_per_pack(self):
+        packs, singles = plan_packs([(key, 100) for key in 'abcd'], max_input_tokens=400, overhead_tokens=100)
+        assert packs == [['a', 'b'], ['c', 'd']]
+        assert singles == []
+
+    def test_pack_of_one_is_extracted_on_its_own(self):
+        packs, singles = plan_packs([('only', 100)])
+        assert packs == []
+        assert singles == ['only']
+
+
+class TestCheckAnswers:
+    TEXTS = {
+        'd1': 'Invoice No: INV-2041\nPurchase order PO 7781\nTotal 120.00',
+        'd2': 'Invoice 55190 for order 88-1200',
+    }
+
+    def test_accepts_values_found_in_their_document(self):
+        accepted = check_answers(self.TEXTS, [answer('d1', 'INV-2041', 'PO7781'),
+                                              answer(' d2 ', '55190', '88-1200')])
+        assert accepted == {
+            'd1': {'invoice_number': 'INV-2041', 'order_number': 'PO7781'},
+            'd2': {'invoice_number': '55190', 'order_number': '88-1200'},
+        }
+
+    def test_rejects_values_of_another_document(self):
+        accepted = check_answers(self.TEXTS, [answer('d1', '55190', '88-1200')])
+        assert accepted == {}
+
+    def test_rejects_an_answer_with_nothing_found(self):
+        accepted = check_answers(self.TEXTS, [answer('d1', 'Not Found', 'N/A')])
+        assert accepted == {}
+
+    def test_one_absent_field_is_allowed(self):
+        accepted = check_answers(self.TEXTS, [answer('d2', '55190', 'Not Found')])
+        assert accepted == {'d2': {'invoice_number': '55190', 'order_number': 'Not Found'}}
+
+    def test_rejects_short_values_and_partial_tokens(self):
+        assert check_answers(self.TEXTS, [answer('d1', '20', 'Not Found')]) == {}
+        assert check_answers(self.TEXTS, [answer('d1', 'INV-204', 'Not Found')]) == {}
+        assert check_answers(self.TEXTS, [answer('d2', '5519', 'Not Found')]) == {}
+
+    def test_rejects_duplicated_and_unknown_ids(self):
+        accepted = check_answers(self.TEXTS, [answer('d1', 'INV-2041', 'PO7781'),
+                                              answer('d1', 'INV-2041', 'Not Found'),
+                                              answer('d9', '55190', '88-1200')])
+        assert accepted == {}
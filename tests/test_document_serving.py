@@ -0,0 +1,30 @@
+"""
+Mars AI Agents - Document Serving Tests
+
+Range requests are parsed by Starlette's FileResponse; only the
+If-None-Match check is ours.
+"""
+
+from utils.document_serving import etag_matches
+
+ETAG = '"3f2a9c"'
+
+
+def test_missing_header_never_matches():
+    assert not etag_matches(None, ETAG)
+    assert not etag_matches('', ETAG)
+
+
+def test_matches_the_current_etag():
+    assert etag_matches(ETAG, ETAG)
+    assert etag_matches('"old", "3f2a9c"', ETAG)
+
+
+def test_weak_form_and_wildcard_match():
+    assert etag_matches(f'W/{ETAG}', ETAG)
+    assert etag_matches('*', ETAG)
+
+
+def test_other_etags_do_not_match():
+    assert not etag_matches('"old"', ETAG)
+    assert not etag_matches('3f2a9c', ETAG)
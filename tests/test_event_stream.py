@@ -0,0 +1,137 @@
+"""
+Mars AI Agents - Event Stream Tests
+
+Replay and resync on reconnect, slow-consumer coalescing and the
+subscription lifetime of the SSE generator.
+"""
+
+import asyncio
+
+import pytest
+
+from utils.event_stream import RESYNC, EventBroker, SubscriberLimitError, sse_stream
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def drain(subscription):
+    events = []
+    while True:
+        event = await subscription.get(timeout=0.01)
+        if event is None:
+            return events
+        events.append(event)
+
+
+class TestReplay:
+    def test_reconnect_replays_missed_events(self):
+        broker = EventBroker()
+        for number in range(3):
+            broker.publish('download.saved', {'n': number})
+
+        async def scenario():
+            return await drain(broker.subscribe(last_event_id=1))
+
+        assert [event.id for event in run(scenario())] == [2, 3]
+
+    def test_replay_respects_the_type_filter(self):
+        broker = EventBroker()
+        broker.publish('download.saved')
+        broker.publish('extraction.finished')
+        broker.publish('download.saved')
+
+        async def scenario():
+            return await drain(broker.subscribe(['extraction'], last_event_id=0))
+
+        assert [event.type for event in run(scenario())] == ['extraction.finished']
+
+    def test_evicted_events_cause_a_resync(self):
+        broker = EventBroker(replay_size=2)
+        for _ in range(5):
+            broker.publish('download.saved')
+
+        async def scenario():
+            return await drain(broker.subscribe(['extraction'], last_event_id=1))
+
+        events = run(scenario())
+        assert [event.type for event in events] == [RESYNC]
+        assert events[0].id == 5
+        assert events[0].data == {'reason': 'replay_unavailable'}
+
+    def test_id_from_before_a_restart_causes_a_resync(self):
+        broker = EventBroker()
+        broker.publish('download.saved')
+
+        async def scenario():
+            return await drain(broker.subscribe(last_event_id=99))
+
+        assert [event.type for event in run(scenario())] == [RESYNC]
+
+    def test_up_to_date_client_gets_nothing(self):
+        broker = EventBroker()
+        broker.publish('download.saved')
+
+        async def scenario():
+            return await drain(broker.subscribe(last_event_id=1))
+
+        assert run(scenario()) == []
+
+
+class TestDelivery:
+    def test_slow_consumer_backlog_is_coalesced_into_a_resync(self):
+        broker = EventBroker(queue_size=2)
+
+        async def scenario():
+            subscription = broker.subscribe()
+            for _ in range(3):
+                broker.publish('download.saved')
+            return subscription, await drain(subscription)
+
+        subscription, events = run(scenario())
+        assert [event.type for event in events] == [RESYNC]
+        assert events[0].id == 3
+        assert events[0].data == {'reason': 'slow_consumer', 'dropped': 3}
+        assert subscription.dropped == 3
+
+    def test_subscriber_limit(self):
+        broker = EventBroker(max_subscribers=1)
+
+        async def scenario():
+            broker.subscribe()
+            with pytest.raises(SubscriberLimitError):
+                broker.check_capacity()
+            with pytest.raises(SubscriberLimitError):
+                broker.subscribe()
+
+        run(scenario())
+
+
+class TestSseStream:
+    def test_subscribes_only_while_iterated(self):
+        broker = EventBroker()
+
+        async def scenario():
+            stream = sse_stream(broker, heartbeat_seconds=0.01, retry_ms=3000)
+            counts = [broker.subscriber_count]
+            assert await stream.__anext__() == b'retry: 3000\n\n'
+            assert await stream.__anext__() == b': keepalive\n\n'
+            counts.append(broker.subscriber_count)
+            broker.publish('download.saved', {'path': 'a.pdf'})
+            frame = await stream.__anext__()
+            await stream.aclose()
+            counts.append(broker.subscriber_count)
+            return counts, frame
+
+        counts, frame = run(scenario())
+        assert counts == [0, 1, 0]
+        assert frame.startswith(b'id: 1\nevent: download.saved\ndata: ')
+
+    def test_ends_quietly_when_full(self):
+        broker = EventBroker(max_subscribers=0)
+
+        async def scenario():
+            return [frame async for frame in sse_stream(broker, heartbeat_seconds=0.01)]
+
+        assert run(scenario()) == []
@@ -0,0 +1,82 @@
+"""
+Mars AI Agents - Near-Duplicate Detection Tests
+"""
+
+import pytest
+
+from utils.near_duplicates import MinHasher, NearDuplicateIndex, estimate_similarity
+
+BODY = ' '.join(
+    f'line {i} widget assembly part {i * 7} delivered to warehouse {i % 5} unit price {i * 3}.50'
+    for i in range(30)
+)
+
+
+def invoice(invoice_number, order_number, body=BODY):
+    return f'ACME Supplies Ltd\nInvoice number {invoice_number}\nOrder {order_number}\n{body}'
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(str(tmp_path / 'near_duplicates.db'), num_perm=64, bands=16,
+                              threshold=0.8, min_shingles=20)
+
+
+class TestMinHash:
+    def test_signature_is_deterministic(self):
+        first, count = MinHasher(64).signature(BODY)
+        second, _ = MinHasher(64).signature(BODY)
+        assert first == second
+        assert len(first) == 64
+        assert count > 0
+
+    def test_similarity_follows_text_overlap(self):
+        hasher = MinHasher(128)
+        original, _ = hasher.signature(BODY)
+        edited, _ = hasher.signature(BODY.replace('line 29', 'row 29'))
+        unrelated, _ = hasher.signature(' '.join(f'word{i} other{i} text{i}' for i in range(60)))
+        assert estimate_similarity(original, edited) > 0.9
+        assert estimate_similarity(original, unrelated) < 0.1
+
+    def test_signatures_of_different_lengths_never_match(self):
+        assert estimate_similarity((1, 2, 3), (1, 2)) == 0.0
+        assert estimate_similarity((), ()) == 0.0
+
+
+class TestNearDuplicateIndex:
+    def test_num_perm_must_split_into_bands(self, tmp_path):
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(str(tmp_path / 'bad.db'), num_perm=100, bands=16)
+
+    def test_band_buckets_cover_each_band(self, index):
+        signature = index.signature(BODY)
+        buckets = index._band_buckets(signature)
+        assert [band for band, _ in buckets] == list(range(16))
+        # Changing one row only moves the bucket of the band it falls in
+        changed = (signature[0] + 1,) + signature[1:]
+        moved = [a != b for a, b in zip(buckets, index._band_buckets(changed))]
+        assert moved == [True] + [False] * 15
+
+    def test_finds_a_resent_document(self, index):
+        text = invoice('INV-1001', 'PO-55')
+        index.add('first.pdf', index.signature(text), 'INV-1001', 'PO-55')
+        resent = text + '\nPrinted again'
+        match = index.find_duplicate(index.signature(resent), resent)
+        assert match['path'] == 'first.pdf'
+        assert match['invoice_number'] == 'INV-1001'
+        assert match['similarity'] >= 0.8
+
+    def test_new_invoice_on_the_same_template_is_not_a_duplicate(self, index):
+        text = invoice('INV-1001', 'PO-55')
+        index.add('first.pdf', index.signature(text), 'INV-1001', 'PO-55')
+        new = invoice('INV-1002', 'PO-55')
+        assert index.find_duplicate(index.signature(new), new) is None
+
+    def test_document_is_not_its_own_duplicate(self, index):
+        text = invoice('INV-1001', 'PO-55')
+        signature = index.signature(text)
+        index.add('first.pdf', signature, 'INV-1001', 'PO-55')
+        assert index.find_duplicate(signature, text, exclude_path='first.pdf') is None
+
+    def test_short_texts_get_no_signature(self, index):
+        assert index.signature('Invoice INV-1 total 5') is None
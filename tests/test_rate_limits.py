@@ -0,0 +1,118 @@
+"""
+Mars AI Agents - Rate Limit Tests
+
+Gmail quota token bucket and the model gateway's sliding-window budgets.
+"""
+
+import pytest
+
+from orchestrator.model_gateway import SlidingWindowBudget
+from utils import gmail_quota
+from utils.gmail_quota import QuotaTokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(gmail_quota.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(gmail_quota.time, 'sleep', fake.sleep)
+    return fake
+
+
+class TestQuotaTokenBucket:
+    def test_spends_the_burst_then_waits_for_refill(self, clock):
+        bucket = QuotaTokenBucket(units_per_second=10, burst=10)
+        assert bucket._reserve(10) == 0.0
+        assert bucket._reserve(5) == pytest.approx(0.5)
+        clock.now += 0.5
+        assert bucket._reserve(5) == 0.0
+
+    def test_refill_is_capped_at_capacity(self, clock):
+        bucket = QuotaTokenBucket(units_per_second=10, burst=20)
+        clock.now += 60
+        assert bucket._reserve(20) == 0.0
+        assert bucket._reserve(1) == pytest.approx(0.1)
+
+    def test_acquire_sleeps_until_units_are_available(self, clock):
+        bucket = QuotaTokenBucket(units_per_second=10, burst=10)
+        bucket.acquire(10)
+        start = clock.now
+        bucket.acquire(5)
+        assert clock.now - start == pytest.approx(0.5)
+
+    def test_acquire_caps_requests_larger_than_the_bucket(self, clock):
+        bucket = QuotaTokenBucket(units_per_second=10, burst=10)
+        start = clock.now
+        bucket.acquire(100)
+        assert clock.now == start
+
+    def test_pause_blocks_every_caller(self, clock):
+        bucket = QuotaTokenBucket(units_per_second=10, burst=10)
+        bucket.pause(2)
+        assert bucket._reserve(1) == pytest.approx(2.0)
+        clock.now += 2
+        # The pause also emptied the bucket, so the units still have to refill
+        assert bucket._reserve(10) == 0.0
+
+    def test_rate_halves_on_rate_limit_and_recovers_on_success(self, clock):
+        bucket = QuotaTokenBucket(units_per_second=100, min_units_per_second=30)
+        bucket.on_rate_limited()
+        assert bucket.rate == 50
+        bucket.on_rate_limited()
+        assert bucket.rate == 30
+        bucket.on_success()
+        assert bucket.rate == 31
+        for _ in range(200):
+            bucket.on_success()
+        assert bucket.rate == 100
+
+
+class TestSlidingWindowBudget:
+    def test_allows_usage_within_the_budget(self):
+        budget = SlidingWindowBudget(10)
+        budget.record(6, now=0)
+        assert budget.wait_time(4, now=1) == 0.0
+
+    def test_waits_until_enough_usage_leaves_the_window(self):
+        budget = SlidingWindowBudget(10)
+        budget.record(3, now=0)
+        budget.record(6, now=20)
+        # One unit too many: the first entry has to expire (at t=60)
+        assert budget.wait_time(2, now=30) == pytest.approx(30.0)
+        # Four too many: the second entry has to expire as well (at t=80)
+        assert budget.wait_time(5, now=30) == pytest.approx(50.0)
+
+    def test_usage_expires_after_the_window(self):
+        budget = SlidingWindowBudget(10)
+        budget.record(10, now=0)
+        assert budget.wait_time(10, now=60) == 0.0
+
+    def test_oversized_call_passes_on_an_empty_window(self):
+        budget = SlidingWindowBudget(10)
+        assert budget.wait_time(50, now=0) == 0.0
+        budget.record(50, now=0)
+        assert budget.wait_time(1, now=1) == pytest.approx(59.0)
+
+    def test_adjust_replaces_a_reservation_with_real_usage(self):
+        budget = SlidingWindowBudget(10)
+        entry = budget.record(8, now=0)
+        budget.adjust(entry, 2, now=1)
+        assert budget.wait_time(8, now=1) == 0.0
+
+    def test_adjust_ignores_entries_that_already_expired(self):
+        budget = SlidingWindowBudget(10)
+        entry = budget.record(8, now=0)
+        budget.adjust(entry, 2, now=61)
+        budget.record(10, now=61)
+        assert budget.wait_time(1, now=62) == pytest.approx(59.0)
@@ -5,9 +5,22 @@ This package contains utility functions and helper modules for the Mars AI Agent
 
 Modules:
     - file_utils: File handling and manipulation utilities
-    - email_utils: Email processing utilities  
+    - email_utils: Attachment filter rules for Gmail ingestion
     - auth_utils: Authentication and authorization utilities
-    - logging_utils: Logging configuration and utilities
+    - logging_utils: Queue-based structured (JSON) logging configuration
+    - preview_utils: Cached page-preview rendering for the document viewer
+    - document_serving: Range/ETag-aware document responses
+    - metrics: Prometheus-format metrics registry
+    - tracing: Per-request span trees, OTLP export and request profiling
+    - gmail_quota: Gmail quota-unit token bucket and rate-limit backoff
+    - gmail_transport: Pooled async (httpx) client for the Gmail REST endpoints
+    - search_index: SQLite/FTS5 search over extracted fields and email metadata
+    - near_duplicates: MinHash/LSH detection of re-sent documents
+    - layout_templates: Per-vendor field coordinates learned from confirmed extractions
+    - pdf_triage: Per-page document triage (extract, OCR queue, reject)
+    - mailbox_registry: Mailboxes to ingest from and their processing checkpoints
+    - event_stream: Publish/subscribe behind the server-sent event endpoint
+    - sqlite_store: Per-thread SQLite connections and lazily built shared stores
 """
 
 __version__ = "0.1.0"
@@ -25,6 +38,22 @@ def get_utils_info():
         'description': 'Mars AI Agents utility functions package',
         'available_modules': [
             # Add module names as they are created
+            'file_utils',
+            'email_utils',
+            'preview_utils',
+            'document_serving',
+            'metrics',
+            'tracing',
+            'gmail_quota',
+            'gmail_transport',
+            'logging_utils',
+            'search_index',
+            'near_duplicates',
+            'layout_templates',
+            'pdf_triage',
+            'mailbox_registry',
+            'event_stream',
+            'sqlite_store',
         ]
     }
 
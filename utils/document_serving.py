@@ -0,0 +1,82 @@
+"""
+Mars AI Agents - Document Serving Utilities
+HTTP responses for downloaded documents with Range support, strong
+content-hash ETags and immutable caching. Bodies are plain FileResponses:
+Starlette handles Range/If-Range and sends http.response.pathsend when the
+server supports it.
+"""
+
+import os
+from typing import Optional
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from utils.file_utils import file_content_hash
+from utils.metrics import CACHE_REQUESTS
+
+# Cache policy for URLs that embed the content hash (never change)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Cache policy for name-based URLs (always revalidate, usually a 304)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against a strong ETag
+
+    Args:
+        if_none_match: Raw If-None-Match header value
+        etag: Quoted ETag of the current representation
+
+    Returns:
+        True if the client's cached copy is still current
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison is correct for If-None-Match (RFC 9110 13.1.2)
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def serve_document(request: Request, document_path: str,
+                         content_hash: Optional[str] = None,
+                         immutable: bool = False) -> Response:
+    """
+    Build the response for a document request
+
+    Args:
+        request: Incoming request (for conditional and Range headers)
+        document_path: Path of the document on disk
+        content_hash: Precomputed content hash, if already known
+        immutable: Whether the URL is content-addressed and can be cached forever
+
+    Returns:
+        304, 200 or 206 response for the document
+    """
+    if content_hash is None:
+        content_hash = await anyio.to_thread.run_sync(file_content_hash, document_path)
+
+    etag = f'"{content_hash}"'
+    headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        CACHE_REQUESTS.labels(cache='document_etag', result='hit').inc()
+        return Response(status_code=304, headers=headers)
+    CACHE_REQUESTS.labels(cache='document_etag', result='miss').inc()
+
+    stat_result = await anyio.to_thread.run_sync(os.stat, document_path)
+    return FileResponse(document_path, headers=headers, stat_result=stat_result)
+
+
+__all__ = [
+    'IMMUTABLE_CACHE_CONTROL',
+    'REVALIDATE_CACHE_CONTROL',
+    'etag_matches',
+    'serve_document'
+]
@@ -0,0 +1,149 @@
+"""
+Mars AI Agents - Email Utilities
+Attachment filter rules, applied to the Gmail search query where Gmail
+supports them and to message part metadata before any download
+"""
+
+import fnmatch
+import logging
+import os
+import re
+from email.utils import getaddresses
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import get_attachment_filter_config
+
+logger = logging.getLogger(__name__)
+
+# Gmail search terms only accept plain tokens; anything else is left to the part check
+_QUERY_TOKEN = re.compile(r'^[A-Za-z0-9@._+-]+$')
+
+
+def _normalize_extension(extension: str) -> str:
+    extension = extension.strip().lower()
+    return extension if extension.startswith('.') else f'.{extension}'
+
+
+def sender_address(from_header: str) -> str:
+    """Lower-cased email address of a From header ('' if there is none)"""
+    addresses = [address for _, address in getaddresses([from_header or '']) if address]
+    return addresses[0].lower() if addresses else ''
+
+
+class AttachmentFilter:
+    """
+    Rules deciding which attachments are worth downloading
+
+    Every non-empty rule must pass. Extensions, the minimum size and the
+    sender allowlist are pushed into the Gmail search query so non-matching
+    messages are never listed; all rules are checked again against part
+    metadata (filename, mimeType, body.size) before `attachments.get`.
+    The maximum size is not pushed: Gmail's `smaller:` applies to the
+    whole message, which would drop a small invoice sent alongside a
+    large attachment.
+    """
+
+    def __init__(self, extensions: Iterable[str] = (), mime_types: Iterable[str] = (),
+                 filename_patterns: Iterable[str] = (), exclude_filename_patterns: Iterable[str] = (),
+                 min_size_bytes: int = 0, max_size_bytes: Optional[int] = None,
+                 sender_allowlist: Iterable[str] = ()):
+        """
+        Build the rules
+
+        Args:
+            extensions: Allowed filename extensions, e.g. ['.pdf']
+            mime_types: Allowed part MIME types
+            filename_patterns: Glob patterns, at least one of which the filename must match
+            exclude_filename_patterns: Glob patterns the filename must not match
+            min_size_bytes: Smallest attachment to download
+            max_size_bytes: Largest attachment to download (None: no limit)
+            sender_allowlist: Allowed sender addresses or '@domain' suffixes
+        """
+        self.extensions = [_normalize_extension(e) for e in extensions if e.strip()]
+        self.mime_types = [m.strip().lower() for m in mime_types if m.strip()]
+        self.filename_patterns = [p.lower() for p in filename_patterns]
+        self.exclude_filename_patterns = [p.lower() for p in exclude_filename_patterns]
+        self.min_size_bytes = int(min_size_bytes or 0)
+        self.max_size_bytes = int(max_size_bytes) if max_size_bytes else None
+        self.sender_allowlist = [s.strip().lower() for s in sender_allowlist if s.strip()]
+
+    @classmethod
+    def from_config(cls, overrides: Optional[Dict[str, Any]] = None) -> 'AttachmentFilter':
+        """
+        Build the filter from the attachments configuration
+
+        Args:
+            overrides: Per-mailbox settings replacing the configured ones
+
+        Returns:
+            AttachmentFilter
+        """
+        settings = get_attachment_filter_config()
+        settings.update(overrides or {})
+        return cls(**settings)
+
+    def gmail_query_terms(self) -> List[str]:
+        """
+        Search terms implementing the rules Gmail can evaluate
+
+        Returns:
+            Terms to append to a messages.list query
+        """
+        terms = []
+        extensions = [e[1:] for e in self.extensions if _QUERY_TOKEN.match(e[1:])]
+        if extensions and len(extensions) == len(self.extensions):
+            alternatives = [f'filename:{e}' for e in extensions]
+            terms.append(alternatives[0] if len(alternatives) == 1 else '{' + ' '.join(alternatives) + '}')
+        if self.min_size_bytes:
+            # A message is at least as large as any of its attachments
+            terms.append(f'larger:{self.min_size_bytes}')
+        senders = [s for s in self.sender_allowlist if _QUERY_TOKEN.match(s)]
+        if senders and len(senders) == len(self.sender_allowlist):
+            alternatives = [f'from:{s}' for s in senders]
+            terms.append(alternatives[0] if len(alternatives) == 1 else '{' + ' '.join(alternatives) + '}')
+        return terms
+
+    def allows_sender(self, from_header: str) -> bool:
+        """Whether a message's sender passes the allowlist"""
+        if not self.sender_allowlist:
+            return True
+        address = sender_address(from_header)
+        return any(
+            address.endswith(entry) if entry.startswith('@') else address == entry
+            for entry in self.sender_allowlist
+        )
+
+    def rejection_reason(self, part: Dict[str, Any]) -> Optional[str]:
+        """
+        Check an attachment part against the rules using its metadata only
+
+        Args:
+            part: Gmail message part with filename, mimeType and body.size
+
+        Returns:
+            None if the attachment should be downloaded, otherwise the reason
+            ('extension', 'mime_type', 'filename', 'too_small', 'too_large');
+            sender rejections are reported by the caller as 'sender'
+        """
+        filename = (part.get('filename') or '').lower()
+        if self.extensions and os.path.splitext(filename)[1] not in self.extensions:
+            return 'extension'
+        if self.mime_types and (part.get('mimeType') or '').lower() not in self.mime_types:
+            return 'mime_type'
+        if self.filename_patterns and not any(fnmatch.fnmatchcase(filename, p) for p in self.filename_patterns):
+            return 'filename'
+        if any(fnmatch.fnmatchcase(filename, p) for p in self.exclude_filename_patterns):
+            return 'filename'
+        size = part.get('body', {}).get('size')
+        if size is not None:
+            if size < self.min_size_bytes:
+                return 'too_small'
+            if self.max_size_bytes and size > self.max_size_bytes:
+                return 'too_large'
+        return None
+
+
+__all__ = [
+    'AttachmentFilter',
+    'sender_address'
+]
@@ -0,0 +1,317 @@
+"""
+Mars AI Agents - Event Stream
+In-process publish/subscribe behind the server-sent event endpoint
+(/api/events). Publishers never block: every subscriber has a bounded
+queue, and a subscriber that falls behind has its backlog replaced by a
+single 'resync' event telling the client to reload its state.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence
+
+from config import get_events_config
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PUBLISHED = Counter(
+    'mars_events_published',
+    'Events published to the event stream, by type',
+    ['type']
+)
+
+EVENTS_DROPPED = Counter(
+    'mars_events_dropped',
+    'Events discarded for subscribers that fell behind (replaced by a resync)'
+)
+
+EVENT_SUBSCRIBERS = Gauge(
+    'mars_event_subscribers',
+    'Clients connected to the event stream'
+)
+
+# Sent instead of events a subscriber missed; the client should reload
+RESYNC = 'resync'
+
+
+class SubscriberLimitError(RuntimeError):
+    """Raised when the event stream already has its maximum number of clients"""
+
+
+class Event:
+    """A published event; its SSE encoding is built once and shared by all subscribers"""
+
+    __slots__ = ('id', 'type', 'data', 'timestamp', '_encoded')
+
+    def __init__(self, event_id: int, event_type: str, data: Dict[str, Any], timestamp: Optional[float] = None):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._encoded: Optional[bytes] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'type': self.type, 'timestamp': self.timestamp, 'data': self.data}
+
+    def encode(self) -> bytes:
+        """The event as a server-sent event frame"""
+        if self._encoded is None:
+            payload = json.dumps(self.to_dict(), default=str)
+            self._encoded = f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n".encode()
+        return self._encoded
+
+
+class Subscription:
+    """One client's view of the stream; consumed on the event loop that created it"""
+
+    def __init__(self, broker: 'EventBroker', loop: asyncio.AbstractEventLoop,
+                 queue_size: int, types: Optional[Sequence[str]] = None):
+        self.broker = broker
+        self.loop = loop
+        self.queue_size = max(1, queue_size)
+        # Type prefixes ('extraction' matches 'extraction.finished'); None: everything
+        self.types = tuple(types) if types else None
+        self.dropped = 0
+        self.closed = False
+        self._queue: Deque[Event] = deque()
+        self._ready = asyncio.Event()
+
+    def matches(self, event: Event) -> bool:
+        if self.types is None or event.type == RESYNC:
+            return True
+        return any(event.type == prefix or event.type.startswith(prefix + '.') for prefix in self.types)
+
+    def _offer(self, event: Event):
+        """Queue an event (on the subscriber's loop), coalescing the backlog if full"""
+        if self.closed:
+            return
+        if len(self._queue) >= self.queue_size:
+            discarded = sum(1 for queued in self._queue if queued.type != RESYNC) + 1
+            self.dropped += discarded
+            EVENTS_DROPPED.inc(discarded)
+            self._queue.clear()
+            # Carries the latest ID, so a reconnect continues from here
+            self._queue.append(Event(event.id, RESYNC, {'reason': 'slow_consumer', 'dropped': discarded}))
+        else:
+            self._queue.append(event)
+        self._ready.set()
+
+    def deliver(self, event: Event, on_loop: bool = False):
+        """Hand an event to this subscriber from any thread"""
+        if on_loop:
+            self._offer(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            # The loop has shut down; the client is gone
+            self.close()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Next event for this subscriber
+
+        Args:
+            timeout: Seconds to wait for one
+
+        Returns:
+            The event, or None if none arrived within the timeout
+        """
+        if not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._queue.popleft() if self._queue else None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fans published events out to subscribers and keeps recent ones for reconnects"""
+
+    def __init__(self, queue_size: int = 256, replay_size: int = 1000, max_subscribers: int = 200):
+        """
+        Initialize the broker
+
+        Args:
+            queue_size: Events buffered per subscriber before it is told to resync
+            replay_size: Recent events kept for clients reconnecting with Last-Event-ID
+            max_subscribers: Clients allowed at once
+        """
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._recent: Deque[Event] = deque(maxlen=max(1, replay_size))
+        self._subscribers: List[Subscription] = []
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_id
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None) -> Event:
+        """
+        Publish an event; safe to call from any thread and never blocks on clients
+
+        Args:
+            event_type: Dotted type, e.g. 'extraction.finished'
+            data: JSON-serialisable payload
+
+        Returns:
+            The published event
+        """
+        with self._lock:
+            event = Event(next(self._ids), event_type, data or {})
+            self._last_id = event.id
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        EVENTS_PUBLISHED.labels(type=event_type).inc()
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        for subscriber in subscribers:
+            if subscriber.matches(event):
+                subscriber.deliver(event, on_loop=subscriber.loop is running_loop)
+        return event
+
+    def check_capacity(self):
+        """
+        Fail early if a new subscriber would be refused
+
+        Raises:
+            SubscriberLimitError: The broker already has max_subscribers clients
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            raise SubscriberLimitError(f"Event stream is limited to {self.max_subscribers} clients")
+
+    def subscribe(self, types: Optional[Sequence[str]] = None,
+                  last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Add a subscriber (call from the event loop that will consume it)
+
+        Args:
+            types: Event type prefixes to receive (None: all)
+            last_event_id: Last event the client saw; newer recent events are
+                replayed, or a resync is queued if they are no longer kept
+
+        Returns:
+            The subscription
+
+        Raises:
+            SubscriberLimitError: The broker already has max_subscribers clients
+        """
+        subscription = Subscription(self, asyncio.get_running_loop(), self.queue_size, types)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise SubscriberLimitError(f"Event stream is limited to {self.max_subscribers} clients")
+            self._subscribers.append(subscription)
+            # Registered under the lock, so every event is either replayed or delivered
+            if last_event_id is not None and last_event_id != self._last_id:
+                oldest = self._recent[0].id if self._recent else self._last_id + 1
+                missed = [event for event in self._recent if event.id > last_event_id]
+                if last_event_id > self._last_id or oldest > last_event_id + 1:
+                    # Events were evicted, or the server restarted since
+                    subscription._offer(Event(self._last_id, RESYNC, {'reason': 'replay_unavailable'}))
+                else:
+                    for event in missed:
+                        if subscription.matches(event):
+                            subscription._offer(event)
+        EVENT_SUBSCRIBERS.labels().inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.remove(subscription)
+        EVENT_SUBSCRIBERS.labels().dec()
+
+
+async def sse_stream(broker: EventBroker, types: Optional[Sequence[str]] = None,
+                     last_event_id: Optional[int] = None, heartbeat_seconds: float = 15,
+                     retry_ms: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Server-sent event frames for a new subscription, with keep-alive comments
+
+    The subscription is made when the stream starts and closed when it ends
+    (client disconnect), so a response that is never iterated holds none.
+    Check broker.check_capacity() first to refuse clients with a status code.
+
+    Args:
+        broker: Broker to subscribe to
+        types: Event type prefixes to receive (None: all)
+        last_event_id: Last event the client saw (see EventBroker.subscribe)
+        heartbeat_seconds: Idle time before a keep-alive comment is sent
+        retry_ms: Reconnect delay advertised to the browser
+
+    Yields:
+        Encoded SSE frames
+    """
+    if retry_ms:
+        yield f"retry: {int(retry_ms)}\n\n".encode()
+    try:
+        subscription = broker.subscribe(types, last_event_id)
+    except SubscriberLimitError as e:
+        # Filled up since the capacity check; the browser reconnects after retry_ms
+        logger.warning("Closing event stream: %s", e)
+        return
+    try:
+        while not subscription.closed:
+            event = await subscription.get(heartbeat_seconds)
+            yield event.encode() if event is not None else b": keepalive\n\n"
+    finally:
+        subscription.close()
+
+
+_event_broker: Optional[EventBroker] = None
+_event_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> EventBroker:
+    """Get the shared event broker built from the events configuration"""
+    global _event_broker
+    with _event_broker_lock:
+        if _event_broker is None:
+            settings = get_events_config()
+            _event_broker = EventBroker(settings['queue_size'], settings['replay_size'],
+                                        settings['max_subscribers'])
+        return _event_broker
+
+
+def publish_event(event_type: str, data: Optional[Dict[str, Any]] = None) -> Optional[Event]:
+    """Publish to the shared broker; notifications never fail the caller"""
+    try:
+        return get_event_broker().publish(event_type, data)
+    except Exception:
+        logger.warning("Could not publish %s event", event_type, exc_info=True)
+        return None
+
+
+__all__ = [
+    'RESYNC',
+    'Event',
+    'EventBroker',
+    'SubscriberLimitError',
+    'Subscription',
+    'get_event_broker',
+    'publish_event',
+    'sse_stream'
+]
@@ -0,0 +1,76 @@
+"""
+Mars AI Agents - File Utilities
+Helpers for hashing and locating downloaded documents
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Tuple
+
+# Read size used when hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (absolute path) -> ((size, mtime_ns), sha256 hex digest)
+_hash_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_hash_cache_lock = threading.Lock()
+
+
+def file_content_hash(file_path: str) -> str:
+    """
+    Get the SHA-256 content hash of a file
+
+    The digest is memoised per path and only recomputed when the file's
+    size or modification time changes.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Hex-encoded SHA-256 digest of the file contents
+    """
+    abs_path = os.path.abspath(file_path)
+    stat = os.stat(abs_path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+
+    with _hash_cache_lock:
+        cached = _hash_cache.get(abs_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(abs_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with _hash_cache_lock:
+        _hash_cache[abs_path] = (signature, content_hash)
+    return content_hash
+
+
+def resolve_document_path(data_folder: str, document_name: str) -> str:
+    """
+    Resolve a document name to a path inside the data folder
+
+    Args:
+        data_folder: Folder that holds downloaded documents
+        document_name: Document name (or path relative to the data folder)
+
+    Returns:
+        Absolute path of the document
+
+    Raises:
+        ValueError: If the name points outside the data folder
+    """
+    root = os.path.realpath(data_folder)
+    path = os.path.realpath(os.path.join(root, document_name))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"Invalid document name: {document_name}")
+    return path
+
+
+__all__ = [
+    'file_content_hash',
+    'resolve_document_path'
+]
@@ -0,0 +1,316 @@
+"""
+Mars AI Agents - Gmail Quota Utilities
+Shared token bucket counted in Gmail quota units, with adaptive
+exponential backoff for rate-limit errors
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from googleapiclient.errors import HttpError
+
+from config import get_gmail_config
+from utils.metrics import Counter
+from utils.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Quota units charged per Gmail API method
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_QUOTA_UNITS = {
+    'users.getProfile': 1,
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.attachments.get': 5,
+    'history.list': 2,
+}
+
+# Error reasons Gmail uses for quota and rate limiting
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded'}
+
+# Transient server-side statuses that are safe to retry
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+GMAIL_RETRIES = Counter(
+    'mars_gmail_retries',
+    'Gmail API calls retried after a rate-limit or transient error',
+    ['method', 'reason']
+)
+
+
+class QuotaTokenBucket:
+    """
+    Thread-safe token bucket counted in Gmail quota units
+
+    The refill rate adapts: it is halved whenever Gmail reports a rate-limit
+    error and creeps back up towards the configured maximum on success.
+    A Retry-After (or backoff delay) pauses every caller sharing the bucket.
+    """
+
+    def __init__(self, units_per_second: float = 250, burst: Optional[float] = None,
+                 min_units_per_second: float = 10):
+        """
+        Initialize the bucket
+
+        Args:
+            units_per_second: Maximum sustained quota units per second
+            burst: Bucket capacity (defaults to one second of quota)
+            min_units_per_second: Floor for the adaptive refill rate
+        """
+        self.max_rate = float(units_per_second)
+        self.min_rate = float(min(min_units_per_second, units_per_second))
+        self.rate = self.max_rate
+        self.capacity = float(burst or units_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def _reserve(self, units: float) -> float:
+        """Take the units if they are available, else return the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= units:
+                self._tokens -= units
+                return 0.0
+            return (units - self._tokens) / self.rate
+
+    def acquire(self, units: float):
+        """
+        Block until the requested number of quota units is available
+
+        Args:
+            units: Quota units the call will consume
+        """
+        units = min(units, self.capacity)
+        while True:
+            wait = self._reserve(units)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, units: float):
+        """
+        Wait (without blocking the event loop) until the quota units are available
+
+        Args:
+            units: Quota units the call will consume
+        """
+        units = min(units, self.capacity)
+        while True:
+            wait = self._reserve(units)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out quota to every caller for a while"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def on_rate_limited(self):
+        """Multiplicative decrease of the refill rate"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self):
+        """Additive increase of the refill rate back towards the maximum"""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+
+
+_buckets: Dict[str, QuotaTokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_quota_bucket(user: str = 'me', units_per_second: Optional[float] = None) -> QuotaTokenBucket:
+    """
+    Get the quota bucket shared by every Gmail call for a user
+
+    Buckets live in the process, so each ingestion worker process has
+    its own budget for the mailboxes it handles.
+
+    Args:
+        user: Mailbox the quota is counted against
+        units_per_second: Budget used if the bucket doesn't exist yet
+                          (defaults to the gmail config)
+
+    Returns:
+        The shared bucket for the user
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(user)
+        if bucket is None:
+            settings = get_gmail_config()
+            bucket = QuotaTokenBucket(units_per_second or settings.get('quota_units_per_second', 250))
+            _buckets[user] = bucket
+        return bucket
+
+
+def _error_reason(error: HttpError) -> str:
+    """Extract the Gmail error reason (e.g. 'userRateLimitExceeded')"""
+    details = getattr(error, 'error_details', None)
+    if isinstance(details, list):
+        for detail in details:
+            if isinstance(detail, dict) and detail.get('reason'):
+                return detail['reason']
+    try:
+        payload = json.loads(error.content.decode('utf-8'))
+        errors = payload.get('error', {}).get('errors', [])
+        if errors:
+            return errors[0].get('reason', '')
+    except (ValueError, AttributeError):
+        pass
+    return ''
+
+
+def _retry_after(error: HttpError) -> Optional[float]:
+    """Read the Retry-After header (in seconds) from an error response"""
+    value = error.resp.get('retry-after') if error.resp is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def is_rate_limit_error(error: HttpError) -> bool:
+    """Whether an HttpError is a Gmail rate-limit or quota error"""
+    status = error.resp.status if error.resp is not None else None
+    return status == 429 or (status == 403 and _error_reason(error) in RATE_LIMIT_REASONS)
+
+
+def _retry_delay(error: HttpError, method: str, attempt: int, bucket: QuotaTokenBucket,
+                 settings: Dict[str, Any]) -> Optional[float]:
+    """
+    Decide whether a failed Gmail call is retried
+
+    Args:
+        error: The error the call raised
+        method: Gmail method name
+        attempt: Retries made so far
+        bucket: The user's quota bucket (paused and slowed on rate limits)
+        settings: Gmail configuration
+
+    Returns:
+        Seconds to wait before the retry, or None to give up
+    """
+    status = error.resp.status if error.resp is not None else None
+    rate_limited = is_rate_limit_error(error)
+    max_retries = settings.get('max_retries', 6)
+    if not (rate_limited or status in RETRYABLE_STATUSES) or attempt >= max_retries:
+        return None
+
+    delay = _retry_after(error)
+    if delay is None:
+        base_delay = settings.get('backoff_base_seconds', 1.0)
+        max_delay = settings.get('backoff_max_seconds', 64.0)
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    if rate_limited:
+        bucket.on_rate_limited()
+        bucket.pause(delay)
+
+    reason = _error_reason(error) or str(status)
+    GMAIL_RETRIES.labels(method=method, reason=reason).inc()
+    current_span().set_attribute('gmail.retries', attempt + 1)
+    logger.warning("Gmail %s failed (%s), retrying in %.1fs (attempt %d/%d)",
+                   method, reason, delay, attempt + 1, max_retries)
+    return delay
+
+
+def execute_gmail(request: Any, method: str, user: str = 'me') -> Dict[str, Any]:
+    """
+    Execute a Gmail API request under the user's quota bucket
+
+    Rate-limit (429, 403 rate/quota reasons) and transient 5xx errors are
+    retried with full-jitter exponential backoff, honouring Retry-After.
+
+    Args:
+        request: googleapiclient HttpRequest (not yet executed)
+        method: Gmail method name used for quota accounting
+        user: Mailbox the quota is counted against
+
+    Returns:
+        The API response
+
+    Raises:
+        HttpError: If the error is not retryable or retries are exhausted
+    """
+    settings = get_gmail_config()
+    bucket = get_quota_bucket(user)
+    units = GMAIL_QUOTA_UNITS.get(method, 5)
+
+    attempt = 0
+    while True:
+        bucket.acquire(units)
+        try:
+            response = request.execute()
+            bucket.on_success()
+            return response
+        except HttpError as error:
+            delay = _retry_delay(error, method, attempt, bucket, settings)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+
+
+async def execute_gmail_async(send: Callable[[], Awaitable[Dict[str, Any]]], method: str,
+                              user: str = 'me') -> Dict[str, Any]:
+    """
+    Async counterpart of execute_gmail, with the same quota and retry policy
+
+    Args:
+        send: Coroutine function making one attempt; raises HttpError on failure
+        method: Gmail method name used for quota accounting
+        user: Mailbox the quota is counted against
+
+    Returns:
+        The API response
+
+    Raises:
+        HttpError: If the error is not retryable or retries are exhausted
+    """
+    settings = get_gmail_config()
+    bucket = get_quota_bucket(user)
+    units = GMAIL_QUOTA_UNITS.get(method, 5)
+
+    attempt = 0
+    while True:
+        await bucket.acquire_async(units)
+        try:
+            response = await send()
+            bucket.on_success()
+            return response
+        except HttpError as error:
+            delay = _retry_delay(error, method, attempt, bucket, settings)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+__all__ = [
+    'GMAIL_QUOTA_UNITS',
+    'QuotaTokenBucket',
+    'execute_gmail',
+    'execute_gmail_async',
+    'get_quota_bucket',
+    'is_rate_limit_error'
+]
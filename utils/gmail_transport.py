@@ -0,0 +1,183 @@
+"""
+Mars AI Agents - Async Gmail Transport
+Asyncio client for the Gmail REST endpoints ingestion uses (profile,
+messages.list, messages.get, attachments.get, history.list). Requests share
+one pooled httpx client per mailbox, which opens at most max_connections
+keep-alive connections (20 by default) and queues further requests for them;
+with HTTP/2 (the h2 package) concurrent requests are multiplexed instead. Quota accounting and retries are the same as execute_gmail's.
+"""
+
+import asyncio
+import importlib.util
+import logging
+from typing import Any, Dict, Optional, Sequence
+from urllib.parse import quote
+
+import httplib2
+import httpx
+from googleapiclient.errors import HttpError
+
+from utils.gmail_quota import execute_gmail_async
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+GMAIL_API_URL = 'https://gmail.googleapis.com/gmail/v1/users'
+
+# Larger bodies (attachments, up to ~33 MB of base64) are parsed in a worker
+# thread instead of on the event loop
+INLINE_JSON_BYTES = 64 * 1024
+
+GMAIL_HTTP_REQUESTS = Counter(
+    'mars_gmail_http_requests',
+    'Gmail REST requests sent by the async transport, by method and HTTP version',
+    ['method', 'http_version']
+)
+
+
+def http2_available() -> bool:
+    """Whether httpx can negotiate HTTP/2 (needs the optional h2 package)"""
+    return importlib.util.find_spec('h2') is not None
+
+
+def _http_error(response: httpx.Response) -> HttpError:
+    """
+    Wrap an error response as googleapiclient's HttpError
+
+    Callers (and the shared retry policy) then handle errors from either
+    transport the same way.
+    """
+    info = {key: value for key, value in response.headers.items()}
+    info['status'] = str(response.status_code)
+    return HttpError(httplib2.Response(info), response.content, uri=str(response.request.url))
+
+
+class AsyncGmailTransport:
+    """Pooled async client for one mailbox's Gmail API calls"""
+
+    def __init__(self, credentials: Any = None, access_token: Optional[str] = None,
+                 quota_user: str = 'me', base_url: str = GMAIL_API_URL,
+                 max_connections: int = 20, http2: bool = True, timeout: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Initialize the client
+
+        Args:
+            credentials: google.oauth2 Credentials, refreshed when they expire
+            access_token: Fixed bearer token (used when there are no credentials)
+            quota_user: Mailbox the quota is counted against
+            base_url: Users collection URL of the Gmail API
+            max_connections: Connections kept open to Gmail
+            http2: Use HTTP/2 if the h2 package is installed
+            timeout: Connect/read/write timeout in seconds
+            transport: httpx transport override (e.g. ASGITransport for the fake server)
+        """
+        self.credentials = credentials
+        self.access_token = access_token
+        self.quota_user = quota_user
+        self.http2 = http2 and transport is None and http2_available()
+        self._refresh_lock = asyncio.Lock()
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=self.http2,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            # Waiting for a pooled connection is bounded by the caller's concurrency
+            timeout=httpx.Timeout(timeout, pool=None),
+            transport=transport
+        )
+
+    async def __aenter__(self) -> 'AsyncGmailTransport':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the pooled connections"""
+        await self._client.aclose()
+
+    async def _authorization(self, force_refresh: bool = False) -> str:
+        """Bearer header value, refreshing expired credentials off the event loop"""
+        if self.credentials is None:
+            return f"Bearer {self.access_token}"
+        if force_refresh or not self.credentials.valid:
+            stale_token = self.credentials.token
+            async with self._refresh_lock:
+                # Another request may have refreshed while this one waited
+                if self.credentials.token == stale_token or not self.credentials.valid:
+                    from google.auth.transport.requests import Request
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        return f"Bearer {self.credentials.token}"
+
+    async def _send(self, method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """One GET attempt; raises HttpError for error responses"""
+        response = await self._client.get(path, params=params,
+                                          headers={'Authorization': await self._authorization()})
+        if response.status_code == 401 and self.credentials is not None:
+            # Revoked or expired early: refresh once and try again
+            response = await self._client.get(path, params=params,
+                                              headers={'Authorization': await self._authorization(True)})
+        GMAIL_HTTP_REQUESTS.labels(method=method, http_version=response.http_version).inc()
+        if response.is_error:
+            raise _http_error(response)
+        if len(response.content) > INLINE_JSON_BYTES:
+            return await asyncio.to_thread(response.json)
+        return response.json()
+
+    async def request(self, method: str, path: str, **params: Any) -> Dict[str, Any]:
+        """
+        Call a Gmail endpoint under the mailbox's quota bucket
+
+        Args:
+            method: Gmail method name used for quota accounting
+            path: Path below the users collection, e.g. '/me/profile'
+            **params: Query parameters (None values are left out)
+
+        Returns:
+            The decoded JSON response
+
+        Raises:
+            HttpError: If the error is not retryable or retries are exhausted
+        """
+        query = {key: value for key, value in params.items() if value is not None}
+        return await execute_gmail_async(lambda: self._send(method, path, query), method, self.quota_user)
+
+    async def get_profile(self, user_id: str = 'me') -> Dict[str, Any]:
+        return await self.request('users.getProfile', f"/{quote(user_id)}/profile")
+
+    async def list_messages(self, q: Optional[str] = None, max_results: Optional[int] = None,
+                            page_token: Optional[str] = None, label_ids: Optional[Sequence[str]] = None,
+                            user_id: str = 'me') -> Dict[str, Any]:
+        return await self.request('messages.list', f"/{quote(user_id)}/messages", q=q,
+                                  maxResults=max_results, pageToken=page_token,
+                                  labelIds=list(label_ids) if label_ids else None)
+
+    async def get_message(self, message_id: str, format: Optional[str] = None,
+                          metadata_headers: Optional[Sequence[str]] = None,
+                          user_id: str = 'me') -> Dict[str, Any]:
+        return await self.request('messages.get', f"/{quote(user_id)}/messages/{quote(message_id, safe='')}",
+                                  format=format,
+                                  metadataHeaders=list(metadata_headers) if metadata_headers else None)
+
+    async def get_attachment(self, message_id: str, attachment_id: str, user_id: str = 'me') -> Dict[str, Any]:
+        return await self.request(
+            'messages.attachments.get',
+            f"/{quote(user_id)}/messages/{quote(message_id, safe='')}/attachments/{quote(attachment_id, safe='')}"
+        )
+
+    async def list_history(self, start_history_id: str, history_types: Optional[Sequence[str]] = None,
+                           label_id: Optional[str] = None, max_results: Optional[int] = None,
+                           page_token: Optional[str] = None, user_id: str = 'me') -> Dict[str, Any]:
+        return await self.request('history.list', f"/{quote(user_id)}/history",
+                                  startHistoryId=start_history_id,
+                                  historyTypes=list(history_types) if history_types else None,
+                                  labelId=label_id, maxResults=max_results, pageToken=page_token)
+
+
+__all__ = [
+    'GMAIL_API_URL',
+    'INLINE_JSON_BYTES',
+    'AsyncGmailTransport',
+    'http2_available'
+]
@@ -0,0 +1,459 @@
+"""
+Mars AI Agents - Vendor Layout Templates
+Per-vendor coordinate templates learned from confirmed extractions. Once a
+vendor's invoice has been extracted (by the model, or corrected by hand),
+the positions of its invoice and order numbers are remembered, and later
+invoices with the same layout are read straight from those coordinates
+with PyMuPDF, without a model call. A template only answers when every
+field still validates; otherwise the document goes to the model as usual.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import get_templates_config
+from utils.sqlite_store import SQLiteStore, SharedInstance
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('invoice_number', 'order_number')
+
+# Answers that mean the document has no such field
+_ABSENT_VALUES = {'', 'not found', 'n/a', 'none', 'null'}
+
+# Labels that could introduce a field. A template that learned a field as
+# absent only vouches for its absence while no such label is present.
+_FIELD_LABELS = {
+    'invoice_number': re.compile(r'\binv(?:oice)?\.?\s*(?:no\b|number|num\b|#)', re.IGNORECASE),
+    'order_number': re.compile(r'\b(?:order|p\.?\s*o\.?)\s*(?:no\b|number|num\b|#|id\b)|\bpurchase\s+order',
+                               re.IGNORECASE),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL,
+    layout_key TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    sender TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT 'extracted',
+    confirmations INTEGER NOT NULL DEFAULT 1,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    updated_at TEXT,
+    UNIQUE (fingerprint, layout_key)
+);
+CREATE TABLE IF NOT EXISTS template_documents (
+    path TEXT PRIMARY KEY,
+    template_id INTEGER NOT NULL,
+    invoice_number TEXT NOT NULL DEFAULT '',
+    order_number TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS template_sources (
+    template_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (template_id, path)
+);
+CREATE INDEX IF NOT EXISTS templates_fingerprint ON templates(fingerprint);
+"""
+
+# (x0, y0, x1, y1, text) of a PyMuPDF word
+Word = Tuple[float, float, float, float, str]
+
+
+def _compact(text: str) -> str:
+    return re.sub(r'\s+', '', text or '').upper()
+
+
+def is_absent(value: Optional[str]) -> bool:
+    """Whether an extracted value means 'not in the document'"""
+    return (value or '').strip().lower() in _ABSENT_VALUES
+
+
+def value_shape(value: str) -> str:
+    """
+    Character-class shape of a value, e.g. 'INV-2024-00123' -> 'A-9-9'
+
+    Later invoices from a vendor have different numbers in the same format,
+    so a value read from a template has to keep the learned shape.
+    """
+    shape = re.sub(r'[^\W\d_]+', 'A', re.sub(r'\d+', '9', value.strip()))
+    return re.sub(r'\s+', ' ', shape)
+
+
+class _DocumentWords:
+    """Words of an open PyMuPDF document, grouped into lines, read per page on demand"""
+
+    def __init__(self, doc: Any):
+        self.doc = doc
+        self._lines: Dict[int, List[List[Word]]] = {}
+        self._text: Optional[str] = None
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    def lines(self, page_number: int) -> List[List[Word]]:
+        """Lines of a page, top to bottom, each a list of words left to right"""
+        if page_number not in self._lines:
+            grouped: Dict[Tuple[int, int], List[Tuple[int, Word]]] = {}
+            for x0, y0, x1, y1, text, block, line, number in self.doc[page_number].get_text('words'):
+                grouped.setdefault((block, line), []).append((number, (x0, y0, x1, y1, text)))
+            lines = [[word for _, word in sorted(words)] for words in grouped.values()]
+            self._lines[page_number] = sorted(lines, key=lambda words: (words[0][1], words[0][0]))
+        return self._lines[page_number]
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = '\n'.join(' '.join(word[4] for word in line)
+                                   for page in range(self.page_count) for line in self.lines(page))
+        return self._text
+
+
+def _bbox(words: Sequence[Word]) -> List[float]:
+    return [round(min(w[0] for w in words), 1), round(min(w[1] for w in words), 1),
+            round(max(w[2] for w in words), 1), round(max(w[3] for w in words), 1)]
+
+
+def _center_in(word: Word, bbox: Sequence[float], tolerance: float) -> bool:
+    x, y = (word[0] + word[2]) / 2, (word[1] + word[3]) / 2
+    return bbox[0] - tolerance <= x <= bbox[2] + tolerance and bbox[1] - tolerance <= y <= bbox[3] + tolerance
+
+
+class LayoutTemplateStore(SQLiteStore):
+    """
+    Persistent store of per-vendor field coordinates
+
+    A vendor is recognised by a fingerprint of the static text at the top of
+    the first page (its name and letterhead). Each field of a template is the
+    bounding box of the value on its page, the label text in front of (or
+    above) it, and the value's shape. Reading validates all three.
+
+    A layout learned from one model answer is only a candidate: it answers
+    once min_confirmations different documents gave the same layout, or
+    after a manual save, so a single misread (e.g. a labelled decoy number)
+    isn't repeated for every later invoice of the vendor.
+    """
+
+    def __init__(self, db_path: str = '.cache/layout_templates.db', enabled: bool = True,
+                 max_per_vendor: int = 5, min_confirmations: int = 2, tolerance: float = 3.0,
+                 header_band: float = 0.15, max_anchor_words: int = 4):
+        """
+        Open (and create if needed) the store
+
+        Args:
+            db_path: SQLite database file
+            enabled: Whether templates are used and learned at all
+            max_per_vendor: Layouts kept per vendor fingerprint (least used are dropped)
+            min_confirmations: Documents that must confirm a learned layout before it
+                answers (manually saved layouts answer straight away)
+            tolerance: Allowed drift of a value or label position, in points
+            header_band: Top fraction of the first page used for the vendor fingerprint
+            max_anchor_words: Label words remembered in front of a value
+        """
+        self.enabled = enabled
+        self.max_per_vendor = max_per_vendor
+        self.min_confirmations = min_confirmations
+        self.tolerance = tolerance
+        self.header_band = header_band
+        self.max_anchor_words = max_anchor_words
+        super().__init__(db_path, _SCHEMA)
+
+    # Layout analysis ----------------------------------------------------------
+
+    def fingerprint(self, words: _DocumentWords) -> Optional[str]:
+        """Vendor fingerprint: the digit-free words in the top band of the first page"""
+        if not words.page_count:
+            return None
+        limit = words.doc[0].rect.height * self.header_band
+        header = {
+            re.sub(r'[^\w&]', '', word[4]).lower()
+            for line in words.lines(0) for word in line
+            if word[3] <= limit and not re.search(r'\d', word[4])
+        }
+        header.discard('')
+        if len(header) < 2:
+            return None
+        return hashlib.sha1(' '.join(sorted(header)).encode('utf-8')).hexdigest()[:16]
+
+    def _anchor(self, lines: List[List[Word]], line_index: int, start: int) -> Optional[List[Word]]:
+        """Label words of a value: static words in front of it, else the line just above"""
+        anchor: List[Word] = []
+        for word in reversed(lines[line_index][:start]):
+            if re.search(r'\d', word[4]) or len(anchor) == self.max_anchor_words:
+                break
+            anchor.insert(0, word)
+        if anchor:
+            return anchor
+        if start == 0 and line_index > 0:
+            first = lines[line_index][0]
+            above = lines[line_index - 1]
+            height = first[3] - first[1]
+            if (0 <= first[1] - above[0][3] <= height * 1.5 and not any(re.search(r'\d', w[4]) for w in above)
+                    and above[0][0] <= first[2] and above[-1][2] >= first[0]):
+                return above[:self.max_anchor_words]
+        return None
+
+    def _locate(self, words: _DocumentWords, value: str) -> Optional[Dict[str, Any]]:
+        """Find a value's words and label in the document (the first labelled occurrence)"""
+        target = _compact(value)
+        for page_number in range(words.page_count):
+            lines = words.lines(page_number)
+            for line_index, line in enumerate(lines):
+                for start in range(len(line)):
+                    joined = ''
+                    for end in range(start, len(line)):
+                        joined += _compact(line[end][4])
+                        if len(joined) >= len(target):
+                            break
+                    if joined != target:
+                        continue
+                    anchor = self._anchor(lines, line_index, start)
+                    if anchor is None:
+                        continue
+                    value_words = line[start:end + 1]
+                    return {
+                        'page': page_number,
+                        'bbox': _bbox(value_words),
+                        'words': len(value_words),
+                        'shape': value_shape(value),
+                        'anchor': ' '.join(word[4] for word in anchor),
+                        'anchor_bbox': _bbox(anchor),
+                    }
+        return None
+
+    def _read(self, words: _DocumentWords, region: Dict[str, Any]) -> Optional[str]:
+        """Read a field from its template region, or None if the region doesn't validate"""
+        if region['page'] >= words.page_count:
+            return None
+        tolerance = self.tolerance
+        lines = words.lines(region['page'])
+        anchor_words = [word for line in lines for word in line
+                        if _center_in(word, region['anchor_bbox'], tolerance)]
+        if _compact(' '.join(word[4] for word in anchor_words)) != _compact(region['anchor']):
+            return None
+
+        x0, y0 = region['bbox'][0], region['bbox'][1]
+        for line in lines:
+            for start, word in enumerate(line):
+                if abs(word[0] - x0) <= tolerance and abs(word[1] - y0) <= tolerance:
+                    value_words = line[start:start + region['words']]
+                    if len(value_words) < region['words']:
+                        return None
+                    value = ' '.join(w[4] for w in value_words)
+                    return value if value_shape(value) == region['shape'] else None
+        return None
+
+    # Reading and learning -----------------------------------------------------
+
+    def extract(self, path: str, text: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read a document's fields from a learned template of its vendor
+
+        Args:
+            path: PDF path
+            text: Document text, for the absent-field check (read from the PDF if None)
+
+        Returns:
+            {'invoice_number', 'order_number', 'template_id', 'fingerprint'},
+            or None if no template of the vendor validates
+        """
+        if not self.enabled:
+            return None
+        import pymupdf  # deferred so importing this module stays cheap
+
+        try:
+            with pymupdf.open(path) as doc:
+                words = _DocumentWords(doc)
+                fingerprint = self.fingerprint(words)
+                if fingerprint is None:
+                    return None
+                rows = self._connection().execute(
+                    "SELECT id, layout FROM templates WHERE fingerprint = ? "
+                    "AND (confirmations >= ? OR source = 'manual') "
+                    "ORDER BY confirmations + hits DESC, updated_at DESC", (fingerprint, self.min_confirmations)
+                ).fetchall()
+                for row in rows:
+                    values = self._apply(words, json.loads(row['layout']), text)
+                    if values is not None:
+                        self._record_hit(path, row['id'], values)
+                        return {**values, 'template_id': row['id'], 'fingerprint': fingerprint}
+        except Exception as e:
+            logger.warning("Could not apply layout templates to %s: %s", path, e)
+        return None
+
+    def _apply(self, words: _DocumentWords, layout: Dict[str, Any], text: Optional[str]) -> Optional[Dict[str, str]]:
+        values = {}
+        for field in FIELDS:
+            region = layout[field]
+            if region.get('absent'):
+                if _FIELD_LABELS[field].search(text if text is not None else words.text()):
+                    return None
+                values[field] = region['value']
+                continue
+            value = self._read(words, region)
+            if value is None:
+                return None
+            values[field] = value
+        return values
+
+    def _record_hit(self, path: str, template_id: int, values: Dict[str, str]):
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute('UPDATE templates SET hits = hits + 1 WHERE id = ?', (template_id,))
+                connection.execute(
+                    'INSERT OR REPLACE INTO template_documents (path, template_id, invoice_number, order_number) '
+                    'VALUES (?, ?, ?, ?)',
+                    (os.path.normpath(path), template_id, values['invoice_number'], values['order_number'])
+                )
+
+    def learn(self, path: str, invoice_number: str, order_number: str, source: str = 'extracted',
+              sender: str = '', text: Optional[str] = None) -> Optional[int]:
+        """
+        Learn (or confirm) the vendor's template from a confirmed extraction
+
+        Fields are located by their values in the PDF; if a present field
+        can't be found with a label, nothing is learned. Each document counts
+        as one confirmation of its layout, however often it is re-extracted.
+        If the document was
+        read from a template and these values differ, that template is
+        dropped, since it gave a wrong answer.
+
+        Args:
+            path: PDF path
+            invoice_number: Confirmed invoice number
+            order_number: Confirmed order number
+            source: 'extracted' for model output, 'manual' for user edits
+            sender: Email sender of the document, kept for reference
+            text: Document text (read from the PDF if None)
+
+        Returns:
+            ID of the learned template, or None
+        """
+        if not self.enabled:
+            return None
+        confirmed = {'invoice_number': invoice_number or '', 'order_number': order_number or ''}
+        self._forget_if_wrong(path, confirmed)
+        if all(is_absent(value) for value in confirmed.values()):
+            return None
+        import pymupdf
+
+        try:
+            with pymupdf.open(path) as doc:
+                words = _DocumentWords(doc)
+                fingerprint = self.fingerprint(words)
+                if fingerprint is None:
+                    return None
+                layout = {}
+                for field, value in confirmed.items():
+                    if is_absent(value):
+                        # A field the model missed can't be learned as absent
+                        if _FIELD_LABELS[field].search(text if text is not None else words.text()):
+                            return None
+                        layout[field] = {'absent': True, 'value': value}
+                        continue
+                    region = self._locate(words, value)
+                    if region is None:
+                        logger.debug("%s of %s not found in its layout, no template learned", field, path)
+                        return None
+                    layout[field] = region
+        except Exception as e:
+            logger.warning("Could not learn a layout template from %s: %s", path, e)
+            return None
+        return self._save(path, fingerprint, layout, source, sender)
+
+    def _save(self, path: str, fingerprint: str, layout: Dict[str, Any], source: str, sender: str) -> int:
+        # Positions rounded to the tolerance, so small drift confirms the same layout
+        grid = max(self.tolerance, 1.0)
+        canonical = {
+            field: region if region.get('absent') else {
+                'page': region['page'], 'anchor': _compact(region['anchor']), 'shape': region['shape'],
+                'at': [round(v / grid) for v in region['bbox'][:2]],
+            }
+            for field, region in layout.items()
+        }
+        layout_key = hashlib.sha1(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        now = datetime.now().isoformat()
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT INTO templates (fingerprint, layout_key, layout, sender, source, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(fingerprint, layout_key) DO UPDATE SET '
+                    'layout = excluded.layout, updated_at = excluded.updated_at, '
+                    "source = CASE WHEN source = 'manual' THEN source ELSE excluded.source END, "
+                    "sender = CASE WHEN excluded.sender != '' THEN excluded.sender ELSE sender END",
+                    (fingerprint, layout_key, json.dumps(layout), sender or '', source, now, now)
+                )
+                template_id = connection.execute(
+                    'SELECT id FROM templates WHERE fingerprint = ? AND layout_key = ?', (fingerprint, layout_key)
+                ).fetchone()['id']
+                connection.execute('INSERT OR IGNORE INTO template_sources (template_id, path) VALUES (?, ?)',
+                                   (template_id, os.path.normpath(path)))
+                connection.execute(
+                    'UPDATE templates SET confirmations = '
+                    '(SELECT COUNT(*) FROM template_sources WHERE template_id = ?) WHERE id = ?',
+                    (template_id, template_id)
+                )
+                stale = connection.execute(
+                    'SELECT id FROM templates WHERE fingerprint = ? '
+                    'ORDER BY confirmations + hits DESC, updated_at DESC LIMIT -1 OFFSET ?',
+                    (fingerprint, self.max_per_vendor)
+                ).fetchall()
+                self._delete(connection, [row['id'] for row in stale])
+        return template_id
+
+    def _forget_if_wrong(self, path: str, confirmed: Dict[str, str]):
+        """Drop the template a document was read from if its answer was corrected"""
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT template_id, invoice_number, order_number FROM template_documents WHERE path = ?',
+            (os.path.normpath(path),)
+        ).fetchone()
+        if row is None or all(_compact(row[field]) == _compact(confirmed[field]) for field in FIELDS):
+            return
+        logger.info("Template %d gave a corrected answer for %s, forgetting it", row['template_id'], path)
+        with self._write_lock:
+            with connection:
+                self._delete(connection, [row['template_id']])
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, template_ids: List[int]):
+        for template_id in template_ids:
+            connection.execute('DELETE FROM templates WHERE id = ?', (template_id,))
+            connection.execute('DELETE FROM template_documents WHERE template_id = ?', (template_id,))
+            connection.execute('DELETE FROM template_sources WHERE template_id = ?', (template_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of templates (and of those that answer), vendors, and how often templates answered"""
+        row = self._connection().execute(
+            "SELECT COUNT(*) AS templates, "
+            "COALESCE(SUM(confirmations >= ? OR source = 'manual'), 0) AS confirmed, "
+            "COUNT(DISTINCT fingerprint) AS vendors, COALESCE(SUM(hits), 0) AS hits, "
+            "COALESCE(SUM(confirmations), 0) AS confirmations FROM templates", (self.min_confirmations,)
+        ).fetchone()
+        return {'enabled': self.enabled, **dict(row)}
+
+
+_template_store: SharedInstance[LayoutTemplateStore] = SharedInstance(lambda: LayoutTemplateStore(**get_templates_config()))
+
+
+def get_template_store() -> LayoutTemplateStore:
+    """Get the shared layout template store built from the templates configuration"""
+    return _template_store.get()
+
+
+__all__ = [
+    'LayoutTemplateStore',
+    'get_template_store',
+    'is_absent',
+    'value_shape'
+]
@@ -0,0 +1,156 @@
+"""
+Mars AI Agents - Logging Utilities
+Non-blocking structured logging: records are put on a queue by the calling
+thread and formatted/written by a single background listener thread
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config import get_logging_config
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry['trace_id'] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key not in entry and key != 'trace_id':
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _TraceContextFilter(logging.Filter):
+    """Stamp records with the active trace ID in the calling thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        from utils.tracing import current_trace_id
+        record.trace_id = current_trace_id()
+        return True
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves JSON/text formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock handler runs the full formatter here, in the caller's
+        # thread; only merge the arguments so they can't change in flight.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_module_levels(spec: str) -> Dict[str, str]:
+    """Parse 'get_data=DEBUG,orchestrator=WARNING' into a mapping"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, json_output: Optional[bool] = None,
+                      module_levels: Optional[Dict[str, str]] = None):
+    """
+    Route all logging through a queue drained by a background writer
+
+    Safe to call more than once; later calls only update levels.
+
+    Args:
+        level: Root log level (defaults to config / MARS_LOG_LEVEL)
+        json_output: Emit JSON lines instead of plain text
+        module_levels: Per-logger levels, e.g. {'get_data': 'DEBUG'}
+                       (also read from MARS_LOG_LEVELS="name=LEVEL,...")
+    """
+    global _listener
+    settings = get_logging_config()
+    level = (level or os.getenv('MARS_LOG_LEVEL') or settings['level']).upper()
+    if json_output is None:
+        json_output = settings['json']
+    levels = dict(settings['module_levels'])
+    levels.update(_parse_module_levels(os.getenv('MARS_LOG_LEVELS', '')))
+    levels.update(module_levels or {})
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if json_output:
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(name)s: %(message)s'
+            ))
+
+        log_queue: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+        queue_handler = _EnqueueHandler(log_queue)
+        queue_handler.addFilter(_TraceContextFilter())
+
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+
+        # Uvicorn installs its own stream handlers; send its records through the queue too
+        for name in ('uvicorn', 'uvicorn.error', 'uvicorn.access'):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers = []
+            uvicorn_logger.propagate = True
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+__all__ = [
+    'JsonFormatter',
+    'configure_logging',
+    'shutdown_logging'
+]
@@ -0,0 +1,217 @@
+"""
+Mars AI Agents - Mailbox Registry
+Mailboxes to ingest from, each with its own credentials, token, output
+folder, quota budget and processing checkpoint
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import get_gmail_config, get_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAILBOX_ID = 'default'
+
+
+class Mailbox:
+    """One Gmail inbox and where its attachments and state live"""
+
+    def __init__(self, id: str, email: Optional[str] = None,
+                 credentials_file: str = 'credentials.json', token_file: Optional[str] = None,
+                 data_folder: Optional[str] = None, quota_units_per_second: Optional[float] = None,
+                 enabled: bool = True, attachment_filter: Optional[Dict[str, Any]] = None):
+        """
+        Describe a mailbox
+
+        Args:
+            id: Short unique name, used for folders and checkpoints
+            email: Address the token must belong to (None: whichever account authorised)
+            credentials_file: OAuth client secrets file
+            token_file: Authorised user token (defaults to tokens/<id>.json)
+            data_folder: Where attachments are saved (defaults to data/<id>)
+            quota_units_per_second: Gmail quota budget (defaults to the gmail config)
+            enabled: Whether the supervisor should ingest from it
+            attachment_filter: Attachment filter settings replacing the configured ones
+        """
+        if not re.fullmatch(r'[A-Za-z0-9][A-Za-z0-9_.-]*', id or ''):
+            raise ValueError(f"Invalid mailbox id '{id}' (letters, digits, '.', '_' and '-' only)")
+        self.id = id
+        self.email = email
+        self.credentials_file = credentials_file
+        self.token_file = token_file or os.path.join('tokens', f'{id}.json')
+        self.data_folder = data_folder or os.path.join(get_config()['data']['folder'], id)
+        self.quota_units_per_second = quota_units_per_second
+        self.enabled = enabled
+        self.attachment_filter = dict(attachment_filter or {})
+
+    @property
+    def quota_user(self) -> str:
+        """Key of the quota bucket this mailbox's calls are charged to"""
+        return self.email or self.id
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Mailbox':
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'email': self.email,
+            'credentials_file': self.credentials_file,
+            'token_file': self.token_file,
+            'data_folder': self.data_folder,
+            'quota_units_per_second': self.quota_units_per_second,
+            'enabled': self.enabled,
+            'attachment_filter': self.attachment_filter,
+        }
+
+
+def default_mailbox() -> Mailbox:
+    """The single mailbox described by the gmail config (used when there is no registry)"""
+    settings = get_gmail_config()
+    return Mailbox(
+        DEFAULT_MAILBOX_ID,
+        email=settings.get('target_email'),
+        credentials_file=settings['credentials_file'],
+        token_file=settings['token_file'],
+        data_folder=get_config()['data']['folder'],
+        quota_units_per_second=settings.get('quota_units_per_second')
+    )
+
+
+def load_mailboxes(registry_file: Optional[str] = None, include_disabled: bool = False) -> List[Mailbox]:
+    """
+    Load the mailbox registry
+
+    The registry is a JSON file: {"mailboxes": [{"id": ..., "email": ..., ...}]}.
+    Without one, the gmail config describes a single 'default' mailbox.
+
+    Args:
+        registry_file: Registry path (defaults to the gmail config / MARS_MAILBOX_REGISTRY)
+        include_disabled: Also return mailboxes with enabled=false
+
+    Returns:
+        Mailboxes in registry order
+
+    Raises:
+        ValueError: If the registry is malformed or has duplicate IDs/folders
+    """
+    registry_file = registry_file or os.getenv('MARS_MAILBOX_REGISTRY') or get_gmail_config()['registry_file']
+    if not os.path.exists(registry_file):
+        return [default_mailbox()]
+
+    with open(registry_file) as f:
+        try:
+            entries = json.load(f).get('mailboxes', [])
+        except (ValueError, AttributeError) as e:
+            raise ValueError(f"Invalid mailbox registry {registry_file}: {e}")
+
+    mailboxes = [Mailbox.from_dict(entry) for entry in entries]
+    for attribute in ('id', 'data_folder', 'token_file'):
+        values = [os.path.normpath(str(getattr(m, attribute))) for m in mailboxes]
+        duplicates = {value for value in values if values.count(value) > 1}
+        if duplicates:
+            raise ValueError(f"Mailboxes must not share a {attribute}: {', '.join(sorted(duplicates))}")
+
+    if not include_disabled:
+        mailboxes = [m for m in mailboxes if m.enabled]
+    return mailboxes
+
+
+def get_mailbox(mailbox_id: str) -> Mailbox:
+    """
+    Look up a registered mailbox
+
+    Raises:
+        KeyError: If no mailbox has that ID
+    """
+    for mailbox in load_mailboxes(include_disabled=True):
+        if mailbox.id == mailbox_id:
+            return mailbox
+    raise KeyError(mailbox_id)
+
+
+class MailboxCheckpoint:
+    """
+    Per-mailbox record of processed messages
+
+    Message IDs are kept for the last `max_ids` successfully processed
+    messages, so re-running ingestion over the same search window doesn't
+    download the same attachments again.
+    """
+
+    def __init__(self, mailbox_id: str, folder: Optional[str] = None, max_ids: int = 5000):
+        """
+        Load (or start) the checkpoint
+
+        Args:
+            mailbox_id: Mailbox the checkpoint belongs to
+            folder: Folder holding checkpoint files (defaults to the gmail config)
+            max_ids: Number of processed message IDs to remember
+        """
+        folder = folder or get_gmail_config()['checkpoint_folder']
+        self.path = os.path.join(folder, f'{mailbox_id}.json')
+        self.max_ids = max_ids
+        self._lock = threading.Lock()
+        self._processed: Dict[str, int] = {}
+        self.last_run: Optional[str] = None
+        self.last_internal_date = 0
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self._processed = {mid: i for i, mid in enumerate(data.get('processed_ids', []))}
+                self.last_run = data.get('last_run')
+                self.last_internal_date = data.get('last_internal_date', 0)
+            except (ValueError, OSError) as e:
+                logger.warning("Ignoring unreadable checkpoint %s: %s", self.path, e)
+
+    def is_processed(self, message_id: str) -> bool:
+        return message_id in self._processed
+
+    def mark_processed(self, message_id: str, internal_date: Optional[int] = None):
+        with self._lock:
+            self._processed.pop(message_id, None)
+            self._processed[message_id] = len(self._processed)
+            if internal_date:
+                self.last_internal_date = max(self.last_internal_date, int(internal_date))
+
+    def save(self):
+        """Write the checkpoint atomically"""
+        with self._lock:
+            processed_ids = list(self._processed)[-self.max_ids:]
+            data = {
+                'processed_ids': processed_ids,
+                'last_internal_date': self.last_internal_date,
+                'last_run': datetime.now().isoformat(),
+            }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+        self.last_run = data['last_run']
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'processed_messages': len(self._processed),
+            'last_internal_date': self.last_internal_date,
+            'last_run': self.last_run,
+        }
+
+
+__all__ = [
+    'DEFAULT_MAILBOX_ID',
+    'Mailbox',
+    'MailboxCheckpoint',
+    'default_mailbox',
+    'get_mailbox',
+    'load_mailboxes'
+]
@@ -0,0 +1,302 @@
+"""
+Mars AI Agents - Metrics Utilities
+Minimal thread-safe metrics registry rendered in the Prometheus text format
+
+The API mirrors the subset of prometheus_client used here (``labels()``,
+``inc()``, ``observe()``, ``time()``) so metrics can be swapped over later
+without touching the call sites.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) covering fast cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Render a label set as {name="value",...}"""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Metric:
+    """Base class for a metric family with optional labels"""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['MetricsRegistry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported as zero before first use
+            self.labels()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values: str, **kwargs: str):
+        """Get the child metric for a set of label values"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._new_child()
+                self._children[values] = child
+            return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """Collect (suffix, extra label names, extra label values, value) per child"""
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        """Render this metric family as Prometheus exposition lines"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for label_values, child in sorted(children):
+            for suffix, extra_names, extra_values, value in child._samples():
+                labels = _format_labels(self.labelnames + extra_names, label_values + extra_values)
+                lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        with self._lock:
+            self._value += amount
+
+    def _samples(self):
+        return [('_total', (), (), self._value)]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        """Increment an unlabelled counter"""
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        """Increment while the block runs"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def _samples(self):
+        return [('', (), (), self._value)]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._upper_bounds = list(buckets) + [float('inf')]
+        self._counts = [0] * len(self._upper_bounds)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            for i, bound in enumerate(self._upper_bounds):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self._upper_bounds, counts):
+            cumulative += count
+            samples.append(('_bucket', ('le',), (_format_value(bound),), cumulative))
+        samples.append(('_sum', (), (), total))
+        samples.append(('_count', (), (), cumulative))
+        return samples
+
+
+class Histogram(_Metric):
+    """Distribution of observed values across fixed buckets"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: Optional['MetricsRegistry'] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class MetricsRegistry:
+    """Collection of metric families exposed on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def generate_latest(self) -> str:
+        """Render every registered metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline metrics shared by the Gmail retriever, orchestrator and API server
+STAGE_SECONDS = Histogram(
+    'mars_stage_duration_seconds',
+    'Time spent in each pipeline stage',
+    ['stage']
+)
+BYTES_DOWNLOADED = Counter(
+    'mars_attachment_bytes',
+    'Attachment bytes downloaded from Gmail'
+)
+MESSAGES_PROCESSED = Counter(
+    'mars_messages_processed',
+    'Gmail messages fetched for attachment download'
+)
+ATTACHMENTS_DOWNLOADED = Counter(
+    'mars_attachments_downloaded',
+    'Attachments written to the data folder'
+)
+ATTACHMENTS_SKIPPED = Counter(
+    'mars_attachments_skipped',
+    'Attachment parts rejected by the filter rules before download',
+    ['reason']
+)
+LLM_TOKENS = Counter(
+    'mars_llm_tokens',
+    'Tokens reported by the LLM provider (kind: input, cached_input, output)',
+    ['call', 'kind', 'prompt_version']
+)
+CACHE_REQUESTS = Counter(
+    'mars_cache_requests',
+    'Cache lookups by cache and result',
+    ['cache', 'result']
+)
+EXECUTOR_INFLIGHT = Gauge(
+    'mars_executor_inflight',
+    'Blocking tasks currently running in executor threads',
+    ['executor']
+)
+
+
+def generate_latest() -> str:
+    """Render the default registry in the Prometheus text format"""
+    return REGISTRY.generate_latest()
+
+
+__all__ = [
+    'ATTACHMENTS_DOWNLOADED',
+    'ATTACHMENTS_SKIPPED',
+    'BYTES_DOWNLOADED',
+    'CACHE_REQUESTS',
+    'CONTENT_TYPE_LATEST',
+    'Counter',
+    'EXECUTOR_INFLIGHT',
+    'Gauge',
+    'Histogram',
+    'LLM_TOKENS',
+    'MESSAGES_PROCESSED',
+    'MetricsRegistry',
+    'REGISTRY',
+    'STAGE_SECONDS',
+    'generate_latest'
+]
@@ -0,0 +1,255 @@
+"""
+Mars AI Agents - Near-Duplicate Detection
+MinHash signatures over word shingles with an LSH band index, so a
+regenerated copy of an already extracted invoice can reuse its fields
+"""
+
+import hashlib
+import logging
+import os
+import random
+import re
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_dedup_config
+from utils.sqlite_store import SQLiteStore, SharedInstance
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used for the universal hash permutations
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    path TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    invoice_number TEXT NOT NULL DEFAULT '',
+    order_number TEXT NOT NULL DEFAULT '',
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_buckets_lookup ON lsh_buckets(band, bucket);
+CREATE INDEX IF NOT EXISTS lsh_buckets_path ON lsh_buckets(path);
+"""
+
+
+def _shingles(text: str, size: int) -> List[int]:
+    """Hash overlapping word n-grams of a normalised text to 32-bit integers"""
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return []
+    grams = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return [
+        int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=4).digest(), 'little')
+        for gram in grams
+    ]
+
+
+class MinHasher:
+    """Compute fixed-length MinHash signatures"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        """
+        Initialize the permutations
+
+        Args:
+            num_perm: Signature length (more is more accurate and slower)
+            shingle_size: Words per shingle
+            seed: Seed for the permutations; signatures are only comparable
+                  between hashers built with the same seed and num_perm
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text: str) -> Tuple[Tuple[int, ...], int]:
+        """
+        MinHash signature of a text
+
+        Args:
+            text: Document text
+
+        Returns:
+            (signature, number of distinct shingles)
+        """
+        hashes = _shingles(text, self.shingle_size)
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm), 0
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._permutations
+        ), len(hashes)
+
+
+def estimate_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _pack(signature: Tuple[int, ...]) -> bytes:
+    return struct.pack(f'<{len(signature)}I', *signature)
+
+
+def _unpack(blob: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f'<{len(blob) // 4}I', blob)
+
+
+class NearDuplicateIndex(SQLiteStore):
+    """
+    Persistent MinHash/LSH index of extracted documents
+
+    Signatures are split into bands; documents sharing any band bucket are
+    candidates, and candidates are confirmed by their estimated similarity.
+    """
+
+    def __init__(self, db_path: str = '.cache/near_duplicates.db', num_perm: int = 128,
+                 bands: int = 16, shingle_size: int = 3, threshold: float = 0.9,
+                 min_shingles: int = 20, enabled: bool = True):
+        """
+        Open (and create if needed) the index
+
+        Args:
+            db_path: SQLite database file
+            num_perm: MinHash signature length (must be divisible by bands)
+            bands: LSH bands; with r = num_perm / bands rows per band, pairs
+                   above roughly (1 / bands) ** (1 / r) similarity become candidates
+            shingle_size: Words per shingle
+            threshold: Minimum estimated similarity to treat as a duplicate
+            min_shingles: Texts shorter than this are never matched
+            enabled: Whether lookups should be performed at all
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.min_shingles = min_shingles
+        self.enabled = enabled
+        self.hasher = MinHasher(num_perm, shingle_size)
+        super().__init__(db_path, _SCHEMA)
+
+    def _band_buckets(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        buckets = []
+        for band in range(self.bands):
+            chunk = _pack(signature[band * self.rows:(band + 1) * self.rows])
+            # SQLite integers are signed 64-bit
+            bucket = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True)
+            buckets.append((band, bucket))
+        return buckets
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """Signature of a text, or None if it is too short to match reliably"""
+        signature, shingle_count = self.hasher.signature(text)
+        return signature if shingle_count >= self.min_shingles else None
+
+    def find_duplicate(self, signature: Tuple[int, ...], text: str,
+                       exclude_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find an earlier document this one is a near-duplicate of
+
+        A candidate only counts if its extracted invoice number (and order
+        number, when it has one) also appear in the new text, so a new
+        invoice on the same vendor template is never mistaken for an old one.
+
+        Args:
+            signature: Signature of the new document
+            text: Text of the new document
+            exclude_path: Path to ignore (the document itself)
+
+        Returns:
+            {'path', 'similarity', 'invoice_number', 'order_number'} or None
+        """
+        buckets = self._band_buckets(signature)
+        clauses = ' OR '.join('(band = ? AND bucket = ?)' for _ in buckets)
+        params = [value for pair in buckets for value in pair]
+        connection = self._connection()
+        candidates = connection.execute(
+            f'SELECT DISTINCT s.path, s.signature, s.invoice_number, s.order_number '
+            f'FROM lsh_buckets b JOIN signatures s ON s.path = b.path WHERE {clauses}',
+            params
+        ).fetchall()
+
+        compact_text = re.sub(r'\s+', '', text).upper()
+        best = None
+        for row in candidates:
+            if exclude_path and row['path'] == os.path.normpath(exclude_path):
+                continue
+            similarity = estimate_similarity(signature, _unpack(row['signature']))
+            if similarity < self.threshold or (best and similarity <= best['similarity']):
+                continue
+            fields = [row['invoice_number'], row['order_number']]
+            if not row['invoice_number'] or any(
+                value and re.sub(r'\s+', '', value).upper() not in compact_text for value in fields
+            ):
+                continue
+            best = {
+                'path': row['path'],
+                'similarity': round(similarity, 4),
+                'invoice_number': row['invoice_number'],
+                'order_number': row['order_number'],
+            }
+        return best
+
+    def add(self, path: str, signature: Tuple[int, ...], invoice_number: str, order_number: str):
+        """
+        Store (or replace) a document's signature and extracted fields
+
+        Args:
+            path: Document path
+            signature: MinHash signature of its text
+            invoice_number: Extracted invoice number
+            order_number: Extracted order number
+        """
+        path = os.path.normpath(path)
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO signatures (path, signature, invoice_number, order_number, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (path, _pack(signature), invoice_number or '', order_number or '', datetime.now().isoformat())
+                )
+                connection.execute('DELETE FROM lsh_buckets WHERE path = ?', (path,))
+                connection.executemany(
+                    'INSERT INTO lsh_buckets (band, bucket, path) VALUES (?, ?, ?)',
+                    [(band, bucket, path) for band, bucket in self._band_buckets(signature)]
+                )
+
+    def update_fields(self, path: str, invoice_number: str, order_number: str):
+        """Replace the stored fields of a document (e.g. after a manual correction)"""
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'UPDATE signatures SET invoice_number = ?, order_number = ?, updated_at = ? WHERE path = ?',
+                    (invoice_number or '', order_number or '', datetime.now().isoformat(), os.path.normpath(path))
+                )
+
+
+_duplicate_index: SharedInstance[NearDuplicateIndex] = SharedInstance(lambda: NearDuplicateIndex(**get_dedup_config()))
+
+
+def get_duplicate_index() -> NearDuplicateIndex:
+    """Get the shared near-duplicate index built from the dedup configuration"""
+    return _duplicate_index.get()
+
+
+__all__ = [
+    'MinHasher',
+    'NearDuplicateIndex',
+    'estimate_similarity',
+    'get_duplicate_index'
+]
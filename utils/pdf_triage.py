@@ -0,0 +1,186 @@
+"""
+Mars AI Agents - Document Triage
+Cheap per-page classification (text, image-only, blank) of incoming
+documents so only those with a text layer reach the LLM; scanned
+documents are queued for OCR and unreadable ones rejected
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import get_triage_config
+from utils.metrics import Counter
+from utils.sqlite_store import SQLiteStore, SharedInstance
+
+logger = logging.getLogger(__name__)
+
+# Routing decisions
+EXTRACT = 'extract'
+OCR = 'ocr'
+REJECT = 'reject'
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif', '.webp'}
+
+TRIAGE_DECISIONS = Counter(
+    'mars_triage_decisions',
+    'Documents routed by the triage stage',
+    ['decision', 'reason']
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS triage_decisions (
+    path TEXT PRIMARY KEY,
+    decision TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    page_count INTEGER NOT NULL DEFAULT 0,
+    pages TEXT NOT NULL DEFAULT '{}',
+    decided_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS triage_decisions_decision ON triage_decisions(decision, decided_at);
+"""
+
+
+def _classify_page(page: 'pymupdf.Page', min_chars: int) -> str:
+    """Classify one page as 'text', 'image' or 'blank'"""
+    if len(page.get_text('text').strip()) >= min_chars:
+        return 'text'
+    if page.get_images(full=False):
+        return 'image'
+    # Vector-drawn scans and stamps have no image objects but still need OCR
+    return 'image' if page.get_drawings() else 'blank'
+
+
+def triage_document(path: str, min_chars_per_page: int = 25, max_pages: int = 50) -> Dict[str, Any]:
+    """
+    Decide how a document should be processed
+
+    Args:
+        path: Document path
+        min_chars_per_page: Characters of text a page needs to count as text
+        max_pages: Pages inspected at most (the rest are assumed alike)
+
+    Returns:
+        {'decision': extract|ocr|reject, 'reason', 'page_count', 'pages': {class: count}}
+    """
+    extension = os.path.splitext(path)[1].lower()
+    result: Dict[str, Any] = {'decision': REJECT, 'reason': '', 'page_count': 0, 'pages': {}}
+
+    if extension in IMAGE_EXTENSIONS:
+        result.update(decision=OCR, reason='image_file', page_count=1, pages={'image': 1})
+        return result
+    if extension != '.pdf':
+        result['reason'] = 'unsupported_type'
+        return result
+
+    import pymupdf  # deferred so importing this module stays cheap
+    try:
+        doc = pymupdf.open(path)
+    except Exception as e:
+        logger.warning("Could not open %s: %s", path, e)
+        result['reason'] = 'corrupt'
+        return result
+
+    with doc:
+        # Encrypted with an empty user password is readable; anything else is not
+        if doc.needs_pass and not doc.authenticate(''):
+            result['reason'] = 'encrypted'
+            return result
+
+        result['page_count'] = doc.page_count
+        if doc.page_count == 0:
+            result['reason'] = 'no_pages'
+            return result
+
+        pages: Dict[str, int] = {}
+        try:
+            for page_number in range(min(doc.page_count, max_pages)):
+                kind = _classify_page(doc[page_number], min_chars_per_page)
+                pages[kind] = pages.get(kind, 0) + 1
+        except Exception as e:
+            logger.warning("Could not read pages of %s: %s", path, e)
+            result.update(reason='corrupt', pages=pages)
+            return result
+
+    result['pages'] = pages
+    if pages.get('text'):
+        result.update(decision=EXTRACT, reason='partial_text' if pages.get('image') else 'text')
+    elif pages.get('image'):
+        result.update(decision=OCR, reason='image_only')
+    else:
+        result['reason'] = 'blank'
+    return result
+
+
+class TriageLog(SQLiteStore):
+    """Persistent record of triage decisions; 'ocr' rows form the OCR queue"""
+
+    def __init__(self, db_path: str = '.cache/triage.db'):
+        """
+        Open (and create if needed) the log
+
+        Args:
+            db_path: SQLite database file
+        """
+        super().__init__(db_path, _SCHEMA)
+
+    def record(self, path: str, result: Dict[str, Any]):
+        """
+        Store the latest decision for a document
+
+        Args:
+            path: Document path
+            result: Output of triage_document (possibly amended later in the graph)
+        """
+        TRIAGE_DECISIONS.labels(decision=result['decision'], reason=result['reason']).inc()
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO triage_decisions '
+                    '(path, decision, reason, page_count, pages, decided_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (os.path.normpath(path), result['decision'], result['reason'],
+                     result.get('page_count', 0), json.dumps(result.get('pages', {})),
+                     datetime.now().isoformat())
+                )
+
+    def decisions(self, decision: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List recent decisions, newest first
+
+        Args:
+            decision: Only this decision (e.g. 'ocr' for the OCR queue)
+            limit: Maximum number of rows
+
+        Returns:
+            Decision rows
+        """
+        query = 'SELECT * FROM triage_decisions'
+        params: List[Any] = []
+        if decision:
+            query += ' WHERE decision = ?'
+            params.append(decision)
+        query += ' ORDER BY decided_at DESC LIMIT ?'
+        params.append(limit)
+        rows = self._connection().execute(query, params).fetchall()
+        return [dict(row, pages=json.loads(row['pages'])) for row in rows]
+
+
+_triage_log: SharedInstance[TriageLog] = SharedInstance(lambda: TriageLog(get_triage_config()['db_path']))
+
+
+def get_triage_log() -> TriageLog:
+    """Get the shared triage log built from the triage configuration"""
+    return _triage_log.get()
+
+
+__all__ = [
+    'EXTRACT',
+    'OCR',
+    'REJECT',
+    'TriageLog',
+    'get_triage_log',
+    'triage_document'
+]
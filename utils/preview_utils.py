@@ -0,0 +1,248 @@
+"""
+Mars AI Agents - Page Preview Utilities
+Renders document pages to compressed images with PyMuPDF and keeps them
+in a bounded on-disk cache keyed by content hash, page and DPI
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from config import get_preview_config
+from utils.file_utils import file_content_hash
+from utils.metrics import CACHE_REQUESTS, EXECUTOR_INFLIGHT, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Image formats PyMuPDF can encode, mapped to their media types
+IMAGE_MEDIA_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+
+class PagePreviewCache:
+    """Render document pages to images and cache them on disk"""
+
+    def __init__(self, cache_folder: str = '.cache/previews', max_cache_mb: int = 256,
+                 default_dpi: int = 96, min_dpi: int = 36, max_dpi: int = 200,
+                 image_format: str = 'jpeg', jpeg_quality: int = 75):
+        """
+        Initialize the preview cache
+
+        Args:
+            cache_folder: Folder where rendered pages are stored
+            max_cache_mb: Upper bound for the total size of the cache
+            default_dpi: DPI used when the caller does not ask for one
+            min_dpi: Smallest DPI accepted
+            max_dpi: Largest DPI accepted
+            image_format: Output format ('jpeg' or 'png')
+            jpeg_quality: JPEG quality (1-100) when rendering JPEGs
+        """
+        if image_format not in IMAGE_MEDIA_TYPES:
+            raise ValueError(f"Unsupported preview image format: {image_format}")
+
+        self.cache_folder = cache_folder
+        self.max_cache_bytes = max_cache_mb * 1024 * 1024
+        self.default_dpi = default_dpi
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.image_format = image_format
+        self.jpeg_quality = jpeg_quality
+        self.media_type = IMAGE_MEDIA_TYPES[image_format]
+
+        self._lock = threading.Lock()
+        self._cache_bytes: Optional[int] = None
+
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    def clamp_dpi(self, dpi: Optional[int]) -> int:
+        """Clamp a requested DPI to the configured range"""
+        if not dpi:
+            return self.default_dpi
+        return max(self.min_dpi, min(self.max_dpi, int(dpi)))
+
+    def cache_key(self, content_hash: str, page: int, dpi: int) -> str:
+        """Build the cache key (and file name stem) for a rendered page"""
+        return f"{content_hash}_p{page}_d{dpi}"
+
+    def page_count(self, document_path: str) -> int:
+        """
+        Get the number of pages in a document
+
+        Args:
+            document_path: Path to the document
+
+        Returns:
+            Number of pages
+        """
+        import pymupdf
+        with pymupdf.open(document_path) as doc:
+            return doc.page_count
+
+    def render_page(self, document_path: str, page: int = 0,
+                    dpi: Optional[int] = None) -> Tuple[str, str, bool]:
+        """
+        Get the rendered image of a document page, rendering it on a miss
+
+        Args:
+            document_path: Path to the document
+            page: Zero-based page index
+            dpi: Requested resolution (clamped to the configured range)
+
+        Returns:
+            Tuple of (image path, cache key, cache hit flag)
+
+        Raises:
+            IndexError: If the page does not exist in the document
+        """
+        dpi = self.clamp_dpi(dpi)
+        key = self.cache_key(file_content_hash(document_path), page, dpi)
+        image_path = os.path.join(self.cache_folder, f"{key}.{self.image_format}")
+
+        if os.path.exists(image_path):
+            # Refresh the access time so eviction stays least-recently-used
+            try:
+                os.utime(image_path)
+                CACHE_REQUESTS.labels(cache='preview', result='hit').inc()
+                return image_path, key, True
+            except FileNotFoundError:
+                pass  # Evicted between the check and the touch
+
+        CACHE_REQUESTS.labels(cache='preview', result='miss').inc()
+        # PyMuPDF is imported on the first render, not when the server starts
+        import pymupdf
+        with STAGE_SECONDS.labels(stage='preview_render').time(), pymupdf.open(document_path) as doc:
+            if page < 0 or page >= doc.page_count:
+                raise IndexError(f"Page {page} out of range (document has {doc.page_count} pages)")
+            pixmap = doc[page].get_pixmap(dpi=dpi)
+            if self.image_format == 'jpeg':
+                image_bytes = pixmap.tobytes('jpeg', jpg_quality=self.jpeg_quality)
+            else:
+                image_bytes = pixmap.tobytes('png')
+
+        # Write atomically so concurrent readers never see a partial image
+        tmp_path = f"{image_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, image_path)
+
+        self._account(len(image_bytes))
+        return image_path, key, False
+
+    def prerender(self, document_path: str) -> Optional[str]:
+        """
+        Render the first page of a document at the default DPI
+
+        Args:
+            document_path: Path to the document
+
+        Returns:
+            Path of the rendered image, or None if rendering failed
+        """
+        try:
+            with EXECUTOR_INFLIGHT.labels(executor='prerender').track_inprogress():
+                image_path, _, _ = self.render_page(document_path, 0)
+            return image_path
+        except Exception as e:
+            logger.warning("Could not prerender preview for %s: %s", document_path, e)
+            return None
+
+    def _account(self, added_bytes: int):
+        """Track the cache size and evict old entries when over budget"""
+        with self._lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(entry[2] for entry in self._scan())
+            else:
+                self._cache_bytes += added_bytes
+
+            if self._cache_bytes <= self.max_cache_bytes:
+                return
+
+            # Evict least recently used images until back under budget
+            for path, _, size in sorted(self._scan(), key=lambda entry: entry[1]):
+                if self._cache_bytes <= self.max_cache_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    self._cache_bytes -= size
+                except FileNotFoundError:
+                    pass
+
+    def _scan(self):
+        """List (path, last used time, size) for every cached image"""
+        entries = []
+        with os.scandir(self.cache_folder) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+
+_preview_cache: Optional[PagePreviewCache] = None
+_preview_cache_lock = threading.Lock()
+_prerender_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_preview_cache() -> PagePreviewCache:
+    """Get the shared preview cache built from the preview configuration"""
+    global _preview_cache
+    with _preview_cache_lock:
+        if _preview_cache is None:
+            settings = get_preview_config()
+            settings.pop('prerender_first_page', None)
+            _preview_cache = PagePreviewCache(**settings)
+        return _preview_cache
+
+
+def schedule_prerender(document_path: str):
+    """
+    Render the first page of a freshly downloaded document in the background
+
+    Only PDFs are prerendered; other files are served as they are.
+
+    Args:
+        document_path: Path to the downloaded document
+    """
+    global _prerender_executor
+    if not get_preview_config().get('prerender_first_page', True):
+        return
+    if not document_path.lower().endswith('.pdf'):
+        return
+
+    with _preview_cache_lock:
+        if _prerender_executor is None:
+            _prerender_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prerender')
+    _prerender_executor.submit(get_preview_cache().prerender, document_path)
+
+
+def get_preview_info(document_path: str) -> Dict[str, Any]:
+    """
+    Describe the previews available for a document
+
+    Args:
+        document_path: Path to the document
+
+    Returns:
+        Dictionary with page count, content hash and DPI limits
+    """
+    cache = get_preview_cache()
+    return {
+        'page_count': cache.page_count(document_path),
+        'content_hash': file_content_hash(document_path),
+        'default_dpi': cache.default_dpi,
+        'min_dpi': cache.min_dpi,
+        'max_dpi': cache.max_dpi,
+        'media_type': cache.media_type
+    }
+
+
+__all__ = [
+    'PagePreviewCache',
+    'get_preview_cache',
+    'get_preview_info',
+    'schedule_prerender'
+]
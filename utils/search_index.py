@@ -0,0 +1,283 @@
+"""
+Mars AI Agents - Document Search Index
+SQLite index over extracted invoice/order numbers, email metadata and
+document text: exact and prefix lookups on normalised keys, full-text
+search through FTS5
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import get_search_config
+from utils.metrics import STAGE_SECONDS
+from utils.sqlite_store import SQLiteStore, SharedInstance
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ('auto', 'exact', 'prefix', 'fulltext')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    invoice_number TEXT NOT NULL DEFAULT '',
+    order_number TEXT NOT NULL DEFAULT '',
+    invoice_key TEXT NOT NULL DEFAULT '',
+    order_key TEXT NOT NULL DEFAULT '',
+    sender TEXT NOT NULL DEFAULT '',
+    subject TEXT NOT NULL DEFAULT '',
+    received_at TEXT,
+    message_id TEXT,
+    source TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_invoice_key ON documents(invoice_key);
+CREATE INDEX IF NOT EXISTS documents_order_key ON documents(order_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    path UNINDEXED, name, invoice_number, order_number, sender, subject, body,
+    prefix='2 3 4'
+);
+"""
+
+_RESULT_COLUMNS = ('path, name, invoice_number, order_number, sender, subject, '
+                   'received_at, source, updated_at')
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """
+    Normalise an invoice/order number for exact and prefix matching
+
+    'po 4500-123' and 'PO4500123' both become 'PO4500123'.
+    """
+    return re.sub(r'[^0-9A-Za-z]', '', value or '').upper()
+
+
+def _fts_query(query: str, prefix: bool = False) -> str:
+    """Quote each term so user input can't inject FTS5 syntax"""
+    terms = re.findall(r'\w+', query, flags=re.UNICODE)
+    if not terms:
+        return ''
+    return ' '.join(f'"{term}"*' if prefix else f'"{term}"' for term in terms)
+
+
+class DocumentSearchIndex(SQLiteStore):
+    """
+    Search index for downloaded documents
+
+    One connection per thread (WAL mode, so readers never block the writer);
+    writes are serialised by a lock.
+    """
+
+    def __init__(self, db_path: str = '.cache/search.db', index_full_text: bool = True,
+                 max_text_chars: int = 200_000):
+        """
+        Open (and create if needed) the index
+
+        Args:
+            db_path: SQLite database file
+            index_full_text: Store extracted PDF text for full-text queries
+            max_text_chars: Cap on the stored text per document
+        """
+        self.index_full_text = index_full_text
+        self.max_text_chars = max_text_chars
+        super().__init__(db_path, _SCHEMA, 'NORMAL')
+
+    def _upsert(self, path: str, fields: Dict[str, Any], body: Optional[str] = None):
+        """Insert or update a document row and keep the FTS row in step"""
+        path = os.path.normpath(path)
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if 'invoice_number' in fields:
+            fields['invoice_key'] = normalize_key(fields['invoice_number'])
+        if 'order_number' in fields:
+            fields['order_key'] = normalize_key(fields['order_number'])
+        fields['updated_at'] = datetime.now().isoformat()
+
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                columns = ', '.join(fields)
+                placeholders = ', '.join('?' for _ in fields)
+                updates = ', '.join(f'{column} = excluded.{column}' for column in fields)
+                connection.execute(
+                    f'INSERT INTO documents (path, name, {columns}) VALUES (?, ?, {placeholders}) '
+                    f'ON CONFLICT(path) DO UPDATE SET {updates}',
+                    (path, os.path.basename(path), *fields.values())
+                )
+
+                row = connection.execute('SELECT * FROM documents WHERE path = ?', (path,)).fetchone()
+                if body is None:
+                    existing = connection.execute(
+                        'SELECT body FROM documents_fts WHERE path = ?', (path,)
+                    ).fetchone()
+                    body = existing['body'] if existing else ''
+                connection.execute('DELETE FROM documents_fts WHERE path = ?', (path,))
+                connection.execute(
+                    'INSERT INTO documents_fts (path, name, invoice_number, order_number, sender, subject, body) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (path, row['name'], row['invoice_number'], row['order_number'],
+                     row['sender'], row['subject'], body)
+                )
+
+    def record_download(self, path: str, sender: str = '', subject: str = '',
+                        received_at: Optional[str] = None, message_id: Optional[str] = None):
+        """
+        Record email metadata for a freshly downloaded attachment
+
+        Args:
+            path: Document path (e.g. data/invoice.pdf)
+            sender: From header
+            subject: Subject header
+            received_at: ISO timestamp the email was received
+            message_id: Gmail message ID
+        """
+        self._upsert(path, {
+            'sender': sender,
+            'subject': subject,
+            'received_at': received_at,
+            'message_id': message_id,
+        })
+
+    def record_extraction(self, path: str, invoice_number: str, order_number: str,
+                          text: Optional[str] = None, source: str = 'extracted'):
+        """
+        Record extracted (or manually corrected) fields for a document
+
+        Args:
+            path: Document path
+            invoice_number: Invoice number
+            order_number: Order number
+            text: Full document text for full-text search (None keeps the stored text)
+            source: 'extracted' for model output, 'batch' for backlog batches, 'manual' for user edits
+        """
+        if text is not None:
+            text = text[:self.max_text_chars] if self.index_full_text else ''
+        self._upsert(path, {
+            'invoice_number': invoice_number or '',
+            'order_number': order_number or '',
+            'source': source,
+        }, body=text)
+
+    def get_document(self, path: str) -> Optional[Dict[str, Any]]:
+        """Get the indexed fields for a document, or None if it isn't indexed"""
+        row = self._connection().execute(
+            f'SELECT {_RESULT_COLUMNS} FROM documents WHERE path = ?', (os.path.normpath(path),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def remove_document(self, path: str):
+        """Drop a document from the index"""
+        path = os.path.normpath(path)
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute('DELETE FROM documents WHERE path = ?', (path,))
+                connection.execute('DELETE FROM documents_fts WHERE path = ?', (path,))
+
+    def search(self, query: str, mode: str = 'auto', limit: int = 20) -> Dict[str, Any]:
+        """
+        Search the index
+
+        Args:
+            query: Invoice/order number, or free text
+            mode: 'exact' (normalised number match), 'prefix' (number or word
+                  prefix), 'fulltext' (FTS5 over all fields and document text)
+                  or 'auto' (the first of exact, prefix, fulltext with results)
+            limit: Maximum number of results
+
+        Returns:
+            {'results', 'mode', 'took_ms'}
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}' (expected one of {', '.join(SEARCH_MODES)})")
+
+        started = time.perf_counter()
+        modes = ('exact', 'prefix', 'fulltext') if mode == 'auto' else (mode,)
+        results: List[Dict[str, Any]] = []
+        used = modes[-1]
+        for used in modes:
+            results = getattr(self, f'_search_{used}')(query, limit)
+            if results:
+                break
+
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage='search').observe(elapsed)
+        return {'results': results, 'mode': used, 'took_ms': round(elapsed * 1000, 3)}
+
+    def _search_exact(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        key = normalize_key(query)
+        if not key:
+            return []
+        rows = self._connection().execute(
+            f'SELECT {_RESULT_COLUMNS} FROM documents WHERE invoice_key = ? '
+            f'UNION SELECT {_RESULT_COLUMNS} FROM documents WHERE order_key = ? '
+            'ORDER BY updated_at DESC LIMIT ?',
+            (key, key, limit)
+        ).fetchall()
+        return [dict(row, match='exact') for row in rows]
+
+    def _search_prefix(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        key = normalize_key(query)
+        if key:
+            # Range scan so the key indexes are used (LIKE would not be)
+            upper = key + '\U0010ffff'
+            rows = self._connection().execute(
+                f'SELECT {_RESULT_COLUMNS} FROM documents WHERE invoice_key >= ? AND invoice_key < ? '
+                f'UNION SELECT {_RESULT_COLUMNS} FROM documents WHERE order_key >= ? AND order_key < ? '
+                'ORDER BY updated_at DESC LIMIT ?',
+                (key, upper, key, upper, limit)
+            ).fetchall()
+            for row in rows:
+                results[row['path']] = dict(row, match='prefix')
+
+        if len(results) < limit:
+            fts_query = _fts_query(query, prefix=True)
+            if fts_query:
+                for row in self._match(f'{{name invoice_number order_number sender subject}} : ({fts_query})', limit):
+                    results.setdefault(row['path'], dict(row, match='prefix'))
+        return list(results.values())[:limit]
+
+    def _search_fulltext(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return []
+        return [dict(row, match='fulltext') for row in self._match(fts_query, limit, snippet=True)]
+
+    def _match(self, fts_query: str, limit: int, snippet: bool = False) -> List[Dict[str, Any]]:
+        columns = ', '.join(f'd.{column.strip()}' for column in _RESULT_COLUMNS.split(','))
+        snippet_column = ", snippet(documents_fts, 6, '[', ']', '…', 12) AS snippet" if snippet else ''
+        try:
+            rows = self._connection().execute(
+                f'SELECT {columns}{snippet_column} FROM documents_fts '
+                'JOIN documents d ON d.path = documents_fts.path '
+                'WHERE documents_fts MATCH ? ORDER BY bm25(documents_fts) LIMIT ?',
+                (fts_query, limit)
+            ).fetchall()
+        except sqlite3.OperationalError as error:
+            logger.warning("Full-text query %r failed: %s", fts_query, error)
+            return []
+        return [dict(row) for row in rows]
+
+
+_search_index: SharedInstance[DocumentSearchIndex] = SharedInstance(lambda: DocumentSearchIndex(**get_search_config()))
+
+
+def get_search_index() -> DocumentSearchIndex:
+    """Get the shared search index built from the search configuration"""
+    return _search_index.get()
+
+
+__all__ = [
+    'DocumentSearchIndex',
+    'SEARCH_MODES',
+    'get_search_index',
+    'normalize_key'
+]
@@ -0,0 +1,116 @@
+"""
+Mars AI Agents - SQLite Store Helpers
+
+Shared plumbing for the small SQLite databases under .cache/ (search
+index, near-duplicate signatures, layout templates, triage log, batch
+jobs): opening a WAL-mode connection, one connection per thread with
+writes serialised by a lock, and the lazily built shared instance behind
+each get_*() accessor.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def connect(db_path: str, schema: Optional[str] = None,
+            synchronous: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open a WAL-mode connection with rows addressable by column name
+
+    Args:
+        db_path: SQLite database file (its folder is created if needed)
+        schema: Script run once the connection is open (CREATE ... IF NOT EXISTS)
+        synchronous: Optional PRAGMA synchronous level, e.g. 'NORMAL'
+
+    Returns:
+        The open connection
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    if synchronous:
+        connection.execute(f'PRAGMA synchronous={synchronous}')
+    if schema:
+        connection.executescript(schema)
+    return connection
+
+
+class SQLiteStore:
+    """
+    Base class of a store kept in one SQLite file
+
+    One connection per thread (WAL mode, so readers never block the writer);
+    writes are serialised by _write_lock.
+    """
+
+    def __init__(self, db_path: str, schema: str, synchronous: Optional[str] = None):
+        """
+        Open (and create if needed) the database
+
+        Args:
+            db_path: SQLite database file
+            schema: Script creating the store's tables
+            synchronous: Optional PRAGMA synchronous level for every connection
+        """
+        self.db_path = db_path
+        self._synchronous = synchronous
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        with self._write_lock:
+            self._local.connection = connect(db_path, schema, synchronous)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = connect(self.db_path, synchronous=self._synchronous)
+            self._local.connection = connection
+        return connection
+
+
+class SharedInstance(Generic[T]):
+    """Process-wide instance built on first use, e.g. from the configuration"""
+
+    def __init__(self, factory: Callable[[], T]):
+        """
+        Args:
+            factory: Builds the instance the first time it is needed
+        """
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """The shared instance, built if it does not exist yet"""
+        with self._lock:
+            if self._instance is None:
+                self._instance = self._factory()
+            return self._instance
+
+    def replace(self, instance: Optional[T]) -> Optional[T]:
+        """
+        Swap in another instance (None rebuilds on next use)
+
+        Args:
+            instance: The instance get() should return from now on
+
+        Returns:
+            The previous instance, so it can be put back
+        """
+        with self._lock:
+            previous, self._instance = self._instance, instance
+            return previous
+
+
+__all__ = [
+    'SQLiteStore',
+    'SharedInstance',
+    'connect'
+]
@@ -0,0 +1,411 @@
+"""
+Mars AI Agents - Tracing Utilities
+Lightweight per-request span trees with JSON/OTLP export and opt-in
+cProfile capture of the blocking work done for a request
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import get_tracing_config
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+_profile_requested: contextvars.ContextVar[bool] = contextvars.ContextVar('profile_requested', default=False)
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'error', 'children')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = 'ok'
+        self.error: Optional[str] = None
+        self.children: List['Span'] = []
+
+    def set_attribute(self, key: str, value: Any):
+        """Attach an attribute to the span"""
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        """Mark the span as failed"""
+        self.status = 'error'
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def iter_spans(self) -> Iterator['Span']:
+        """Walk this span and all of its descendants"""
+        yield self
+        for child in list(self.children):
+            yield from child.iter_spans()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Render the span tree as JSON-serialisable data"""
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start_ns / 1e9,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+            'children': [child.to_dict() for child in list(self.children)]
+        }
+
+
+class _NoopSpan:
+    """Stand-in used when no trace is active so instrumentation costs nothing"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class TraceStore:
+    """Bounded in-memory store of recently finished traces"""
+
+    def __init__(self, max_traces: int = 200):
+        self.max_traces = max_traces
+        self._traces: 'OrderedDict[str, Span]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, root: Span):
+        with self._lock:
+            self._traces[root.trace_id] = root
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Span]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50) -> List[Span]:
+        with self._lock:
+            return list(self._traces.values())[-limit:][::-1]
+
+
+class OTLPExporter:
+    """Send finished traces to an OTLP/HTTP collector from a background thread"""
+
+    def __init__(self, endpoint: str, service_name: str = 'mars-aiagents', timeout: float = 5.0):
+        """
+        Initialize the exporter
+
+        Args:
+            endpoint: Collector base URL (e.g. http://localhost:4318)
+            service_name: Value of the service.name resource attribute
+            timeout: HTTP timeout per export
+        """
+        self.url = endpoint.rstrip('/')
+        if not self.url.endswith('/v1/traces'):
+            self.url += '/v1/traces'
+        self.service_name = service_name
+        self.timeout = timeout
+        self._queue: 'queue.Queue[Span]' = queue.Queue(maxsize=1000)
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, root: Span):
+        """Queue a finished trace for export, dropping it if the queue is full"""
+        try:
+            self._queue.put_nowait(root)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            root = self._queue.get()
+            try:
+                body = json.dumps(self.to_otlp(root)).encode('utf-8')
+                request = urllib.request.Request(
+                    self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST'
+                )
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except Exception as e:
+                logger.warning("OTLP export failed: %s", e)
+
+    def to_otlp(self, root: Span) -> Dict[str, Any]:
+        """Convert a span tree to an OTLP/JSON ExportTraceServiceRequest"""
+        spans = []
+        for span in root.iter_spans():
+            otlp_span = {
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 2 if span.parent_id is None else 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                'attributes': [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.status == 'error' else {'code': 1}
+            }
+            if span.parent_id:
+                otlp_span['parentSpanId'] = span.parent_id
+            spans.append(otlp_span)
+
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{'scope': {'name': 'mars_aiagents.tracing'}, 'spans': spans}]
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """Encode an attribute as an OTLP KeyValue"""
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+_settings = get_tracing_config()
+TRACE_STORE = TraceStore(_settings['max_traces'])
+_otlp_endpoint = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT') or _settings.get('otlp_endpoint')
+_exporter: Optional[OTLPExporter] = OTLPExporter(_otlp_endpoint) if _otlp_endpoint else None
+
+
+def current_span():
+    """Get the active span, or a no-op span outside of a trace"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    """Get the trace ID of the active span, if any"""
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+
+@contextmanager
+def start_trace(name: str, attributes: Optional[Dict[str, Any]] = None,
+                profile: bool = False) -> Iterator[Span]:
+    """
+    Start a new trace with a root span
+
+    Args:
+        name: Name of the root span
+        attributes: Attributes for the root span
+        profile: Whether blocking work in this trace should be profiled
+
+    Yields:
+        The root span
+    """
+    root = Span(name, secrets.token_hex(16), attributes=attributes)
+    span_token = _current_span.set(root)
+    profile_token = _profile_requested.set(profile)
+    try:
+        yield root
+    except BaseException as e:
+        root.record_error(e)
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        _profile_requested.reset(profile_token)
+        _current_span.reset(span_token)
+        if _settings['enabled']:
+            TRACE_STORE.add(root)
+            if _exporter is not None:
+                _exporter.export(root)
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Record a child span of the active span
+
+    Does nothing (and allocates nothing) when no trace is active.
+
+    Args:
+        name: Span name
+        **attributes: Span attributes
+
+    Yields:
+        The new span, or a no-op span outside of a trace
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorator that records a span around each call of a function
+    (for coroutine functions, around the awaited call)
+
+    Args:
+        name: Span name (defaults to the function's qualified name)
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_requested() -> bool:
+    """Whether the active trace asked for a profile"""
+    return _profile_requested.get()
+
+
+def run_profiled(func: Callable, *args):
+    """
+    Run a callable, capturing a cProfile profile if the active trace asked for one
+
+    The profile is saved to the profile store under the trace ID.
+
+    Args:
+        func: Callable to run
+        *args: Positional arguments for the callable
+
+    Returns:
+        The callable's return value
+    """
+    trace_id = current_trace_id()
+    if not (_profile_requested.get() and trace_id):
+        return func(*args)
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        save_profile(trace_id, profiler)
+
+
+def _profile_path(trace_id: str) -> str:
+    return os.path.join(_settings['profile_folder'], f"{trace_id}.prof")
+
+
+_profile_lock = threading.Lock()
+
+
+def save_profile(trace_id: str, profiler: cProfile.Profile):
+    """Write a profile to the profile store, merging with earlier captures"""
+    os.makedirs(_settings['profile_folder'], exist_ok=True)
+    path = _profile_path(trace_id)
+    with _profile_lock:
+        stats = pstats.Stats(profiler)
+        if os.path.exists(path):
+            stats.add(path)
+        stats.dump_stats(path)
+        _prune_profiles(_settings.get('max_profiles', 100))
+
+
+def _prune_profiles(max_profiles: int):
+    """Delete the oldest stored profiles beyond max_profiles (caller holds _profile_lock)"""
+    with os.scandir(_settings['profile_folder']) as it:
+        profiles = sorted(
+            ((entry.stat().st_mtime, entry.path) for entry in it if entry.name.endswith('.prof')),
+            reverse=True
+        )
+    for _, path in profiles[max(0, max_profiles):]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def load_profile_report(trace_id: str, limit: int = 40, sort_by: str = 'cumulative') -> Optional[str]:
+    """
+    Render a stored profile as a pstats text report
+
+    Args:
+        trace_id: Trace the profile belongs to
+        limit: Number of functions to include
+        sort_by: pstats sort key
+
+    Returns:
+        The report, or None if no profile was stored for the trace
+    """
+    if not all(c in '0123456789abcdef' for c in trace_id):
+        return None
+    path = _profile_path(trace_id)
+    if not os.path.exists(path):
+        return None
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats(sort_by).print_stats(limit)
+    return output.getvalue()
+
+
+__all__ = [
+    'OTLPExporter',
+    'Span',
+    'TRACE_STORE',
+    'TraceStore',
+    'current_span',
+    'current_trace_id',
+    'load_profile_report',
+    'profile_requested',
+    'run_profiled',
+    'span',
+    'start_trace',
+    'traced'
+]